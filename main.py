@@ -24,12 +24,26 @@ from fastapi.responses import JSONResponse
 # from slowapi.errors import RateLimitExceeded
 
 from src.api.api import api_router
+from src.config.redis import redis_config
 from src.config.setting import settings
+from src.llms.usage import prompt_cache_tracker
 # from core.limiter import limiter
 from loguru import logger
 # from core.metrics import setup_metrics
 # from core.middleware import MetricsMiddleware
+from src.rag.reranker import reranker
 from src.services.database import database_service
+from src.services.history_writer import history_writer
+from src.services.memory_consolidator import memory_consolidator
+from src.services.milvus_async import async_milvus_service
+from src.utils.context_builder import context_builder
+from src.utils.conversation_manager import conversation_manager
+from src.utils.embedding import embedding_service
+from src.utils.knowledge_version import knowledge_version
+from src.utils.pre_router import pre_router
+from src.utils.retrieval_cache import retrieval_cache
+from src.utils.semantic_cache import semantic_cache
+from src.utils.user_cache import user_cache
 
 # Load environment variables
 load_dotenv()
@@ -51,7 +65,30 @@ async def lifespan(app: FastAPI):
     version=settings.VERSION,
     api_prefix=settings.API_V1_STR,
     )
+    # 只有 zset 布局会在会话索引中残留过期成员，需要后台清理
+    if settings.HISTORY_WRITE_BEHIND_ENABLED:
+        history_writer.start()
+    if settings.REDIS_JANITOR_ENABLED and settings.REDIS_HISTORY_LAYOUT == "zset":
+        conversation_manager.janitor.start()
+    if settings.MEMORY_CONSOLIDATION_ASYNC:
+        memory_consolidator.start()
+    # 启动时读取一次知识库版本号，之后由后台任务刷新，请求路径上只读本地缓存
+    await knowledge_version.arefresh()
+    knowledge_version.start()
+    # 常驻集合数量超过上限时，定期释放空闲集合
+    if settings.MILVUS_IDLE_RELEASE_INTERVAL_SECONDS > 0:
+        async_milvus_service.residency.start()
     yield
+    # 关闭前处理完尚在队列中的记忆沉淀任务
+    await memory_consolidator.aclose()
+    await conversation_manager.janitor.stop()
+    # 关闭前把写后队列中剩余的聊天历史写入 PostgreSQL
+    await history_writer.aclose()
+    await async_milvus_service.residency.stop()
+    await knowledge_version.stop()
+    await async_milvus_service.close()
+    await redis_config.close()
+    await database_service.close()
     logger.info("application_shutdown")
 
 
@@ -158,6 +195,34 @@ async def health_check(request: Request) -> Dict[str, Any]:
 
     return JSONResponse(content=response, status_code=status_code)
 
+@app.get("/metrics")
+async def metrics(request: Request) -> Dict[str, Any]:
+    """Runtime metrics of caches and connection pools.
+
+    Returns:
+        Dict[str, Any]: Metrics grouped by component
+    """
+    return {
+        "semantic_cache": semantic_cache.stats(),
+        "embedding": embedding_service.stats(),
+        "prompt_cache": prompt_cache_tracker.stats(),
+        "context": context_builder.stats(),
+        "pre_router": pre_router.stats(),
+        "reranker": reranker.stats(),
+        "retrieval_cache": retrieval_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "history_writer": history_writer.stats(),
+        "memory_consolidator": memory_consolidator.stats(),
+        "postgres_pool": database_service.pool_stats(),
+        "redis_pool": redis_config.pool_stats(),
+        "redis_janitor": conversation_manager.janitor.stats(),
+        "milvus": {
+            "async_pool": async_milvus_service.pool.stats(),
+            "residency": async_milvus_service.residency.stats(),
+        },
+        "timestamp": datetime.now().isoformat(),
+    }
+
 if __name__ == "__main__":
     """Run the application directly when this file is executed."""
     import uvicorn
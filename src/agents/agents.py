@@ -1,5 +1,5 @@
+from langgraph.graph.state import CompiledStateGraph
 from langgraph.prebuilt import create_react_agent
-from langgraph.prebuilt.chat_agent_executor import AgentState
 
 from src.config.agents import AGENT_LLM_MAP
 from src.llms.llm import get_llm_by_type
@@ -17,12 +17,21 @@ def create_agent(agent_name: str, agent_type: str, tools: list, prompt_template:
         prompt=lambda state: apply_prompt_template(prompt_template, state),
     )
 
-def get_react_agent(tools: list, prompt_template: str):
-    llm = create_basic_llm()
-    print(type(llm))
-    agent = create_react_agent(
-        model=llm, 
-        tools=tools,
-        prompt=apply_prompt_template(prompt_template, AgentState())[0]
-    )
+# 已编译的 ReAct agent，按 (提示词模板, 工具名) 缓存
+_react_agent_cache: dict[tuple, CompiledStateGraph] = {}
+
+
+def get_react_agent(tools: list, prompt_template: str) -> CompiledStateGraph:
+    """获取 ReAct agent，同一组工具与提示词只创建并编译一次"""
+    key = (prompt_template, tuple(tool.name for tool in tools))
+    agent = _react_agent_cache.get(key)
+    if agent is None:
+        llm = create_basic_llm()
+        agent = create_react_agent(
+            model=llm, 
+            tools=tools,
+            # 每次调用时渲染系统提示词，保证其中的当前时间等变量是最新的
+            prompt=lambda state: apply_prompt_template(prompt_template, state) + state["messages"]
+        )
+        _react_agent_cache[key] = agent
     return agent
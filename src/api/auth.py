@@ -30,6 +30,7 @@ from src.utils.auth import (
     create_access_token,
     verify_token,
 )
+from src.utils.user_cache import user_cache
 from src.utils.sanitization import (
     sanitize_email,
     sanitize_string,
@@ -67,9 +68,9 @@ async def get_current_user(
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        # Verify user exists in database
+        # Verify user exists (cached; falls back to the database on a miss)
         user_id_int = int(user_id)
-        user = await database_service.get_user(user_id_int)
+        user = await user_cache.get(user_id_int, database_service.get_user)
         if user is None:
             logger.error("user_not_found", user_id=user_id_int)
             raise HTTPException(
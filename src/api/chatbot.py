@@ -2,7 +2,7 @@
 
 import asyncio
 import json
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Optional
 
 from fastapi import (
     APIRouter,
@@ -13,8 +13,9 @@ from fastapi import (
 from fastapi.responses import StreamingResponse
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessageChunk, AIMessage
 from src.api.auth import get_current_user
+from src.config.setting import settings
 from src.graph.builder import LangGraphAgent
-from src.utils.conversation_manager import conversation_manager
+from src.utils.conversation_manager import async_conversation_manager
 from src.schema.redis import MessageRole
 from loguru import logger
 from src.schema.chat import (
@@ -27,12 +28,38 @@ from src.schema.user import User
 router = APIRouter()
 agent = LangGraphAgent()
 
+def _sse(data: str, event: Optional[str] = None) -> str:
+    """格式化一条 Server-Sent Event；多行内容拆成多个 data 行，客户端会按换行重新拼接"""
+    lines = [f"event: {event}"] if event else []
+    lines += [f"data: {line}" for line in data.split("\n")]
+    return "\n".join(lines) + "\n\n"
+
+
+def _final_answer_from_update(node: str, update: Any) -> str:
+    """从节点的状态更新中取出最终答案（LLM 不支持流式或命中缓存时使用）"""
+    if not isinstance(update, dict):
+        return ""
+    if update.get("final_answer"):
+        return update["final_answer"]
+    if node in settings.STREAM_ANSWER_NODES:
+        message = update.get("messages")
+        if isinstance(message, list):
+            message = message[-1] if message else None
+        if isinstance(message, BaseMessage) and isinstance(message.content, str):
+            return message.content
+    return ""
+
+
 async def astream_workflow_generator(
     message: str,
     thread_id: str,
     user_id: int,
 ) -> AsyncGenerator[str, None]:
     """异步流式工作流生成器
+
+    - 默认事件（data）：STREAM_ANSWER_NODES 中节点生成的答案 token，无论走检索路径还是直接回答都会流式输出
+    - progress 事件：节点开始执行时的进度，如 {"stage": "retrieval", "iteration": 1, "tasks": [...]}
+    - 结束时发送 {"content": "", "done": true}，并保存完整答案
     
     Args:
         message: 用户消息
@@ -61,33 +88,55 @@ async def astream_workflow_generator(
         
         # 流式调用 graph
         answer = []
+        # 节点更新中携带的最终答案，没有流式 token 时（如命中语义缓存）使用
+        final_answer = ""
         graph = await agent.create_graph()
-        async for chunk in graph.astream(input_state, config, stream_mode="messages"):
-            message_obj, metadata = chunk
-            langgraph_node = metadata.get("langgraph_node")
-            if langgraph_node == "deal_with_results" and message_obj.content:
-                content = message_obj.content
-                answer.append(content)
-                yield f"data: {content}\n\n"
+        async for mode, chunk in graph.astream(input_state, config, stream_mode=["messages", "updates", "custom"]):
+            if mode == "messages":
+                message_obj, metadata = chunk
+                langgraph_node = metadata.get("langgraph_node")
+                # 只转发 LLM 的 token；节点返回的完整消息会在 updates 中处理，避免重复
+                if (
+                    langgraph_node in settings.STREAM_ANSWER_NODES
+                    and isinstance(message_obj, AIMessageChunk)
+                    and message_obj.content
+                ):
+                    content = message_obj.content
+                    answer.append(content)
+                    yield _sse(content)
+            elif mode == "custom":
+                if isinstance(chunk, dict) and "stage" in chunk:
+                    yield _sse(json.dumps(chunk, ensure_ascii=False), event="progress")
+            else:
+                for node, update in chunk.items():
+                    final_answer = _final_answer_from_update(node, update) or final_answer
+
+        # 命中语义答案缓存、或模型不支持流式时没有 token，直接推送完整答案
+        if not answer and final_answer:
+            answer.append(final_answer)
+            yield _sse(final_answer)
 
         # 发送完成信号
         final_data = {"content": "", "done": True}
-        yield f"data: {json.dumps(final_data, ensure_ascii=False)}\n\n"
+        yield _sse(json.dumps(final_data, ensure_ascii=False))
         
         # 保存到数据库中
         full_answer = "".join(answer)
-        logger.info(f"Stream completed. Saving full answer to DB for thread {thread_id}")
-        conversation_manager.add_message(
-            session_id=thread_id,
-            user_id=user_id,
-            message_role=MessageRole.ASSISTANT,
-            message=full_answer
-        )
+        if full_answer.strip():
+            logger.info(f"Stream completed. Saving full answer to DB for thread {thread_id}")
+            await async_conversation_manager.add_message(
+                session_id=thread_id,
+                user_id=user_id,
+                message_role=MessageRole.ASSISTANT,
+                message=full_answer
+            )
+        else:
+            logger.warning(f"Stream completed without an answer for thread {thread_id}")
         
     except Exception as e:
         logger.error(f"Error in stream workflow: {e}", exc_info=True)
         error_data = {"content": f"Error: {str(e)}", "done": True}
-        yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
+        yield _sse(json.dumps(error_data, ensure_ascii=False))
 
 @router.post("/chat/stream")
 async def chat_stream(
@@ -109,14 +158,14 @@ async def chat_stream(
     logger.info(f"conversation_id: {conversation_id}")
 
     # 1. 预热会话数据（如果 Redis 中没有数据）
-    conversation_manager.warmup_session_from_postgres(
+    await async_conversation_manager.warmup_session_from_postgres(
         session_id=conversation_id,
         user_id=user.id,
         limit=50
     )
 
     # 2. 立即存储用户消息到多轮对话管理器
-    conversation_manager.add_message(
+    await async_conversation_manager.add_message(
         session_id=conversation_id,
         user_id=user.id,
         message_role=MessageRole.USER,
@@ -151,14 +200,14 @@ async def chat(
         logger.info(f"Chat request received from user {user.id}, conversation_id: {chat_request.conversation_id}")
         
         # 1. 预热会话数据（如果 Redis 中没有数据）
-        conversation_manager.warmup_session_from_postgres(
+        await async_conversation_manager.warmup_session_from_postgres(
             session_id=chat_request.conversation_id,
             user_id=user.id,
             limit=50
         )
         
         # 2. 立即存储用户消息到多轮对话管理器
-        conversation_manager.add_message(
+        await async_conversation_manager.add_message(
             session_id=chat_request.conversation_id,
             user_id=user.id,
             message_role=MessageRole.USER,
@@ -192,7 +241,7 @@ async def chat(
         
         # 3. 存储AI回复到多轮对话管理器
         if response_content.strip():
-            conversation_manager.add_message(
+            await async_conversation_manager.add_message(
                 session_id=chat_request.conversation_id,
                 user_id=user.id,
                 message_role=MessageRole.ASSISTANT,
@@ -225,7 +274,7 @@ async def get_chat_history(
         logger.info(f"Getting chat history for conversation {conversation_id}")
         
         # 直接从 Redis 获取消息（因为发送消息时已经预热了）
-        messages = conversation_manager.get_messages(
+        messages = await async_conversation_manager.get_messages(
             session_id=conversation_id,
             user_id=user.id,
             limit=50
@@ -234,7 +283,7 @@ async def get_chat_history(
         # 如果 Redis 中仍然没有数据，尝试从 PostgreSQL 获取（备用方案）
         if not messages:
             logger.info("No messages found in Redis, trying PostgreSQL")
-            history_messages = conversation_manager.get_messages_from_postgres(
+            history_messages = await async_conversation_manager.get_messages_from_postgres(
                 session_id=conversation_id,
                 limit=50
             )
@@ -288,7 +337,7 @@ async def clear_chat_history(
         logger.info(f"Clearing chat history for conversation {conversation_id}")
         
         # 使用多轮对话管理器清空会话
-        success = conversation_manager.clear_session(
+        success = await async_conversation_manager.clear_session(
             session_id=conversation_id,
             user_id=user.id
         )
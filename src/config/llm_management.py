@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 
 from langchain_openai import ChatOpenAI
 from src.llms.llm import get_basic_llm_config_param
+from src.llms.usage import prompt_cache_tracker
 
 load_dotenv()
 
@@ -42,7 +43,9 @@ def create_basic_llm():
         api_key=params[2],
         model=params[1],
         temperature=DEFAULT_TEMPERATURE,
-        streaming=True)
+        streaming=True,
+        stream_usage=True,
+        callbacks=[prompt_cache_tracker])
     return model
 
 
@@ -1,15 +1,135 @@
-"""Redis 数据库配置"""
+"""Redis 数据库配置
 
-import redis
+同步客户端与异步客户端（redis.asyncio）各自共享一个进程级的阻塞连接池：
+- 所有 get_redis_client() / get_async_redis_client() 返回的客户端复用同一组连接，
+  不再每次调用都新建连接池并 PING
+- 连接用尽时请求会排队等待（最多 REDIS_POOL_TIMEOUT_SECONDS 秒），而不是直接报错
+- 连接池使用情况（使用中、空闲、排队等待数、等待耗时）通过 pool_stats() 暴露，用于容量规划
+"""
+
+import asyncio
+import threading
+import time
 from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
 from loguru import logger
 
 from src.config.setting import settings
 
 
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """记录排队等待情况的同步阻塞连接池"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.waiters = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def get_connection(self, *args, **kwargs):
+        started = time.perf_counter()
+        with self._stats_lock:
+            self.waiters += 1
+        try:
+            connection = super().get_connection()
+        except redis.ConnectionError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.waiters -= 1
+                self.total_wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        with self._stats_lock:
+            self.acquired += 1
+        return connection
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return _pool_stats(
+                in_use=len(self._connections) - sum(1 for c in self.pool.queue if c is not None),
+                created=len(self._connections),
+                max_connections=self.max_connections,
+                waiters=self.waiters,
+                acquired=self.acquired,
+                timeouts=self.timeouts,
+                total_wait_seconds=self.total_wait_seconds,
+                max_wait_seconds=self.max_wait_seconds,
+            )
+
+
+class InstrumentedAsyncConnectionPool(aioredis.BlockingConnectionPool):
+    """记录排队等待情况的异步阻塞连接池"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiters = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def get_connection(self, *args, **kwargs):
+        started = time.perf_counter()
+        self.waiters += 1
+        try:
+            connection = await super().get_connection()
+        except redis.ConnectionError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.waiters -= 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self.acquired += 1
+        return connection
+
+    def stats(self) -> dict:
+        return _pool_stats(
+            in_use=len(self._in_use_connections),
+            created=len(self._in_use_connections) + len(self._available_connections),
+            max_connections=self.max_connections,
+            waiters=self.waiters,
+            acquired=self.acquired,
+            timeouts=self.timeouts,
+            total_wait_seconds=self.total_wait_seconds,
+            max_wait_seconds=self.max_wait_seconds,
+        )
+
+
+def _pool_stats(
+    in_use: int,
+    created: int,
+    max_connections: int,
+    waiters: int,
+    acquired: int,
+    timeouts: int,
+    total_wait_seconds: float,
+    max_wait_seconds: float
+) -> dict:
+    return {
+        "in_use": in_use,
+        "idle": created - in_use,
+        "max_connections": max_connections,
+        "waiters": waiters,
+        "acquired": acquired,
+        "timeouts": timeouts,
+        "avg_wait_ms": round(total_wait_seconds / acquired * 1000, 3) if acquired else 0.0,
+        "max_wait_ms": round(max_wait_seconds * 1000, 3),
+    }
+
+
 class RedisConfig:
     """Redis 配置类"""
-    
+
     def __init__(self):
         self.host = settings.REDIS_HOST
         self.port = settings.REDIS_PORT
@@ -19,35 +139,61 @@ class RedisConfig:
         self.socket_connect_timeout = 5
         self.socket_timeout = 5
         self.retry_on_timeout = True
-        self.max_connections = 20
-        
+        self.max_connections = settings.REDIS_MAX_CONNECTIONS
+        self.pool_timeout = settings.REDIS_POOL_TIMEOUT_SECONDS
+
+        self._pool: Optional[InstrumentedConnectionPool] = None
+        self._client: Optional[redis.Redis] = None
+        self._async_pool: Optional[InstrumentedAsyncConnectionPool] = None
+        self._async_client: Optional[aioredis.Redis] = None
+        self._lock = threading.Lock()
+
+    def _connection_kwargs(self) -> dict:
+        return {
+            "host": self.host,
+            "port": self.port,
+            "password": self.password,
+            "db": self.db,
+            "decode_responses": self.decode_responses,
+            "socket_connect_timeout": self.socket_connect_timeout,
+            "socket_timeout": self.socket_timeout,
+            "retry_on_timeout": self.retry_on_timeout,
+            "max_connections": self.max_connections,
+            "timeout": self.pool_timeout,
+        }
+
     def get_connection(self) -> redis.Redis:
-        """获取 Redis 连接"""
-        try:
-            client = redis.Redis(
-                host=self.host,
-                port=self.port,
-                password=self.password,
-                db=self.db,
-                decode_responses=self.decode_responses,
-                socket_connect_timeout=self.socket_connect_timeout,
-                socket_timeout=self.socket_timeout,
-                retry_on_timeout=self.retry_on_timeout,
-                max_connections=self.max_connections
-            )
-            
-            # 测试连接
-            client.ping()
-            logger.info(f"Redis connected successfully to {self.host}:{self.port}")
-            return client
-            
-        except redis.ConnectionError as e:
-            logger.error(f"Failed to connect to Redis: {e}")
-            raise
-        except Exception as e:
-            logger.error(f"Redis connection error: {e}")
-            raise
-    
+        """获取 Redis 连接（所有调用共享同一个连接池，只在首次创建时 PING）"""
+        if self._client is not None:
+            return self._client
+        with self._lock:
+            if self._client is not None:
+                return self._client
+            try:
+                pool = InstrumentedConnectionPool(**self._connection_kwargs())
+                client = redis.Redis(connection_pool=pool)
+
+                # 测试连接
+                client.ping()
+                logger.info(f"Redis connected successfully to {self.host}:{self.port}")
+                self._pool, self._client = pool, client
+                return client
+
+            except redis.ConnectionError as e:
+                logger.error(f"Failed to connect to Redis: {e}")
+                raise
+            except Exception as e:
+                logger.error(f"Redis connection error: {e}")
+                raise
+
+    def get_async_connection(self) -> aioredis.Redis:
+        """获取异步 Redis 连接（所有调用共享同一个异步连接池，连接在首次执行命令时建立）"""
+        if self._async_client is None:
+            self._async_pool = InstrumentedAsyncConnectionPool(**self._connection_kwargs())
+            self._async_client = aioredis.Redis(connection_pool=self._async_pool)
+            logger.info(f"Async Redis pool created for {self.host}:{self.port} (max_connections={self.max_connections})")
+        return self._async_client
+
     def test_connection(self) -> bool:
         """测试 Redis 连接"""
         try:
@@ -58,6 +204,23 @@ class RedisConfig:
             logger.error(f"Redis connection test failed: {e}")
             return False
 
+    def pool_stats(self) -> dict:
+        """返回同步与异步连接池的使用情况"""
+        return {
+            "sync": self._pool.stats() if self._pool is not None else None,
+            "async": self._async_pool.stats() if self._async_pool is not None else None,
+        }
+
+    async def close(self) -> None:
+        """关闭连接池"""
+        if self._async_pool is not None:
+            await self._async_pool.disconnect()
+            self._async_pool, self._async_client = None, None
+        if self._pool is not None:
+            await asyncio.to_thread(self._pool.disconnect)
+            self._pool, self._client = None, None
+        logger.info("Redis connection pools closed")
+
 
 # 全局 Redis 配置实例
 redis_config = RedisConfig()
@@ -66,3 +229,8 @@ redis_config = RedisConfig()
 def get_redis_client() -> redis.Redis:
     """获取 Redis 客户端"""
     return redis_config.get_connection()
+
+
+def get_async_redis_client() -> aioredis.Redis:
+    """获取异步 Redis 客户端"""
+    return redis_config.get_async_connection()
@@ -112,6 +112,18 @@ def parse_dict_of_lists_from_env(prefix, default_dict=None):
     return result
 
 
+# Parse "key=value" pairs with float values from an environment variable
+def parse_float_dict_from_env(env_key, default=None):
+    """Parse a comma-separated list of key=value pairs into a dict of floats."""
+    result = {}
+    for item in parse_list_from_env(env_key, default):
+        if "=" not in item:
+            continue
+        key, value = item.split("=", 1)
+        result[key.strip()] = float(value)
+    return result
+
+
 class Settings:
     """Application settings without using pydantic."""
 
@@ -133,6 +145,10 @@ class Settings:
         )
         self.API_V1_STR = os.getenv("API_V1_STR", "/api/v1")
         self.DEBUG = os.getenv("DEBUG", "false").lower() in ("true", "1", "t", "yes")
+        # 提示词热加载：开启后修改 src/prompts 下的文件无需重启（开发环境默认开启）
+        self.PROMPT_HOT_RELOAD = os.getenv("PROMPT_HOT_RELOAD", "false").lower() in ("true", "1", "t", "yes")
+        # 提示词布局：prefix_stable 静态指令在前、易变字段（时间、问题、检索结果）在末尾，便于模型服务端前缀缓存；legacy 为原布局
+        self.PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "prefix_stable")
 
         # CORS Settings
         self.ALLOWED_ORIGINS = parse_list_from_env("ALLOWED_ORIGINS", ["*"])
@@ -153,6 +169,12 @@ class Settings:
         self.JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "")
         self.JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
         self.JWT_ACCESS_TOKEN_EXPIRE_DAYS = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_DAYS", "30"))
+        # 已认证用户缓存：进程内 TTL/LRU，可选 Redis 共享层；不存在的用户 ID 负缓存 USER_CACHE_NEGATIVE_TTL_SECONDS 秒
+        self.USER_CACHE_LOCAL_TTL_SECONDS = float(os.getenv("USER_CACHE_LOCAL_TTL_SECONDS", "30"))
+        self.USER_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("USER_CACHE_NEGATIVE_TTL_SECONDS", "10"))
+        self.USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+        self.USER_CACHE_REDIS_ENABLED = os.getenv("USER_CACHE_REDIS_ENABLED", "false").lower() in ("true", "1", "t", "yes")
+        self.USER_CACHE_REDIS_TTL_SECONDS = int(os.getenv("USER_CACHE_REDIS_TTL_SECONDS", "600"))
 
         # Logging Configuration
         self.LOG_DIR = Path(os.getenv("LOG_DIR", "logs"))
@@ -163,22 +185,136 @@ class Settings:
         self.POSTGRES_URL = os.getenv("POSTGRES_URL", "")
         self.POSTGRES_POOL_SIZE = int(os.getenv("POSTGRES_POOL_SIZE", "20"))
         self.POSTGRES_MAX_OVERFLOW = int(os.getenv("POSTGRES_MAX_OVERFLOW", "10"))
+        # 异步引擎（AsyncSession），默认由 POSTGRES_URL 推导出 psycopg 3 异步驱动的连接串
+        self.POSTGRES_ASYNC_URL = os.getenv("POSTGRES_ASYNC_URL", "")
+        self.POSTGRES_ASYNC_POOL_SIZE = int(os.getenv("POSTGRES_ASYNC_POOL_SIZE", str(self.POSTGRES_POOL_SIZE)))
+        self.POSTGRES_ASYNC_MAX_OVERFLOW = int(os.getenv("POSTGRES_ASYNC_MAX_OVERFLOW", str(self.POSTGRES_MAX_OVERFLOW)))
+        self.POSTGRES_POOL_TIMEOUT_SECONDS = float(os.getenv("POSTGRES_POOL_TIMEOUT_SECONDS", "30"))
         self.CHECKPOINT_TABLES = ["checkpoint_blobs", "checkpoint_writes", "checkpoints"]
+        # 聊天历史写后批量写入：每 HISTORY_FLUSH_INTERVAL_MS 毫秒或攒满 HISTORY_BATCH_SIZE 条写入一次
+        self.HISTORY_WRITE_BEHIND_ENABLED = os.getenv("HISTORY_WRITE_BEHIND_ENABLED", "true").lower() in ("true", "1", "t", "yes")
+        self.HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "100"))
+        self.HISTORY_FLUSH_INTERVAL_MS = float(os.getenv("HISTORY_FLUSH_INTERVAL_MS", "200"))
+        self.HISTORY_QUEUE_MAX_SIZE = int(os.getenv("HISTORY_QUEUE_MAX_SIZE", "10000"))
+        self.HISTORY_ENQUEUE_TIMEOUT_SECONDS = float(os.getenv("HISTORY_ENQUEUE_TIMEOUT_SECONDS", "1"))
 
         # Redis 配置
         self.REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
         self.REDIS_PORT: int = int(os.getenv("REDIS_PORT", 6379))
         self.REDIS_PASSWORD: Optional[str] = os.getenv("REDIS_PASSWORD", "123456")
         self.REDIS_DB: int = int(os.getenv("REDIS_DB", 1))
+        # 连接池：同步与异步客户端各共享一个连接池，连接用尽时最多等待 REDIS_POOL_TIMEOUT_SECONDS 秒
+        self.REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "20"))
+        self.REDIS_POOL_TIMEOUT_SECONDS: float = float(os.getenv("REDIS_POOL_TIMEOUT_SECONDS", "5"))
+        # 会话历史存储布局：zset（每条消息一个键 + 有序集合索引）或 list（每个会话一个列表）
+        self.REDIS_HISTORY_LAYOUT: str = os.getenv("REDIS_HISTORY_LAYOUT", "zset").lower()
+        self.REDIS_HISTORY_MAX_MESSAGES: int = int(os.getenv("REDIS_HISTORY_MAX_MESSAGES", "200"))
+        # 过期消息清理任务：每次运行的时间预算（毫秒）、运行间隔（秒）、每次 SCAN 的数量
+        self.REDIS_JANITOR_ENABLED: bool = os.getenv("REDIS_JANITOR_ENABLED", "true").lower() in ("true", "1", "t", "yes")
+        self.REDIS_JANITOR_TIME_BUDGET_MS: float = float(os.getenv("REDIS_JANITOR_TIME_BUDGET_MS", "50"))
+        self.REDIS_JANITOR_INTERVAL_SECONDS: float = float(os.getenv("REDIS_JANITOR_INTERVAL_SECONDS", "30"))
+        self.REDIS_JANITOR_SCAN_COUNT: int = int(os.getenv("REDIS_JANITOR_SCAN_COUNT", "200"))
 
         # milvus 配置
         self.MILVUS_HOST: str = os.getenv("MILVUS_HOST", "localhost")
         self.MILVUS_PORT: int = os.getenv("MILVUS_PORT", 19530)
         self.MILVUS_DATABASE: str = os.getenv("MILVUS_DATABASE", "default")
+        # 启动时常驻内存的集合，以及常驻集合数量上限（超过上限时才释放空闲集合）
+        self.MILVUS_RESIDENT_COLLECTIONS: List[str] = parse_list_from_env(
+            "MILVUS_RESIDENT_COLLECTIONS", ["memory", "knowledge"]
+        )
+        self.MILVUS_MAX_LOADED_COLLECTIONS: int = int(os.getenv("MILVUS_MAX_LOADED_COLLECTIONS", "4"))
+        self.MILVUS_IDLE_RELEASE_SECONDS: int = int(os.getenv("MILVUS_IDLE_RELEASE_SECONDS", "600"))
+        # 定期检查并释放空闲集合的间隔，0 表示不启动后台任务
+        self.MILVUS_IDLE_RELEASE_INTERVAL_SECONDS: float = float(os.getenv("MILVUS_IDLE_RELEASE_INTERVAL_SECONDS", "60"))
+        # 异步客户端连接池大小及单次调用超时时间（秒）
+        self.MILVUS_ASYNC_POOL_SIZE: int = int(os.getenv("MILVUS_ASYNC_POOL_SIZE", "8"))
+        self.MILVUS_CALL_TIMEOUT_SECONDS: float = float(os.getenv("MILVUS_CALL_TIMEOUT_SECONDS", "10"))
 
         # embedding model 配置
         self.EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL")
         self.EMBEDDING_API_KEY: str = os.getenv("EMBEDDING_API_KEY")
+        # 向量化服务：dashscope 或 local（本地确定性实现，用于测试）
+        self.EMBEDDING_PROVIDER: str = os.getenv("EMBEDDING_PROVIDER", "dashscope").lower()
+        self.EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+        self.EMBEDDING_BATCH_WINDOW_MS: float = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+        self.EMBEDDING_MAX_BATCH_SIZE: int = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "10"))
+
+        # 语义答案缓存配置
+        self.SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("true", "1", "t", "yes")
+        self.SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+        self.SEMANTIC_CACHE_TTL_SECONDS: int = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+        self.SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+        # 检索规划模式：sequential（每轮一个检索任务）或 parallel（每轮规划多个独立子任务并发检索）
+        self.SUPERVISOR_PLANNING_MODE: str = os.getenv("SUPERVISOR_PLANNING_MODE", "sequential").lower()
+        self.SUPERVISOR_MAX_SUB_QUERIES: int = int(os.getenv("SUPERVISOR_MAX_SUB_QUERIES", "3"))
+        # 同一请求中同时运行的检索 agent 上限（parallel 模式的一次分发），不同请求之间不共享
+        self.RETRIEVAL_MAX_CONCURRENCY: int = int(os.getenv("RETRIEVAL_MAX_CONCURRENCY", "4"))
+        # 路由判断的同时预先执行记忆查询，需要检索时省去一次 LLM 往返（不需要检索时会多消耗一次改写调用）
+        self.SPECULATIVE_MEMORY_LOOKUP: bool = os.getenv("SPECULATIVE_MEMORY_LOOKUP", "false").lower() in ("true", "1", "t", "yes")
+        # 本地预路由：明显的闲聊 / 政策类问题不调用 LLM 直接决定是否检索
+        self.PRE_ROUTER_ENABLED: bool = os.getenv("PRE_ROUTER_ENABLED", "true").lower() in ("true", "1", "t", "yes")
+        self.PRE_ROUTER_MIN_CONFIDENCE: float = float(os.getenv("PRE_ROUTER_MIN_CONFIDENCE", "0.85"))
+        self.PRE_ROUTER_EMBEDDING_ENABLED: bool = os.getenv("PRE_ROUTER_EMBEDDING_ENABLED", "false").lower() in ("true", "1", "t", "yes")
+        self.PRE_ROUTER_EMBEDDING_MARGIN: float = float(os.getenv("PRE_ROUTER_EMBEDDING_MARGIN", "0.08"))
+
+        # 记忆沉淀：开启后 update_memory 只入队，由后台协程判断、提炼并写入 Milvus，不阻塞本轮回答
+        self.MEMORY_CONSOLIDATION_ASYNC: bool = os.getenv("MEMORY_CONSOLIDATION_ASYNC", "true").lower() in ("true", "1", "t", "yes")
+        self.MEMORY_CONSOLIDATION_WORKERS: int = int(os.getenv("MEMORY_CONSOLIDATION_WORKERS", "2"))
+        # 队列满时丢弃新任务
+        self.MEMORY_CONSOLIDATION_QUEUE_SIZE: int = int(os.getenv("MEMORY_CONSOLIDATION_QUEUE_SIZE", "100"))
+        self.MEMORY_CONSOLIDATION_MAX_RETRIES: int = int(os.getenv("MEMORY_CONSOLIDATION_MAX_RETRIES", "2"))
+        self.MEMORY_CONSOLIDATION_TIMEOUT_SECONDS: float = float(os.getenv("MEMORY_CONSOLIDATION_TIMEOUT_SECONDS", "60"))
+        # 图节点的超时预算（秒），超时后取消节点内正在进行的 LLM / 工具调用，格式：节点名=秒数,...
+        # 开启 SPECULATIVE_MEMORY_LOOKUP 时 route 的预算同时覆盖与之并行的记忆查询
+        self.NODE_TIMEOUTS: Dict[str, float] = parse_float_dict_from_env(
+            "NODE_TIMEOUTS",
+            ["route=30", "answer=120", "get_memory=30", "supervisor=45",
+             "retrieval_agent=90", "deal_with_results=120", "update_memory=60"]
+        )
+        # 单次知识库检索工具调用的超时（秒），超时后返回提示信息，由检索 agent 自行决定下一步
+        self.RETRIEVAL_TOOL_TIMEOUT_SECONDS: float = float(os.getenv("RETRIEVAL_TOOL_TIMEOUT_SECONDS", "30"))
+        # 知识库检索模式：dense（稠密向量相似度 + MMR）或 hybrid（稠密 + BM25 稀疏向量，服务端一次融合检索）
+        # hybrid 需要先用 python -m src.script.process_markdown --mode hybrid 写入 KNOWLEDGE_HYBRID_COLLECTION
+        self.RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "dense").lower()
+        # dense 模式的检索方式：fused（一次搜索 + 本地 MMR）或 ensemble（similarity 与 mmr 两次搜索）
+        self.DENSE_RETRIEVER: str = os.getenv("DENSE_RETRIEVER", "fused").lower()
+        # fused 检索一次取回的候选数与 MMR 的相关度权重（1 只看相关度，0 只看多样性）
+        self.RETRIEVAL_FETCH_K: int = int(os.getenv("RETRIEVAL_FETCH_K", "20"))
+        self.RETRIEVAL_MMR_LAMBDA: float = float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.5"))
+        # 检索结果重排：dashscope（远端服务）或 onnx（本地 CPU cross-encoder，模型目录含 model.onnx 与 tokenizer.json）
+        self.RERANK_BACKEND: str = os.getenv("RERANK_BACKEND", "dashscope").lower()
+        self.RERANK_MODEL_PATH: str = os.getenv("RERANK_MODEL_PATH", "")
+        self.RERANK_ONNX_THREADS: int = int(os.getenv("RERANK_ONNX_THREADS", "0"))
+        self.RERANK_TOP_N: int = int(os.getenv("RERANK_TOP_N", "3"))
+        # 打分前每个候选文档截断到的 token 数
+        self.RERANK_MAX_DOC_TOKENS: int = int(os.getenv("RERANK_MAX_DOC_TOKENS", "512"))
+        self.RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+        # (查询, 文档) 分数缓存条数，0 表示不缓存
+        self.RERANK_CACHE_SIZE: int = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+        # 检索结果缓存：进程内 TTL/LRU，可选 Redis 共享层；知识库版本号变化后失效
+        self.RETRIEVAL_CACHE_ENABLED: bool = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() in ("true", "1", "t", "yes")
+        self.RETRIEVAL_CACHE_TTL_SECONDS: float = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "600"))
+        self.RETRIEVAL_CACHE_MAX_ENTRIES: int = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "1000"))
+        self.RETRIEVAL_CACHE_REDIS_ENABLED: bool = os.getenv("RETRIEVAL_CACHE_REDIS_ENABLED", "false").lower() in ("true", "1", "t", "yes")
+        self.RETRIEVAL_CACHE_REDIS_TTL_SECONDS: int = int(os.getenv("RETRIEVAL_CACHE_REDIS_TTL_SECONDS", "3600"))
+        self.KNOWLEDGE_HYBRID_COLLECTION: str = os.getenv("KNOWLEDGE_HYBRID_COLLECTION", "knowledge_hybrid")
+        # 融合方式：rrf 或 weighted；weighted 的权重依次对应稠密、稀疏两路
+        self.HYBRID_RANKER: str = os.getenv("HYBRID_RANKER", "rrf").lower()
+        self.HYBRID_RRF_K: int = int(os.getenv("HYBRID_RRF_K", "60"))
+        self.HYBRID_WEIGHTS: List[float] = [float(w) for w in parse_list_from_env("HYBRID_WEIGHTS", ["0.6", "0.4"])]
+        # 生成最终答案的节点，/chat/stream 只转发这些节点的 LLM token
+        self.STREAM_ANSWER_NODES: List[str] = parse_list_from_env("STREAM_ANSWER_NODES", ["answer", "deal_with_results"])
+
+        # supervisor / deal_with_results 上下文的 token 预算，格式：来源=token 数,...
+        self.CONTEXT_TOKEN_BUDGETS: Dict[str, float] = parse_float_dict_from_env(
+            "CONTEXT_TOKEN_BUDGETS", ["memory=800", "retrieved=3000", "history=2000"]
+        )
+        # token 计数方式：estimate（按字符估算）或 tiktoken
+        self.CONTEXT_TOKENIZER: str = os.getenv("CONTEXT_TOKENIZER", "estimate").lower()
+        # 检索段落重叠度超过该值时视为重复
+        self.CONTEXT_DEDUP_THRESHOLD: float = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
 
         # chat model 配置
         self.CHAT_MODEL: str = os.getenv("CHAT_MODEL", "")
@@ -221,6 +357,7 @@ class Settings:
         env_settings = {
             Environment.DEVELOPMENT: {
                 "DEBUG": True,
+                "PROMPT_HOT_RELOAD": True,
                 "LOG_LEVEL": "DEBUG",
                 "LOG_FORMAT": "console",
                 "RATE_LIMIT_DEFAULT": ["1000 per day", "200 per hour"],
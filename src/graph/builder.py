@@ -15,6 +15,7 @@ from .node import (
     update_memory_node,
     generate_answer
 )
+from .timeouts import with_timeout
 from .types import State
 
 class LangGraphAgent:
@@ -50,13 +51,14 @@ class LangGraphAgent:
                 builder = StateGraph(State)
                 builder.add_edge(START, "query")
                 builder.add_node("query", query_node)
-                builder.add_node("route", route_node)
-                builder.add_node("answer", generate_answer)
-                builder.add_node("get_memory", get_memory_node)
-                builder.add_node("supervisor", supervisor_node)
+                builder.add_node("route", with_timeout("route", route_node))
+                builder.add_node("answer", with_timeout("answer", generate_answer))
+                builder.add_node("get_memory", with_timeout("get_memory", get_memory_node))
+                builder.add_node("supervisor", with_timeout("supervisor", supervisor_node))
+                # 检索 agent 在节点内部计时：超时预算从取得并发名额后开始，排队时间不计入；超时时降级为空结果
                 builder.add_node("retrieval_agent", retrieval_agent_node)
-                builder.add_node("deal_with_results", deal_with_results_node)
-                builder.add_node("update_memory", update_memory_node)
+                builder.add_node("deal_with_results", with_timeout("deal_with_results", deal_with_results_node))
+                builder.add_node("update_memory", with_timeout("update_memory", update_memory_node))
 
                 # # 创建数据库连接池，准备checkpointer
                 connection_pool = await self._get_connection_pool_postgres()
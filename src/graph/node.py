@@ -1,24 +1,59 @@
 import asyncio
-from typing import Literal
+import time
+import weakref
+from typing import List, Literal
 from loguru import logger
 
 from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.runnables import RunnableConfig
-from langgraph.types import Command
+from langgraph.types import Command, Send, StreamWriter
 from pydantic import BaseModel
 
 from src.config.agents import AGENT_LLM_MAP
+from src.config.setting import settings
 from src.llms.llm import get_llm_by_type
 
-from src.prompts.template import apply_prompt_template
+from src.prompts.template import build_prompt_messages
+from .progress import emit_progress
 from .types import State
-from src.utils.conversation_manager import conversation_manager
+from src.utils.conversation_manager import async_conversation_manager
 from src.schema.redis import MessageRole
-from src.services.milvus import milvus_service
-from src.utils.embedding import get_text_embeddings
+from src.services.memory_consolidator import MemoryJob, consolidate_memory, memory_consolidator
+from src.services.milvus_async import async_milvus_service
+from src.utils.embedding import embedding_service, normalize_text, pack_vector, unpack_vector
+from src.utils.semantic_cache import semantic_cache
+from src.utils.context_builder import context_builder
+from src.utils.pre_router import RETRIEVE, pre_router
 from src.agents.agents import get_react_agent
 from src.rag.retriever import retriever_tool
 
+# 限制同一次请求中同时运行的检索 agent 数量（parallel 模式下一次 Send 分发的多个分支），键为会话ID。
+# 只在同一请求的分支之间排队，不同用户的请求互不影响；所有分支结束后信号量随之回收
+_retrieval_semaphores: "weakref.WeakValueDictionary[str, asyncio.Semaphore]" = weakref.WeakValueDictionary()
+
+
+def _get_retrieval_semaphore(config: RunnableConfig) -> asyncio.Semaphore:
+    key = str(config.get("configurable", {}).get("thread_id"))
+    semaphore = _retrieval_semaphores.get(key)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(settings.RETRIEVAL_MAX_CONCURRENCY)
+        _retrieval_semaphores[key] = semaphore
+    return semaphore
+
+
+async def _embed_text(embeddings: dict, text: str) -> tuple[list[float], dict]:
+    """向量化文本，本轮已经计算过的直接从 State 的 embeddings 中取出，不再重复请求
+
+    Returns:
+        (向量, 需要写回 State 的 embeddings 字段)
+    """
+    key = normalize_text(text)
+    if key in embeddings:
+        return unpack_vector(embeddings[key]), embeddings
+
+    vector = await embedding_service.aembed(text)
+    return vector, {**embeddings, key: pack_vector(vector)}
+
 
 async def query_node(state: State, config: RunnableConfig) -> Command[Literal["route"]]:
     """处理用户查询，提取关键信息并加载历史对话"""
@@ -34,11 +69,15 @@ async def query_node(state: State, config: RunnableConfig) -> Command[Literal["r
         "max_retrieval_iterations": 3,
         "memory_threshold": 0.65,
         "needs_retrieval": False,
-        "task_description": []
+        "task_description": [],
+        "retrieved_information": "delete",
+        "embeddings": {},
+        "cache_hit": False,
+        "turn_started_at": time.time()
     }
-    
+
     # 从redis中获取消息记录
-    history_messages = conversation_manager.get_messages(
+    history_messages = await async_conversation_manager.get_messages(
         session_id=thread_id,
         user_id=int(user_id),
         limit=19  # 限制最近19条消息，为当前消息留出空间
@@ -61,25 +100,51 @@ async def query_node(state: State, config: RunnableConfig) -> Command[Literal["r
         goto="route"
     )
 
-async def route_node(state: State, config: RunnableConfig) -> Command[Literal["get_memory", "answer"]]:
-    """判断是否需要检索相关信息"""
+async def route_node(state: State, config: RunnableConfig, writer: StreamWriter) -> Command[Literal["get_memory", "supervisor", "answer", "__end__"]]:
+    """判断是否需要检索相关信息
+
+    先由本地预路由（见 src.utils.pre_router）判断明显的情况，拿不准时再调用 LLM。
+    开启 SPECULATIVE_MEMORY_LOOKUP 时，路由的 LLM 调用与记忆查询（问题改写、向量化、Milvus 检索）同时进行：
+    需要检索时直接带着记忆结果进入监督者节点，省去一次 LLM 往返；不需要检索时取消记忆查询。
+    """
     logger.info("Route node determining if retrieval is needed")
+    emit_progress(writer, "routing")
 
     logger.info("get history messages")
     history_messages = state.get("history_messages", [])
+
+    # 本地预路由能确定时不再调用 LLM
+    if settings.PRE_ROUTER_ENABLED:
+        decision = await pre_router.decide(state.get("user_query"), history_messages)
+        if decision.route is not None:
+            logger.info(f"预路由决定 {decision.route}（{decision.source}，{decision.reason}，置信度 {decision.confidence:.2f}）")
+            return Command(
+                update={"messages": history_messages},
+                goto="get_memory" if decision.route == RETRIEVE else "answer"
+            )
     
     prepare_params = {
         "user_query": state.get("user_query")
     }
 
-    system_msg = apply_prompt_template("route", state, ** prepare_params)
+    msg = build_prompt_messages("route", state, history_messages, **prepare_params)
     llm = get_llm_by_type(AGENT_LLM_MAP.get("route", "basic"))
 
     update_dict = {}
 
     update_dict["messages"] = history_messages
-    msg = system_msg + history_messages
-    response = await llm.ainvoke(msg)
+
+    speculative_task = None
+    if settings.SPECULATIVE_MEMORY_LOOKUP:
+        user_id = config.get("configurable", {}).get("user_id")
+        speculative_task = asyncio.create_task(_lookup_memory(state, history_messages, user_id))
+
+    try:
+        response = await llm.ainvoke(msg)
+    except BaseException:
+        if speculative_task is not None:
+            speculative_task.cancel()
+        raise
     # print(response.content.strip().lower())
     needs_retrieval = response.content.strip().lower() == "true"
 
@@ -88,24 +153,38 @@ async def route_node(state: State, config: RunnableConfig) -> Command[Literal["g
     #     needs_retrieval = False
 
     if needs_retrieval:
+        if speculative_task is not None:
+            emit_progress(writer, "memory_lookup")
+            try:
+                update_dict.update(await speculative_task)
+                logger.info("使用预先执行的记忆查询结果，跳过 get_memory 节点")
+                return Command(
+                    update=update_dict,
+                    goto="__end__" if update_dict.get("cache_hit") else "supervisor"
+                )
+            except Exception as e:
+                logger.warning(f"预先执行的记忆查询失败，改为正常流程：{e}")
         return Command(
             update=update_dict,
             goto="get_memory"
         )
     else:
+        if speculative_task is not None:
+            speculative_task.cancel()
+            logger.info("无需检索，取消预先执行的记忆查询")
         return Command(
             update=update_dict,
             goto="answer"
         )
 
-async def generate_answer(state: State, config: RunnableConfig) -> Command[Literal["__end__"]]:
+async def generate_answer(state: State, config: RunnableConfig, writer: StreamWriter) -> Command[Literal["__end__"]]:
     """不需要检索，直接回复节点"""
     logger.info("generate answer.")
+    emit_progress(writer, "answering", retrieval=False)
     prepare_params = {
         "user_query": state.get("user_query")
     }
-    system_msg = apply_prompt_template("general_answer", state, **prepare_params)
-    msg = system_msg + state["messages"]
+    msg = build_prompt_messages("general_answer", state, state["messages"], **prepare_params)
     llm = get_llm_by_type(AGENT_LLM_MAP.get("route", "basic"))
     response = await llm.ainvoke(msg)
     update_dict = {"messages": AIMessage(content=response.content)}
@@ -114,24 +193,50 @@ async def generate_answer(state: State, config: RunnableConfig) -> Command[Liter
         goto="__end__"
     )
 
-async def get_memory_node(state: State, config: RunnableConfig) -> Command[Literal["supervisor"]]:
-    """从记忆中获取相关信息"""
-    logger.info("Get memory node retrieving relevant information")
-    
+
+async def _lookup_memory(state: State, messages: list, user_id) -> dict:
+    """改写问题并检索记忆，返回需要写回 State 的字段
+
+    开启语义答案缓存时，用改写后的独立问题在该用户的缓存中查找，命中则直接带回答案（cache_hit 为 True），不再检索记忆。
+
+    Args:
+        state: 当前状态
+        messages: 聊天历史（推测执行时 state 中的 messages 尚未被 route 节点更新）
+        user_id: 用户ID，语义答案缓存按用户隔离
+    """
     memory_threshold = state["memory_threshold"]
 
     prepare_params = {"user_query": state.get("user_query")}
 
-    system_msg = apply_prompt_template("get_memory", state, **prepare_params)
-    msg = system_msg + state["messages"]
+    msg = build_prompt_messages("get_memory", state, messages, **prepare_params)
     llm = get_llm_by_type(AGENT_LLM_MAP.get("route", "basic"))
     response = await llm.ainvoke(msg)
     rewrite_question = response.content
     update_dict = {"rewrite_query": rewrite_question}
     logger.info(f"LLM将用户输入的问题进行重写以进行记忆搜索：{rewrite_question}")
 
-    query_vector = get_text_embeddings(rewrite_question)
-    memory = await milvus_service.search_data_by_single_vector(
+    query_vector, embeddings = await _embed_text(state.get("embeddings") or {}, rewrite_question)
+    update_dict["embeddings"] = embeddings
+
+    # 语义答案缓存：同一用户问过相似的独立问题时直接返回答案，跳过整个检索流程
+    if settings.SEMANTIC_CACHE_ENABLED:
+        try:
+            hit = semantic_cache.lookup(str(user_id), query_vector)
+        except Exception as e:
+            logger.error(f"语义缓存查询失败：{e}")
+            hit = None
+        if hit is not None:
+            logger.info(
+                f"语义缓存命中（相似度 {hit.similarity:.3f}，节省约 {hit.latency_saved_ms:.0f}ms）：{hit.question}"
+            )
+            update_dict.update({
+                "cache_hit": True,
+                "final_answer": hit.answer,
+                "messages": AIMessage(content=hit.answer)
+            })
+            return update_dict
+
+    memory = await async_milvus_service.search_data_by_single_vector(
         "memory", query_vector, "question_embedding", ["question", "answer"], 3
     )
 
@@ -144,19 +249,31 @@ async def get_memory_node(state: State, config: RunnableConfig) -> Command[Liter
     
     update_dict["memory_info"] = memory_info
     logger.info(f"过滤出{len(memory_info)}条memory可用")
+    return update_dict
+
+
+async def get_memory_node(state: State, config: RunnableConfig, writer: StreamWriter) -> Command[Literal["supervisor", "__end__"]]:
+    """从记忆中获取相关信息"""
+    logger.info("Get memory node retrieving relevant information")
+    emit_progress(writer, "memory_lookup")
+
+    user_id = config.get("configurable", {}).get("user_id")
+    update_dict = await _lookup_memory(state, state["messages"], user_id)
 
     return Command(
         update=update_dict,
-        goto="supervisor"
+        goto="__end__" if update_dict.get("cache_hit") else "supervisor"
     )
 
-async def supervisor_node(state: State, config: RunnableConfig) -> Command[Literal["retrieval_agent", "deal_with_results"]]:
-    """监督者节点，判断是否需要更多信息"""
+async def supervisor_node(state: State, config: RunnableConfig, writer: StreamWriter) -> Command[Literal["retrieval_agent", "deal_with_results"]]:
+    """监督者节点，判断是否需要更多信息
+
+    sequential 模式每轮发布一个检索任务；parallel 模式每轮规划多个相互独立的子任务，
+    通过 Send 同时分发给多个检索 agent，全部完成后回到监督者节点。
+    """
     logger.info("Supervisor node evaluating if more information is needed")
 
     user_query = state.get("user_query")
-    memory_info = state.get("memory_info", [])
-    retrieved_information = state.get("retrieved_information", [])
     task_description = state.get("task_description", [])
     needs_retrieval = state.get("needs_retrieval", False)
 
@@ -172,23 +289,45 @@ async def supervisor_node(state: State, config: RunnableConfig) -> Command[Liter
         )
     
     # 使用LLM判断当前信息是否足够
+    emit_progress(writer, "planning", iteration=current_iteration + 1)
     llm = get_llm_by_type(AGENT_LLM_MAP.get("route", "basic"))
+    context = context_builder.assemble(state)
     prepare_params = {
         "user_query": user_query,
-        "memory_info": memory_info,
-        "retrieved_information": retrieved_information,
+        "memory_info": context.memory_info,
+        "retrieved_information": context.retrieved_information,
         "task_description": task_description
     }
-    supervisor_msg = apply_prompt_template("supervisor", state, ** prepare_params)
-    msg = supervisor_msg + state["messages"]
 
-    class structured_schema(BaseModel):
-        needs_more_info: bool
-        task_description_item: str
+    if settings.SUPERVISOR_PLANNING_MODE == "parallel":
+        prepare_params["max_sub_queries"] = settings.SUPERVISOR_MAX_SUB_QUERIES
+        supervisor_msg = build_prompt_messages("supervisor_plan", state, context.history, **prepare_params)
+        context_builder.record("supervisor", context, supervisor_msg)
+
+        class plan_schema(BaseModel):
+            needs_more_info: bool
+            sub_queries: List[str]
+
+        response = await llm.with_structured_output(plan_schema).ainvoke(supervisor_msg)
+        need_more_info = response.needs_more_info
+        # 去掉空任务与已发布过的任务，并限制扇出数量
+        new_tasks = []
+        for sub_query in response.sub_queries:
+            sub_query = sub_query.strip()
+            if sub_query and sub_query not in task_description and sub_query not in new_tasks:
+                new_tasks.append(sub_query)
+        new_tasks = new_tasks[:settings.SUPERVISOR_MAX_SUB_QUERIES]
+    else:
+        supervisor_msg = build_prompt_messages("supervisor", state, context.history, **prepare_params)
+        context_builder.record("supervisor", context, supervisor_msg)
 
-    response = await llm.with_structured_output(structured_schema).ainvoke(msg)
-    need_more_info = response.needs_more_info
-    task_description_item = response.task_description_item
+        class structured_schema(BaseModel):
+            needs_more_info: bool
+            task_description_item: str
+
+        response = await llm.with_structured_output(structured_schema).ainvoke(supervisor_msg)
+        need_more_info = response.needs_more_info
+        new_tasks = [response.task_description_item] if response.task_description_item else []
 
     update_dict = {}
     if need_more_info and not needs_retrieval:
@@ -198,10 +337,16 @@ async def supervisor_node(state: State, config: RunnableConfig) -> Command[Liter
     # if need_more_info:
     #     need_more_info = False
 
-    if need_more_info and task_description_item:
-        task_description.append(task_description_item)
-        update_dict["task_description"] = task_description
+    if need_more_info and new_tasks:
+        update_dict["task_description"] = task_description + new_tasks
         update_dict["current_iteration"] = current_iteration + 1
+        emit_progress(writer, "retrieval", iteration=current_iteration + 1, tasks=new_tasks)
+        if settings.SUPERVISOR_PLANNING_MODE == "parallel":
+            logger.info(f"并行分发 {len(new_tasks)} 个检索子任务：{new_tasks}")
+            return Command(
+                update=update_dict,
+                goto=[Send("retrieval_agent", {"retrieval_task": task}) for task in new_tasks]
+            )
         return Command(update=update_dict, goto="retrieval_agent")
     else:
         return Command(
@@ -211,33 +356,38 @@ async def supervisor_node(state: State, config: RunnableConfig) -> Command[Liter
 
 
 async def retrieval_agent_node(state: State, config: RunnableConfig) -> Command[Literal["supervisor"]]:
-    """检索agent - 使用向量数据库进行检索相关信息"""
+    """检索agent - 使用向量数据库进行检索相关信息
+
+    parallel 模式下由 Send 调用，state 中只有 retrieval_task；sequential 模式下检索最新发布的任务。
+    agent 只编译一次，通过 ainvoke 在事件循环中运行。超时预算（NODE_TIMEOUTS 中的 retrieval_agent）
+    从取得并发名额之后开始计算，排队等待同一请求中其他分支的时间不计入（排队时间受这些分支各自的预算约束）；超时时连同工具调用一起被取消，
+    降级为 retrieval_agent_fallback 的结果。
+    """
     logger.info("检索agent - 使用向量数据库进行检索相关信息")
     
-    user_query = state["user_query"]
-    tasks = state.get("task_description", [user_query])
+    task = state.get("retrieval_task") or state.get("task_description", [state.get("user_query")])[-1]
     
-    logger.info("获取react智能体")
     agent = get_react_agent([retriever_tool], "research")
-
-    logger.info("开始推理")
-    try:
-        # messages = agent.invoke({"messages": [("human", tasks[-1])]})
-        messages = await asyncio.wait_for(
-            asyncio.to_thread(agent.invoke, {"messages": [("human", tasks[-1])]}),
-            timeout=90
-        )
-    except Exception as e:
-        logger.error(f"推理发生错误：{e}")
-        messages = {"messages": [AIMessage(content="未找到有效内容")]}
-    logger.info("推理结束")
-
-    logger.info("准备更新字段")
+    timeout = settings.NODE_TIMEOUTS.get("retrieval_agent")
+
+    # 持有信号量的引用直到本分支结束
+    semaphore = _get_retrieval_semaphore(config)
+    async with semaphore:
+        logger.info(f"开始推理：{task}")
+        try:
+            messages = await asyncio.wait_for(agent.ainvoke({"messages": [("human", task)]}), timeout=timeout or None)
+        except asyncio.TimeoutError:
+            logger.warning(f"检索 agent 超过 {timeout:g}s 预算，已取消：{task}")
+            return retrieval_agent_fallback(state)
+        except Exception as e:
+            logger.error(f"推理发生错误：{e}")
+            messages = {"messages": [AIMessage(content="未找到有效内容")]}
+        logger.info("推理结束")
+
+    # retrieved_information 使用追加合并，并行分支各自只返回本分支的结果
     retrieved_info = messages["messages"][-1].content
-    retrieved_info_history = state.get("retrieved_information", [])
-    retrieved_info_history.append(retrieved_info)
     update_dict = {
-        "retrieved_information": retrieved_info_history
+        "retrieved_information": [retrieved_info]
     }
     
     return Command(
@@ -246,27 +396,47 @@ async def retrieval_agent_node(state: State, config: RunnableConfig) -> Command[
     )
 
 
-async def deal_with_results_node(state: State, config: RunnableConfig) -> Command[Literal["update_memory"]]:
+def retrieval_agent_fallback(state: State) -> Command[Literal["supervisor"]]:
+    """检索超时后的降级结果"""
+    return Command(
+        update={"retrieved_information": ["检索超时，未找到有效内容"]},
+        goto="supervisor"
+    )
+
+
+async def deal_with_results_node(state: State, config: RunnableConfig, writer: StreamWriter) -> Command[Literal["update_memory"]]:
     """处理结果，生成最终答案"""
     logger.info("generating final answer")
+    emit_progress(writer, "answering", retrieval=True)
     
     user_query = state.get("user_query")
-    memory_info = state.get("memory_info", [])
-    retrieved_information = state.get("retrieved_information", [])
     
     # 使用LLM生成最终答案
     llm = get_llm_by_type(AGENT_LLM_MAP.get("route", "basic"))
 
+    context = context_builder.assemble(state)
     prepare_params = {
         "user_query": user_query,
-        "memory_info": memory_info,
-        "retrieved_information": retrieved_information
+        "memory_info": context.memory_info,
+        "retrieved_information": context.retrieved_information
     }
-    system_msg = apply_prompt_template("answer", state, ** prepare_params)
-    msg = system_msg + state["messages"] + [HumanMessage(content="请根据以上参考信息，来回答用户最新的问题。")]
+    msg = build_prompt_messages("answer", state, context.history, **prepare_params)
+    msg.append(HumanMessage(content="请根据以上参考信息，来回答用户最新的问题。"))
+    context_builder.record("deal_with_results", context, msg)
     
     response = await llm.ainvoke(msg)
     final_answer = response.content
+
+    # 缓存检索路径的答案，键为改写后的独立问题，只在该用户的后续对话中命中
+    question = state.get("rewrite_query")
+    if settings.SEMANTIC_CACHE_ENABLED and final_answer and question:
+        try:
+            user_id = config.get("configurable", {}).get("user_id")
+            question_vector, _ = await _embed_text(state.get("embeddings") or {}, question)
+            latency_ms = (time.time() - state.get("turn_started_at", time.time())) * 1000
+            semantic_cache.store(str(user_id), question, question_vector, final_answer, latency_ms)
+        except Exception as e:
+            logger.error(f"写入语义缓存失败：{e}")
     
     return Command(
         update={"final_answer": final_answer},
@@ -275,49 +445,35 @@ async def deal_with_results_node(state: State, config: RunnableConfig) -> Comman
 
 
 async def update_memory_node(state: State, config: RunnableConfig) -> Command[Literal["__end__"]]:
-    """更新记忆，存储检索到的信息"""
+    """更新记忆，存储检索到的信息
+
+    MEMORY_CONSOLIDATION_ASYNC 开启时只把任务交给后台队列（见 src.services.memory_consolidator），
+    本轮回答不再等待记忆的判断、向量化与写入。
+    """
     logger.info("Update memory node storing retrieved information")
     
     final_answer = state.get("final_answer")
-    user_query = state.get("user_query")
-    memory_info = state.get("memory_info", [])
     needs_retrieval = state.get("needs_retrieval", False)
 
     if needs_retrieval:
         logger.info("使用了知识库进行检索，判断是否需要更新记忆")
-
-        llm = get_llm_by_type(AGENT_LLM_MAP.get("route", "basic"))
-
-        prepare_params = {
-            "user_query": user_query,
-            "answer": final_answer,
-            "memory_info": memory_info
-        }
-
-        system_msg = apply_prompt_template("update_memory", state, ** prepare_params)
-
-        msg = system_msg + state["messages"]
-
-        response = await llm.ainvoke(msg)
-
-        temp = response.content
-        logger.info(f"总结出的记忆：{temp}")
-        if temp:
-            # 写入向量数据库
-            rewrite_query = state.get("rewrite_query")
-            data = [{
-                "question": rewrite_query,
-                "question_embedding": get_text_embeddings(rewrite_query),
-                "answer": temp
-            }]
-            result = await milvus_service.insert_data("memory", data)
-
-            if result:
-                logger.info("写入成功")
-            else:
-                logger.warning("写入失败！")
+        job = MemoryJob(
+            user_query=state.get("user_query"),
+            rewrite_query=state.get("rewrite_query"),
+            answer=final_answer,
+            memory_info=state.get("memory_info", []),
+            messages=list(state["messages"]),
+            locale=state.get("locale", "zh-CN"),
+            embeddings=state.get("embeddings") or {}
+        )
+        # 后台协程未运行（未启动或应用正在关闭）时同步执行，不丢失本轮的记忆
+        if settings.MEMORY_CONSOLIDATION_ASYNC and memory_consolidator.running:
+            memory_consolidator.submit(job)
         else:
-            logger.info("无需更新记忆")
+            try:
+                await consolidate_memory(job)
+            except Exception as e:
+                logger.warning(f"写入失败！{e}")
     else:
         logger.info("没有使用知识库检索，无需更新记忆")
 
@@ -0,0 +1,20 @@
+"""节点进度事件
+
+节点开始执行时通过 LangGraph 的 custom 流写出一条进度事件（如路由中、查询记忆、第 N 轮检索），
+/chat/stream 将其作为 SSE progress 事件推送，检索路径在答案生成前也能尽快给出首字节。
+
+writer 由 LangGraph 注入到节点的 writer 参数中，再由节点传给 emit_progress。
+不使用 get_stream_writer()：它依赖 contextvars 在异步任务间传递运行上下文，Python 3.11 以下的异步节点中取不到
+（pyproject 要求 Python >= 3.10）。不在流式调用中（ainvoke、基准测试等）时 writer 不产生任何输出。
+"""
+
+from typing import Any, Optional
+
+from langgraph.types import StreamWriter
+
+
+def emit_progress(writer: Optional[StreamWriter], stage: str, **data: Any) -> None:
+    """写出一条进度事件：{"stage": stage, **data}"""
+    if writer is None:
+        return
+    writer({"stage": stage, **data})
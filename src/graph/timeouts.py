@@ -0,0 +1,61 @@
+"""图节点的超时预算
+
+每个节点在 NODE_TIMEOUTS 中配置的秒数内必须完成。节点本身是协程，
+超时后 asyncio 会取消节点内正在等待的 LLM 请求、检索工具调用等，连接随之释放，
+而不是像 asyncio.to_thread 那样只放弃等待、线程仍在后台运行。
+"""
+
+import asyncio
+import functools
+from typing import Awaitable, Callable, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.types import Command
+from loguru import logger
+
+from src.config.setting import settings
+from .types import State
+
+NodeFunc = Callable[..., Awaitable[Command]]
+
+
+class NodeTimeoutError(TimeoutError):
+    """节点超出超时预算"""
+
+    def __init__(self, node_name: str, timeout: float):
+        super().__init__(f"Node '{node_name}' exceeded its {timeout:g}s budget")
+        self.node_name = node_name
+        self.timeout = timeout
+
+
+def with_timeout(
+    node_name: str,
+    node: NodeFunc,
+    fallback: Optional[Callable[[State], Command]] = None
+) -> NodeFunc:
+    """为节点加上超时预算
+
+    Args:
+        node_name: 节点名，用于查找 NODE_TIMEOUTS 中的预算
+        node: 节点协程函数
+        fallback: 超时后的降级结果；为空时抛出 NodeTimeoutError
+
+    Returns:
+        包装后的节点函数，未配置预算时原样返回
+    """
+    timeout = settings.NODE_TIMEOUTS.get(node_name)
+    if not timeout:
+        return node
+
+    # functools.wraps 保留节点签名，LangGraph 按签名注入的参数（如 writer）原样传给节点
+    @functools.wraps(node)
+    async def wrapper(state: State, config: RunnableConfig, **kwargs) -> Command:
+        try:
+            return await asyncio.wait_for(node(state, config, **kwargs), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"节点 {node_name} 超过 {timeout:g}s 预算，已取消")
+            if fallback is None:
+                raise NodeTimeoutError(node_name, timeout)
+            return fallback(state)
+
+    return wrapper
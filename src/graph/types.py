@@ -23,6 +23,27 @@ def custom_messages_reducer(
     return add_messages(existing, new)
 
 
+def retrieved_information_reducer(
+    existing: Optional[List[str]],
+    new: Union[List[str], str]
+) -> List[str]:
+    """
+    检索结果合并函数
+    - 如果new是"delete"，则清空检索结果（每轮对话开始时）
+    - 否则追加到已有结果之后，并行的多个检索分支在同一步写入时依次合并
+    """
+    if new == "delete":
+        return []
+
+    if existing is None:
+        existing = []
+
+    if isinstance(new, str):
+        new = [new]
+
+    return existing + list(new)
+
+
 class State(TypedDict):
     """State for the agent system with custom messages handling."""
     
@@ -37,8 +58,13 @@ class State(TypedDict):
     memory_info: List[dict] = []
     needs_retrieval: bool = False  # update  memory will use this.
     task_description: List[str] = []
-    retrieved_information: List[str] = []
+    retrieved_information: Annotated[List[str], retrieved_information_reducer] = []
+    retrieval_task: str = ""  # 并行规划模式下，由 Send 传给单个检索分支的子任务
     max_retrieval_iterations: int = 3
     current_iteration: int = 0
     final_answer: str = ""
+    # 本轮已计算的向量：归一化文本 -> float32 字节串（见 src.utils.embedding.pack_vector）
+    embeddings: Dict[str, bytes] = {}
+    cache_hit: bool = False  # 本轮是否命中语义答案缓存
+    turn_started_at: float = 0.0
     
\ No newline at end of file
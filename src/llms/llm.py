@@ -14,6 +14,7 @@ from langchain_openai import AzureChatOpenAI, ChatOpenAI
 from src.config import load_yaml_config
 from src.config.agents import LLMType
 from src.llms.providers.dashscope import ChatDashscope
+from src.llms.usage import prompt_cache_tracker
 from src.config.setting import settings
 
 
@@ -121,7 +122,10 @@ def get_llm_by_type(llm_type: LLMType) -> BaseChatModel:
         base_url=settings.CHAT_BASE_URL,
         api_key=settings.CHAT_API_KEY,
         model=settings.CHAT_MODEL,
-        temperature=0.2
+        temperature=0.2,
+        # 流式调用也返回 usage，用于统计前缀缓存命中
+        stream_usage=True,
+        callbacks=[prompt_cache_tracker]
     )
     _llm_cache[llm_type] = llm
     return llm
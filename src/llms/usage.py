@@ -0,0 +1,99 @@
+"""模型服务端前缀缓存（prompt caching）命中统计
+
+DashScope / OpenAI 兼容接口会在响应的 usage.prompt_tokens_details.cached_tokens 中返回命中前缀缓存的 token 数，
+langchain-openai 将其映射到 usage_metadata.input_token_details.cache_read。
+这里作为回调挂在 LLM 实例上，按 LangGraph 节点汇总输入 token 与缓存命中 token，用于衡量 PROMPT_LAYOUT 的效果。
+"""
+
+import threading
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+
+class PromptCacheUsageTracker(BaseCallbackHandler):
+    """按节点统计输入 token 与前缀缓存命中 token"""
+
+    # 只做计数，在调用线程内直接执行即可，不需要放到线程池
+    run_inline = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._run_nodes: Dict[UUID, str] = {}
+        self._nodes: Dict[str, Dict[str, int]] = {}
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: Any,
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> None:
+        node = (metadata or {}).get("langgraph_node") or "other"
+        with self._lock:
+            self._run_nodes[run_id] = node
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            node = self._run_nodes.pop(run_id, "other")
+        input_tokens, cached_tokens = _extract_usage(response)
+        if input_tokens is None:
+            return
+        with self._lock:
+            stats = self._nodes.setdefault(node, {"calls": 0, "input_tokens": 0, "cached_tokens": 0})
+            stats["calls"] += 1
+            stats["input_tokens"] += input_tokens
+            stats["cached_tokens"] += cached_tokens
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._run_nodes.pop(run_id, None)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._nodes.clear()
+
+    def stats(self) -> dict:
+        """返回总体与各节点的缓存命中情况"""
+        with self._lock:
+            nodes = {node: dict(stats) for node, stats in self._nodes.items()}
+        for stats in nodes.values():
+            stats["cached_ratio"] = _ratio(stats["cached_tokens"], stats["input_tokens"])
+        input_tokens = sum(stats["input_tokens"] for stats in nodes.values())
+        cached_tokens = sum(stats["cached_tokens"] for stats in nodes.values())
+        return {
+            "calls": sum(stats["calls"] for stats in nodes.values()),
+            "input_tokens": input_tokens,
+            "cached_tokens": cached_tokens,
+            "cached_ratio": _ratio(cached_tokens, input_tokens),
+            "nodes": nodes,
+        }
+
+
+def _ratio(part: int, total: int) -> float:
+    return round(part / total, 4) if total else 0.0
+
+
+def _extract_usage(response: LLMResult) -> tuple[Optional[int], int]:
+    """从响应中取出 (输入 token 数, 命中缓存的 token 数)，没有 usage 时输入 token 数为 None"""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                details = usage.get("input_token_details") or {}
+                return usage.get("input_tokens", 0), details.get("cache_read") or 0
+
+    # 非 langchain-openai 的实现可能只在 llm_output 中返回原始 usage
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    if not token_usage:
+        return None, 0
+    details = token_usage.get("prompt_tokens_details") or {}
+    return token_usage.get("prompt_tokens", 0), details.get("cached_tokens") or 0
+
+
+# 全局实例
+prompt_cache_tracker = PromptCacheUsageTracker()
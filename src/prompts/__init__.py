@@ -1,5 +1,6 @@
-from .template import apply_prompt_template
+from .template import apply_prompt_template, build_prompt_messages
 
 __all__ = [
     "apply_prompt_template",
+    "build_prompt_messages",
 ]
@@ -3,9 +3,12 @@ GENERAL_ANSWER_PROMPT = """
 
 你是一个智能问答助手，用来对用户提出的问题进行回答，确保回答准确且贴合对话语境。
 
+"""
+
+GENERAL_ANSWER_CONTEXT = """
 # 当前信息
 - 当前时间：{CURRENT_TIME}
 - 用户偏好语言：{locale}
 - 用户的问题：{user_query}
 
-"""
\ No newline at end of file
+"""
@@ -4,10 +4,6 @@ GET_MEMORY_PROMPT = """
 
 你是一个会话上下文分析专家。你的唯一任务是基于当前对话的完整历史，将用户最新的省略句输入，还原成一个完整、独立、语义明确的疑问句。
 
-# 用户输入的最新问题
-
-{user_query}
-
 # 处理规则
 
 1.  **核心原则**：用户的最新输入是省略句，其缺失的关键信息一定在之前的聊天历史中。你必须从历史中找出被省略的指代对象或语境，并将其补全。
@@ -20,7 +16,7 @@ GET_MEMORY_PROMPT = """
 
 - 分析历史对话的主题和最新输入的含义。
 
-- 判断“{user_query}”中省略了什么？它指代的是历史中的哪个概念、对象或问题？
+- 判断用户输入的最新问题中省略了什么？它指代的是历史中的哪个概念、对象或问题？
 
 - 将指代内容与最新输入融合，组织成一个流畅、完整的句子。
 
@@ -41,3 +37,11 @@ Q：那上海市的呢？
 </例子>
 
 """
+
+GET_MEMORY_CONTEXT = """
+
+# 用户输入的最新问题
+
+{user_query}
+
+"""
@@ -4,6 +4,22 @@ SUPERVISOR_PROMPT = """
 
 你是多轮检索的决策节点，负责判断当前已知的信息是否足够回答用户问题，以此为依据决定是否启动新一轮检索。
 
+# 你的任务
+
+1. 查阅**已知的事实**中的信息，判断是否已足够回答用户问题
+
+2. 按照以下规则返回 **JSON** 格式结果：
+ - 若信息足够回答，则 needs_more_info 字段设置为 False，task_description_item 字段设置为空字符串。
+ - 若信息不足需要检索，则 needs_more_info 字段设置为 True, task_description_item 字段设置为具体的检索任务描述
+
+3. 注意：
+ - task_description需是具体、明确的检索需求，不重复已发布任务，且任务的字数应该严格限制为一句话（不超过50个字），**字数要求应该严格遵守限制，否则系统会出现异常**。
+ - 必须严格返回JSON格式，不包含任何额外文本
+
+"""
+
+SUPERVISOR_CONTEXT = """
+
 # 当前已知的信息
 
 ## 当前信息
@@ -27,22 +43,8 @@ SUPERVISOR_PROMPT = """
 {retrieved_information}
 
 
-### 当前会话的全部聊天历史记录
-
 ## 你已经发布的任务需求
 
 {task_description}
 
-# 你的任务
-
-1. 查阅**已知的事实**中的信息，判断是否已足够回答用户问题
-
-2. 按照以下规则返回 **JSON** 格式结果：
- - 若信息足够回答，则 needs_more_info 字段设置为 False，task_description_item 字段设置为空字符串。
- - 若信息不足需要检索，则 needs_more_info 字段设置为 True, task_description_item 字段设置为具体的检索任务描述
-
-3. 注意：
- - task_description需是具体、明确的检索需求，不重复已发布任务，且任务的字数应该严格限制为一句话（不超过50个字），**字数要求应该严格遵守限制，否则系统会出现异常**。
- - 必须严格返回JSON格式，不包含任何额外文本
-
 """
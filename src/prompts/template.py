@@ -1,43 +1,165 @@
+import importlib.util
 import os
+import string
+import threading
+import time
 from datetime import datetime
+from typing import Dict
 
-from langchain_core.messages import SystemMessage
+from langchain_core.messages import HumanMessage, SystemMessage
 from langgraph.prebuilt.chat_agent_executor import AgentState
+from loguru import logger
 
-def load_prompt_from_file(prompt_name: str) -> str:
+from src.config.setting import settings
+
+def _parse_fields(template: str) -> frozenset:
+    return frozenset(
+        field_name.split(".")[0].split("[")[0]
+        for _, field_name, _, _ in string.Formatter().parse(template)
+        if field_name
+    )
+
+
+class PromptTemplate:
+    """加载并预解析后的 prompt 模板
+
+    template 为静态指令（{NAME}_PROMPT），context 为可选的易变上下文（{NAME}_CONTEXT），
+    如当前时间、用户问题、检索结果等每次调用都会变化的内容。
     """
-    从 Python 文件中加载 prompt 模板。
 
-    Args:
-        prompt_name: prompt 文件名（不包含 .py 扩展名）
+    def __init__(self, name: str, template: str, path: str, mtime: float, context: str = ""):
+        self.name = name
+        self.template = template
+        self.context = context
+        self.path = path
+        self.mtime = mtime
+        # 预先解析出模板中的占位符，格式化时无需再扫描模板
+        self.fields = _parse_fields(template) | _parse_fields(context)
 
-    Returns:
-        模板字符串
+    def format(self, **params) -> str:
+        """静态指令与上下文合并为一段（上下文在前，即原有布局）"""
+        if not self.context:
+            return self.template.format(**params)
+        return self.context.format(**params) + self.template.format(**params)
+
+    def format_instructions(self, **params) -> str:
+        return self.template.format(**params)
+
+    def format_context(self, **params) -> str:
+        return self.context.format(**params)
+
+
+class PromptRegistry:
+    """prompt 模板注册表
+
+    启动时一次性加载 src/prompts 下的全部模板，之后 apply_prompt_template 只做一次字典查找。
+    开启 hot_reload（开发环境）时，每隔 reload_interval 秒检查一次文件修改时间，文件变化后重新加载。
     """
-    try:
-        # 构建文件路径
-        current_dir = os.path.dirname(__file__)
-        prompt_file_path = os.path.join(current_dir, f"{prompt_name}.py")
-        
-        # 检查文件是否存在
+
+    _EXCLUDED = {"__init__", "template"}
+
+    def __init__(self, prompt_dir: str, hot_reload: bool = False, reload_interval: float = 1.0):
+        self.prompt_dir = prompt_dir
+        self.hot_reload = hot_reload
+        self.reload_interval = reload_interval
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._last_checked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, prompt_name: str) -> str:
+        return os.path.join(self.prompt_dir, f"{prompt_name}.py")
+
+    def _load(self, prompt_name: str) -> PromptTemplate:
+        """从 Python 文件中加载 prompt 模板（变量名为 {PROMPT_NAME}_PROMPT，可选的上下文为 {PROMPT_NAME}_CONTEXT）"""
+        prompt_file_path = self._path(prompt_name)
         if not os.path.exists(prompt_file_path):
             raise FileNotFoundError(f"Prompt file {prompt_file_path} not found")
-        
-        # 动态导入模块
-        import importlib.util
+
+        mtime = os.path.getmtime(prompt_file_path)
         spec = importlib.util.spec_from_file_location(prompt_name, prompt_file_path)
         module = importlib.util.module_from_spec(spec)
         spec.loader.exec_module(module)
-        
-        # 获取模板变量（假设变量名为 {PROMPT_NAME}_PROMPT）
+
         template_var_name = f"{prompt_name.upper()}_PROMPT"
-        if hasattr(module, template_var_name):
-            return getattr(module, template_var_name)
-        else:
+        if not hasattr(module, template_var_name):
             raise AttributeError(f"Template variable {template_var_name} not found in {prompt_name}.py")
-        
-    except Exception as e:
-        raise ValueError(f"Error loading prompt file {prompt_name}: {e}")
+        context = getattr(module, f"{prompt_name.upper()}_CONTEXT", "")
+        return PromptTemplate(prompt_name, getattr(module, template_var_name), prompt_file_path, mtime, context)
+
+    def load_all(self) -> None:
+        """加载目录下的全部模板"""
+        for file_name in sorted(os.listdir(self.prompt_dir)):
+            prompt_name, ext = os.path.splitext(file_name)
+            if ext != ".py" or prompt_name in self._EXCLUDED:
+                continue
+            try:
+                self._templates[prompt_name] = self._load(prompt_name)
+            except Exception as e:
+                logger.error(f"Error loading prompt file {prompt_name}: {e}")
+        logger.info(f"Loaded {len(self._templates)} prompt templates (hot_reload={self.hot_reload})")
+
+    def _reload_if_changed(self, prompt_name: str, cached: PromptTemplate) -> PromptTemplate:
+        now = time.monotonic()
+        if now - self._last_checked.get(prompt_name, 0.0) < self.reload_interval:
+            return cached
+        self._last_checked[prompt_name] = now
+        try:
+            if os.path.getmtime(cached.path) == cached.mtime:
+                return cached
+            with self._lock:
+                template = self._load(prompt_name)
+                self._templates[prompt_name] = template
+            logger.info(f"Prompt template {prompt_name} reloaded")
+            return template
+        except Exception as e:
+            # 编辑过程中文件可能暂时不可用或有语法错误，继续使用旧模板
+            logger.warning(f"Failed to reload prompt {prompt_name}, keeping previous version: {e}")
+            return cached
+
+    def get(self, prompt_name: str) -> PromptTemplate:
+        """按名称获取模板，未预加载的模板首次使用时加载"""
+        template = self._templates.get(prompt_name)
+        if template is None:
+            with self._lock:
+                template = self._templates.get(prompt_name)
+                if template is None:
+                    try:
+                        template = self._load(prompt_name)
+                    except Exception as e:
+                        raise ValueError(f"Error loading prompt file {prompt_name}: {e}")
+                    self._templates[prompt_name] = template
+            return template
+        if self.hot_reload:
+            return self._reload_if_changed(prompt_name, template)
+        return template
+
+    def names(self) -> list:
+        return sorted(self._templates)
+
+
+# 全局实例：导入时加载全部模板
+prompt_registry = PromptRegistry(os.path.dirname(__file__), hot_reload=settings.PROMPT_HOT_RELOAD)
+prompt_registry.load_all()
+
+
+def load_prompt_from_file(prompt_name: str) -> str:
+    """
+    获取 prompt 模板字符串（从注册表中读取，不再每次重新导入文件）。
+
+    Args:
+        prompt_name: prompt 文件名（不包含 .py 扩展名）
+
+    Returns:
+        模板字符串
+    """
+    return prompt_registry.get(prompt_name).template
+
+
+def _template_params(template: PromptTemplate, state: AgentState, kwargs: dict) -> dict:
+    # 模板未使用 CURRENT_TIME 时跳过时间格式化
+    current_time = datetime.now().strftime("%a %b %d %Y %H:%M:%S %z") if "CURRENT_TIME" in template.fields else ""
+    locale = state.get("locale", "zh-CN")
+    return {"CURRENT_TIME": current_time, "locale": locale, **kwargs}
 
 
 def apply_prompt_template(
@@ -53,19 +175,41 @@ def apply_prompt_template(
     Returns:
         包含系统 prompt 作为第一条消息的消息列表
     """
-    template = load_prompt_from_file(prompt_name)
-    current_time = datetime.now().strftime("%a %b %d %Y %H:%M:%S %z")
-    locale = state.get("locale", "zh-CN")
+    template = prompt_registry.get(prompt_name)
+    system_prompt = template.format(**_template_params(template, state, kwargs))
 
-    params = {**kwargs}
+    return [SystemMessage(content=system_prompt)]
 
-    system_prompt = template.format(
-        CURRENT_TIME=current_time,
-        locale=locale,
-        **params
-    )
 
-    return [SystemMessage(content=system_prompt)]
+def build_prompt_messages(
+    prompt_name: str, state: AgentState, messages: list, **kwargs
+) -> list:
+    """
+    按 PROMPT_LAYOUT 组装完整的消息列表：系统 prompt + 聊天记录 messages + 易变上下文。
+
+    - prefix_stable：系统消息只包含静态指令，各次调用逐字节一致；当前时间、用户问题、检索结果等
+      放在聊天记录之后的最后一条消息中，使模型服务端的前缀缓存（prompt caching）能够命中
+    - legacy：原有布局，易变上下文位于系统消息开头
+
+    Args:
+        prompt_name: 要使用的 prompt 模板名称
+        state: 当前 agent 状态，包含要替换的变量
+        messages: 放在系统 prompt 之后的聊天记录
+
+    Returns:
+        完整的消息列表
+    """
+    template = prompt_registry.get(prompt_name)
+    params = _template_params(template, state, kwargs)
+
+    if settings.PROMPT_LAYOUT != "prefix_stable" or not template.context:
+        return [SystemMessage(content=template.format(**params))] + list(messages)
+
+    return (
+        [SystemMessage(content=template.format_instructions(**params))]
+        + list(messages)
+        + [HumanMessage(content=template.format_context(**params))]
+    )
 
 if __name__ == "__main__":
-    print(load_prompt_from_file("chat"))
+    print(load_prompt_from_file("answer"))
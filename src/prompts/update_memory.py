@@ -4,29 +4,6 @@ UPDATE_MEMORY_PROMPT = """
 
 你是记忆更新判断助手，负责判断智能助手的回答是否需要记忆。
 
-# 当前已知的信息
-
-## 当前信息
-- 当前时间：{CURRENT_TIME}
-- 用户偏好语言：{locale}
-
-## 已知的事实
-
-### 用户的问题
-
-{user_query}
-
-### 智能助手的回答
-
-{answer}
-
-
-### 记忆模块的信息
-
-{memory_info}
-
-### 当前会话的全部聊天历史记录
-
 # 你的任务
 
 判断智能助手的回答是否需要被存储以更新记忆：
@@ -60,3 +37,28 @@ A：ETF（交易所交易基金）是一种跟踪特定指数的开放式基金
 ## C.返回 ""
 
 """
+
+UPDATE_MEMORY_CONTEXT = """
+
+# 当前已知的信息
+
+## 当前信息
+- 当前时间：{CURRENT_TIME}
+- 用户偏好语言：{locale}
+
+## 已知的事实
+
+### 用户的问题
+
+{user_query}
+
+### 智能助手的回答
+
+{answer}
+
+
+### 记忆模块的信息
+
+{memory_info}
+
+"""
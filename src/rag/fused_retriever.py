@@ -0,0 +1,137 @@
+"""单次检索的相似度 + MMR 融合检索器
+
+原实现用 EnsembleRetriever 组合 similarity 与 mmr 两个检索器，每次工具调用先后发起两次 Milvus 搜索
+（mmr 还要按主键再取一次候选向量），再把两组结果的并集交给重排。这里改为：
+- 一次 ANN 搜索取回 fetch_k 个候选，连同其向量一起返回
+- 按原文去重（切分时的重叠块、重复写入的文档）
+- 在本地用 NumPy 做 MMR 选择，输出 相似度前 k 个 ∪ MMR 选出的 k 个，与原 ensemble 的结果集一致，
+  只需一次服务端往返
+
+与原 ensemble 的延迟对比：python -m src.test.benchmark_fused_retriever
+"""
+
+import hashlib
+from typing import List
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from loguru import logger
+
+from src.services.milvus import milvus_service
+from src.services.milvus_async import async_milvus_service
+from src.utils.embedding import QUERY, embedding_service, normalize_text
+
+
+def mmr_select(query_vector: np.ndarray, candidates: np.ndarray, k: int, lambda_mult: float = 0.5) -> List[int]:
+    """最大边际相关性选择，返回选中候选的下标（按选择顺序）
+
+    相关度与多样性都用余弦相似度；每选中一个候选只做一次矩阵-向量乘法更新各候选与已选集合的最大相似度。
+    """
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+    candidates = candidates / (np.linalg.norm(candidates, axis=1, keepdims=True) + 1e-12)
+    query_vector = query_vector / (np.linalg.norm(query_vector) + 1e-12)
+    relevance = candidates @ query_vector
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = candidates @ candidates[selected[0]]
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < min(k, n):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        index = int(np.argmax(scores))
+        selected.append(index)
+        available[index] = False
+        np.maximum(max_similarity, candidates @ candidates[index], out=max_similarity)
+    return selected
+
+
+class FusedMMRRetriever(BaseRetriever):
+    """一次 ANN 搜索 + 本地 MMR 的知识库检索器"""
+
+    collection_name: str = "knowledge"
+    text_field: str = "text"
+    vector_field: str = "vector"
+    k: int = 4
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+
+    def _search_kwargs(self, query_vector: List[float]) -> dict:
+        # "*" 返回全部标量字段，向量字段需单独列出；
+        # 检索失败时抛出异常，避免空结果被当作“没有相关文档”交给 agent 或写入检索结果缓存
+        return dict(
+            collection_name=self.collection_name,
+            query_vector=list(query_vector),
+            anns_field=self.vector_field,
+            output_fields=["*", self.vector_field],
+            limit=self.fetch_k,
+            raise_on_error=True
+        )
+
+    def _dedupe(self, hits: list[dict]) -> list[dict]:
+        """按原文去重，保留相似度最高的一条，候选中带有各自的向量"""
+        seen, candidates = set(), []
+        for hit in hits or []:
+            fields = dict(hit["fields"])
+            text = fields.pop(self.text_field, "") or ""
+            key = hashlib.md5(normalize_text(text).encode("utf-8")).hexdigest()
+            if key in seen:
+                continue
+            seen.add(key)
+            candidates.append({
+                "id": hit["id"],
+                "score": hit["distance"],
+                "text": text,
+                "vector": fields.pop(self.vector_field, None),
+                "metadata": fields,
+            })
+        return candidates
+
+    async def search_candidates(self, query: str) -> tuple[np.ndarray, list[dict]]:
+        """返回 (查询向量, 按相似度排序且去重后的候选)，候选中带有各自的向量"""
+        query_vector = await embedding_service.aembed(query)
+        hits = await async_milvus_service.search_data_by_single_vector(**self._search_kwargs(query_vector))
+        return np.asarray(query_vector, dtype=np.float32), self._dedupe(hits)
+
+    def search_candidates_sync(self, query: str) -> tuple[np.ndarray, list[dict]]:
+        """search_candidates 的同步版本，走同步 Milvus 客户端（异步连接池绑定在应用的事件循环上）"""
+        query_vector = embedding_service.embed_many([query], QUERY)[0]
+        hits = milvus_service.search_by_single_vector_sync(**self._search_kwargs(query_vector))
+        return np.asarray(query_vector, dtype=np.float32), self._dedupe(hits)
+
+    def select(self, query_vector: np.ndarray, candidates: list[dict]) -> list[dict]:
+        """相似度前 k 个 ∪ MMR 选出的 k 个（先相似度，后 MMR 补充的多样结果）"""
+        top = list(range(min(self.k, len(candidates))))
+        with_vectors = [i for i, c in enumerate(candidates) if c["vector"] is not None]
+        if len(with_vectors) < len(candidates):
+            # 服务端未返回向量时只能退化为相似度结果
+            logger.warning(f"{self.collection_name} 搜索结果中缺少向量字段 {self.vector_field}，跳过 MMR")
+            return [candidates[i] for i in top]
+
+        vectors = np.asarray([c["vector"] for c in candidates], dtype=np.float32)
+        diverse = mmr_select(query_vector, vectors, self.k, self.lambda_mult)
+        chosen = top + [i for i in diverse if i not in top]
+        return [candidates[i] for i in chosen]
+
+    def _to_documents(self, query_vector: np.ndarray, candidates: list[dict]) -> List[Document]:
+        return [
+            Document(
+                page_content=c["text"],
+                metadata={**c["metadata"], "pk": c["id"], "score": c["score"]}
+            )
+            for c in self.select(query_vector, candidates)
+        ]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self._to_documents(*await self.search_candidates(query))
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self._to_documents(*self.search_candidates_sync(query))
@@ -0,0 +1,56 @@
+"""知识库集合的字段与检索参数
+
+dense：原有的单向量集合（默认字段 vector），只做稠密向量相似度检索。
+hybrid：在同一集合中增加 BM25 稀疏向量字段，由 Milvus 的 BM25 内置函数在写入时根据原文自动生成，
+使用中文分词器（analyzer type=chinese），条款编号（如“第十条”）、专有名词等精确匹配不再依赖稠密向量。
+检索时稠密与稀疏两路在 Milvus 服务端一次 hybrid_search 完成，并按 RRF 或加权方式融合。
+
+两种模式的集合结构不同，切换到 hybrid 需要用 python -m src.script.process_markdown --mode hybrid
+重新写入知识库（写入 KNOWLEDGE_HYBRID_COLLECTION，原集合不受影响）。
+"""
+
+from langchain_milvus import BM25BuiltInFunction
+
+from src.config.setting import settings
+
+DENSE = "dense"
+HYBRID = "hybrid"
+
+DENSE_FIELD = "dense"
+SPARSE_FIELD = "sparse"
+TEXT_FIELD = "text"
+
+_DENSE_INDEX_PARAMS = {"index_type": "IVF_FLAT", "metric_type": "COSINE"}
+_SPARSE_INDEX_PARAMS = {"index_type": "SPARSE_INVERTED_INDEX", "metric_type": "BM25"}
+
+
+def knowledge_collection(mode: str = settings.RETRIEVAL_MODE) -> str:
+    """模式对应的知识库集合名"""
+    return settings.KNOWLEDGE_HYBRID_COLLECTION if mode == HYBRID else "knowledge"
+
+
+def knowledge_store_kwargs(mode: str = settings.RETRIEVAL_MODE) -> dict:
+    """构造 langchain_milvus.Milvus 时与模式相关的参数，写入与检索两端共用，保证集合结构一致"""
+    if mode == DENSE:
+        return {"collection_name": knowledge_collection(mode), "index_params": dict(_DENSE_INDEX_PARAMS)}
+    if mode != HYBRID:
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+    return {
+        "collection_name": knowledge_collection(mode),
+        "builtin_function": BM25BuiltInFunction(
+            input_field_names=TEXT_FIELD,
+            output_field_names=SPARSE_FIELD,
+            analyzer_params={"type": "chinese"},
+        ),
+        "text_field": TEXT_FIELD,
+        # 顺序与 HYBRID_WEIGHTS 对应：稠密在前，稀疏在后
+        "vector_field": [DENSE_FIELD, SPARSE_FIELD],
+        "index_params": [dict(_DENSE_INDEX_PARAMS), dict(_SPARSE_INDEX_PARAMS)],
+    }
+
+
+def hybrid_search_kwargs() -> dict:
+    """hybrid_search 的融合方式：rrf（按排名融合，参数 k）或 weighted（按分数加权）"""
+    if settings.HYBRID_RANKER == "weighted":
+        return {"ranker_type": "weighted", "ranker_params": {"weights": list(settings.HYBRID_WEIGHTS)}}
+    return {"ranker_type": "rrf", "ranker_params": {"k": settings.HYBRID_RRF_K}}
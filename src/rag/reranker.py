@@ -0,0 +1,284 @@
+"""检索结果重排
+
+原实现由 ContextualCompressionRetriever 直接调用 DashScopeRerank，每次工具调用都把全部候选文档的全文
+（切分块最长 6000 字）发送到远端。这里在重排器前面加一层：
+- 分数缓存：键为 (后端, 查询哈希, 文档 id)，文档 id 为内容哈希（重新写入知识库后仍可命中），LRU 淘汰；重复或相互重叠的查询只对未见过的文档打分
+- 打分前按 token 预算（RERANK_MAX_DOC_TOKENS）截断候选文档
+- 未命中缓存的文档按 RERANK_BATCH_SIZE 分批打分，打分在线程中执行，不阻塞事件循环
+- 后端可替换：dashscope（远端服务）或 onnx（本地 CPU 上运行的 cross-encoder，如导出为 ONNX 的 bge-reranker）
+
+onnx 后端需要安装 onnxruntime，模型目录（RERANK_MODEL_PATH）下需包含 model.onnx 与 tokenizer.json。
+效果对比：python -m src.test.benchmark_reranker
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+from loguru import logger
+
+from src.config.setting import settings
+from src.utils.context_builder import TokenCounter
+from src.utils.embedding import normalize_text
+
+
+class RerankBackend(Protocol):
+    """重排打分后端，score 返回与 documents 一一对应的相关度分数"""
+
+    name: str
+    # 是否通过网络发送文档（用于统计发送字节数）
+    remote: bool
+
+    def score(self, query: str, documents: List[str]) -> List[float]:
+        ...
+
+
+class DashScopeRerankBackend:
+    """百炼重排服务"""
+
+    remote = True
+
+    def __init__(self, api_key: str, model: str = "gte-rerank"):
+        self.name = f"dashscope:{model}"
+        self.api_key = api_key
+        self.model = model
+        self._client = None
+
+    def score(self, query: str, documents: List[str]) -> List[float]:
+        if self._client is None:
+            from langchain_community.document_compressors.dashscope_rerank import DashScopeRerank
+
+            self._client = DashScopeRerank(model=self.model, dashscope_api_key=self.api_key)
+        results = self._client.rerank(documents, query, top_n=None)
+        scores = [0.0] * len(documents)
+        for result in results:
+            scores[result["index"]] = result["relevance_score"]
+        return scores
+
+
+class OnnxCrossEncoderBackend:
+    """本地 CPU 上运行的 ONNX cross-encoder，首次打分时加载模型"""
+
+    remote = False
+
+    def __init__(self, model_path: str, max_length: int = 512, threads: int = 0):
+        self.name = f"onnx:{os.path.basename(os.path.normpath(model_path))}"
+        self.model_path = model_path
+        self.max_length = max_length
+        self.threads = threads
+        self._session = None
+        self._tokenizer = None
+        self._input_names: set = set()
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError("RERANK_BACKEND=onnx 需要安装 onnxruntime 与 tokenizers") from e
+
+        options = onnxruntime.SessionOptions()
+        if self.threads > 0:
+            options.intra_op_num_threads = self.threads
+        session = onnxruntime.InferenceSession(
+            os.path.join(self.model_path, "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        tokenizer = Tokenizer.from_file(os.path.join(self.model_path, "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=self.max_length)
+        tokenizer.enable_padding()
+        self._input_names = {i.name for i in session.get_inputs()}
+        self._tokenizer, self._session = tokenizer, session
+        logger.info(f"Loaded ONNX reranker from {self.model_path}")
+
+    def score(self, query: str, documents: List[str]) -> List[float]:
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._load()
+
+        encodings = self._tokenizer.encode_batch([(query, document) for document in documents])
+        inputs = {
+            "input_ids": np.asarray([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.asarray([e.attention_mask for e in encodings], dtype=np.int64),
+        }
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.asarray([e.type_ids for e in encodings], dtype=np.int64)
+        logits = self._session.run(None, inputs)[0]
+        if logits.ndim == 2 and logits.shape[1] == 2:
+            # 两分类输出：“相关”与“不相关”的 logit 之差
+            logits = logits[:, 1] - logits[:, 0]
+        logits = logits.reshape(len(documents))
+        return (1 / (1 + np.exp(-logits))).tolist()
+
+
+class Reranker:
+    """带分数缓存、截断与分批打分的重排器"""
+
+    def __init__(
+        self,
+        backend: RerankBackend,
+        top_n: int = 3,
+        max_doc_tokens: int = 512,
+        batch_size: int = 16,
+        cache_size: int = 10000,
+        counter: Optional[TokenCounter] = None
+    ):
+        self.backend = backend
+        self.top_n = top_n
+        self.max_doc_tokens = max_doc_tokens
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.counter = counter or TokenCounter()
+
+        self._cache: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.documents = 0
+        self.cache_hits = 0
+        self.backend_calls = 0
+        self.bytes_sent = 0
+        self.total_ms = 0.0
+
+    def _lookup(self, query: str, documents: Sequence[Document]) -> tuple[list, list, list]:
+        """返回 (缓存键, 已知分数（未命中为 None）, 未命中的下标)"""
+        # 查询做归一化，改写结果只差空白或全半角时也能命中；文档内容直接哈希，切分块较长，避免重复归一化
+        query_hash = hashlib.md5(normalize_text(query).encode("utf-8")).hexdigest()
+        keys = [
+            (self.backend.name, query_hash, hashlib.md5(doc.page_content.encode("utf-8")).hexdigest())
+            for doc in documents
+        ]
+        scores, missing = [], []
+        with self._lock:
+            for i, key in enumerate(keys):
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                elif key in keys[:i]:
+                    # 同一批候选中的重复文档只打分一次
+                    pass
+                else:
+                    missing.append(i)
+                scores.append(score)
+        return keys, scores, missing
+
+    def _store(self, keys: list, missing: list, fetched: list) -> None:
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            for i, score in zip(missing, fetched):
+                self._cache[keys[i]] = score
+                self._cache.move_to_end(keys[i])
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _batches(self, query: str, documents: Sequence[Document], missing: list) -> List[List[str]]:
+        texts = [self.counter.truncate(documents[i].page_content, self.max_doc_tokens) for i in missing]
+        if self.backend.remote:
+            self.bytes_sent += sum(len(query.encode("utf-8")) + len(t.encode("utf-8")) for t in texts)
+        return [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+    def _select(self, documents: Sequence[Document], keys: list, scores: list, fetched: dict) -> List[Document]:
+        scored = {}
+        for doc, key, score in zip(documents, keys, scores):
+            score = fetched.get(key, score)
+            # 同一文档只保留一份
+            if score is None or key in scored:
+                continue
+            scored[key] = Document(page_content=doc.page_content, metadata={**doc.metadata, "relevance_score": score})
+        ranked = sorted(scored.values(), key=lambda doc: doc.metadata["relevance_score"], reverse=True)
+        return ranked[:self.top_n]
+
+    def _finish(self, documents, keys, scores, missing, fetched_scores, started) -> List[Document]:
+        self._store(keys, missing, fetched_scores)
+        fetched = {keys[i]: score for i, score in zip(missing, fetched_scores)}
+        with self._lock:
+            self.calls += 1
+            self.documents += len(documents)
+            self.cache_hits += sum(1 for score in scores if score is not None)
+            self.total_ms += (time.perf_counter() - started) * 1000
+        return self._select(documents, keys, scores, fetched)
+
+    def rerank(self, query: str, documents: Sequence[Document]) -> List[Document]:
+        """重排并返回 top_n 个文档，分数写入 metadata["relevance_score"]"""
+        started = time.perf_counter()
+        if not documents:
+            return []
+        keys, scores, missing = self._lookup(query, documents)
+        fetched_scores = []
+        for batch in self._batches(query, documents, missing):
+            self.backend_calls += 1
+            fetched_scores.extend(self.backend.score(query, batch))
+        return self._finish(documents, keys, scores, missing, fetched_scores, started)
+
+    async def arerank(self, query: str, documents: Sequence[Document]) -> List[Document]:
+        """异步重排，打分（模型推理或 SDK 同步调用）放到线程中执行"""
+        started = time.perf_counter()
+        if not documents:
+            return []
+        keys, scores, missing = self._lookup(query, documents)
+        fetched_scores = []
+        for batch in self._batches(query, documents, missing):
+            self.backend_calls += 1
+            fetched_scores.extend(await asyncio.to_thread(self.backend.score, query, batch))
+        return self._finish(documents, keys, scores, missing, fetched_scores, started)
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        """返回缓存命中与打分统计"""
+        with self._lock:
+            return {
+                "backend": self.backend.name,
+                "calls": self.calls,
+                "documents": self.documents,
+                "cache_hits": self.cache_hits,
+                "hit_ratio": round(self.cache_hits / self.documents, 4) if self.documents else 0.0,
+                "cache_entries": len(self._cache),
+                "backend_calls": self.backend_calls,
+                "bytes_sent": self.bytes_sent,
+                "avg_ms": round(self.total_ms / self.calls, 2) if self.calls else 0.0,
+            }
+
+
+class RerankCompressor(BaseDocumentCompressor):
+    """供 ContextualCompressionRetriever 使用的重排器适配"""
+
+    reranker: Any
+
+    def compress_documents(
+        self, documents: Sequence[Document], query: str, callbacks: Callbacks = None
+    ) -> Sequence[Document]:
+        return self.reranker.rerank(query, documents)
+
+    async def acompress_documents(
+        self, documents: Sequence[Document], query: str, callbacks: Callbacks = None
+    ) -> Sequence[Document]:
+        return await self.reranker.arerank(query, documents)
+
+
+def _create_backend() -> RerankBackend:
+    if settings.RERANK_BACKEND == "onnx":
+        return OnnxCrossEncoderBackend(settings.RERANK_MODEL_PATH, threads=settings.RERANK_ONNX_THREADS)
+    return DashScopeRerankBackend(settings.EMBEDDING_API_KEY)
+
+
+# 全局实例
+reranker = Reranker(
+    _create_backend(),
+    top_n=settings.RERANK_TOP_N,
+    max_doc_tokens=settings.RERANK_MAX_DOC_TOKENS,
+    batch_size=settings.RERANK_BATCH_SIZE,
+    cache_size=settings.RERANK_CACHE_SIZE,
+    counter=TokenCounter(settings.CONTEXT_TOKENIZER)
+)
@@ -1,32 +1,41 @@
+import asyncio
+
+from langchain_core.callbacks import Callbacks
 from langchain_milvus import Milvus
-from langchain_community.embeddings import DashScopeEmbeddings
+from loguru import logger
 from langchain.retrievers import EnsembleRetriever
-from langchain_community.document_compressors.dashscope_rerank import DashScopeRerank
 from langchain.retrievers.contextual_compression import ContextualCompressionRetriever
 from src.config.setting import settings
+from src.rag.fused_retriever import FusedMMRRetriever
+from src.rag.knowledge_store import HYBRID, hybrid_search_kwargs, knowledge_collection, knowledge_store_kwargs
+from src.rag.reranker import RerankCompressor, reranker
+from src.utils.embedding import CachedEmbeddings, embedding_service
+from src.utils.retrieval_cache import CachedRetriever, retrieval_cache
 from langchain.tools.retriever import create_retriever_tool
 
 class milvus_retriever:
-    def __init__(self) -> None:
-        embedding_fn = DashScopeEmbeddings(
-            model=settings.EMBEDDING_MODEL,
-            dashscope_api_key=settings.EMBEDDING_API_KEY
-        )
+    def __init__(self, mode: str = settings.RETRIEVAL_MODE, dense_retriever: str = settings.DENSE_RETRIEVER) -> None:
+        # 与记忆模块共用同一个向量化服务和缓存
+        embedding_fn = CachedEmbeddings(embedding_service)
 
+        self.mode = mode
+        self.dense_retriever = dense_retriever
         self.vector_db = Milvus(
             embedding_function=embedding_fn,
-            collection_name="knowledge",
             connection_args={
                 "uri": f"http://{settings.MILVUS_HOST}:{settings.MILVUS_PORT}",
                 "db_name": f"{settings.MILVUS_DATABASE}"
-            }
+            },
+            **knowledge_store_kwargs(mode)
         )
 
-        self.rerank_model = DashScopeRerank(
-            dashscope_api_key=settings.EMBEDDING_API_KEY
-        )
+        # 带分数缓存的重排器，后端由 RERANK_BACKEND 选择
+        self.rerank_model = RerankCompressor(reranker=reranker)
 
         self.top_k = 4
+        # Milvus 服务端搜索超时与整个检索工具调用（含重排）的超时
+        self.search_timeout = settings.MILVUS_CALL_TIMEOUT_SECONDS
+        self.tool_timeout = settings.RETRIEVAL_TOOL_TIMEOUT_SECONDS
 
     def _create_retriever(self, search_type, search_kwargs):
         return self.vector_db.as_retriever(
@@ -36,17 +45,32 @@ class milvus_retriever:
 
     def get_retriever(self):
         try:
-            retriever_similarity = self._create_retriever("similarity", {"k": self.top_k})
+            search_kwargs = {"k": self.top_k, "timeout": self.search_timeout}
+            if self.mode == HYBRID:
+                # 稠密 + BM25 两路在服务端一次 hybrid_search 完成并融合（多向量字段不支持 MMR）
+                base_retriever = self._create_retriever(
+                    "similarity", {**search_kwargs, **hybrid_search_kwargs()}
+                )
+            elif self.dense_retriever == "fused":
+                # 一次搜索取回候选及其向量，本地完成 MMR 与去重
+                base_retriever = FusedMMRRetriever(
+                    collection_name=knowledge_collection(self.mode),
+                    k=self.top_k,
+                    fetch_k=settings.RETRIEVAL_FETCH_K,
+                    lambda_mult=settings.RETRIEVAL_MMR_LAMBDA
+                )
+            else:
+                retriever_similarity = self._create_retriever("similarity", search_kwargs)
 
-            retriever_mmr = self._create_retriever("mmr", {"k": self.top_k})
+                retriever_mmr = self._create_retriever("mmr", search_kwargs)
 
-            ensemble_retriever = EnsembleRetriever(
-                retrievers=[retriever_similarity, retriever_mmr]
-            )        
+                base_retriever = EnsembleRetriever(
+                    retrievers=[retriever_similarity, retriever_mmr]
+                )
 
             compression_retriever = ContextualCompressionRetriever(
                 base_compressor=self.rerank_model,
-                base_retriever=ensemble_retriever,
+                base_retriever=base_retriever,
             )
 
             return compression_retriever
@@ -54,11 +78,34 @@ class milvus_retriever:
             raise ValueError(f"创建工具时出错：{e}")
     
     def create_retriever_tool(self, retriever):
+        name = "政策文件内容检索器"
+        if settings.RETRIEVAL_CACHE_ENABLED:
+            # 相同（归一化后）查询直接返回缓存的重排结果，知识库重新导入后失效
+            retriever = CachedRetriever(
+                retriever=retriever,
+                cache=retrieval_cache,
+                tool_name=name,
+                scope=f"{knowledge_collection(self.mode)}:{self.mode}:{self.dense_retriever}"
+            )
+
         retriever_tool = create_retriever_tool(
             retriever, 
-            "政策文件内容检索器", 
+            name, 
             "搜索和返回关于中央及银保监会金融监管政策文件的内容"
         )
+
+        # 异步调用加上超时：超时后取消检索（Milvus 异步搜索随之中断），返回提示信息给 agent
+        retrieve = retriever_tool.coroutine
+        tool_timeout = self.tool_timeout
+
+        async def retrieve_with_timeout(query: str, callbacks: Callbacks = None) -> str:
+            try:
+                return await asyncio.wait_for(retrieve(query, callbacks=callbacks), timeout=tool_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"知识库检索超过 {tool_timeout:g}s，已取消：{query}")
+                return "检索超时，未获取到相关内容"
+
+        retriever_tool.coroutine = retrieve_with_timeout
         return retriever_tool
 
 client = milvus_retriever()
@@ -67,16 +114,18 @@ retriever_tool = client.create_retriever_tool(retriever_instance)
 
 
 if __name__ == "__main__":
+    import asyncio
+
     from src.agents.agents import get_react_agent
 
     client = milvus_retriever()
     retriever_instance = client.get_retriever()
     retriever_tool = client.create_retriever_tool(retriever_instance)
-    # results = retriever_tool.invoke("资本工具合作标准是什么？")
+    # results = asyncio.run(retriever_tool.ainvoke("资本工具合作标准是什么？"))
     
     agent = get_react_agent([retriever_tool], "research")
     query = "资本工具合作标准是什么？"
-    message = agent.invoke({"messages": [("human", query)]})
+    message = asyncio.run(agent.ainvoke({"messages": [("human", query)]}))
     print(
         {
             "input": query,
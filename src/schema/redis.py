@@ -41,6 +41,26 @@ class RedisMessage:
         data = json.loads(json_str)
         return cls.from_dict(data)
 
+    def to_compact(self) -> str:
+        """紧凑编码：[角色, 内容, 创建时间]，会话ID和用户ID由所在的键表示"""
+        return json.dumps(
+            [MessageRole(self.message_role).value, self.message, self.created_at],
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+
+    @classmethod
+    def from_compact(cls, data: str, session_id: str, user_id: int) -> "RedisMessage":
+        """从紧凑编码创建实例"""
+        role, message, created_at = json.loads(data)
+        return cls(
+            session_id=session_id,
+            user_id=user_id,
+            message_role=MessageRole(role),
+            message=message,
+            created_at=created_at
+        )
+
 
 class RedisKeyBuilder:
     """Redis 键构建器"""
@@ -56,6 +76,11 @@ class RedisKeyBuilder:
         """构建会话消息列表键: {user_id}:{session_id}"""
         return f"{user_id}:{session_id}"
     
+    @staticmethod
+    def session_history_key(user_id: int, session_id: str) -> str:
+        """构建单键会话历史（列表）键: {user_id}:{session_id}:history"""
+        return f"{user_id}:{session_id}:history"
+
     @staticmethod
     def parse_message_key(key: str) -> Dict[str, str]:
         """解析消息键: 123:abc:1234567890"""
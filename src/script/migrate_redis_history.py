@@ -0,0 +1,97 @@
+"""将 Redis 中按消息分键存储的会话历史（zset 布局）迁移为单键列表（list 布局）
+
+迁移完成后将 REDIS_HISTORY_LAYOUT 设置为 list 并重启服务。
+服务可以保持运行（仍为 zset 布局）：每个会话在读取期间 WATCH 会话索引键，读取之后有新消息写入时重新迁移该会话。
+迁移结束到重启之间新写入的消息不会出现在列表中，要做到完全不丢消息，请先停止服务再迁移。
+
+在项目根目录下运行：
+    python -m src.script.migrate_redis_history            # 迁移并删除旧键
+    python -m src.script.migrate_redis_history --dry-run  # 只统计，不写入
+    python -m src.script.migrate_redis_history --keep     # 迁移但保留旧键
+"""
+
+import argparse
+
+import redis
+from loguru import logger
+
+from src.config.redis import get_redis_client
+from src.config.setting import settings
+from src.schema.redis import RedisKeyBuilder, RedisMessage
+
+SCAN_BATCH_SIZE = 500
+MAX_WATCH_RETRIES = 5
+
+
+def migrate_session(redis_client, session_messages_key: str, dry_run: bool, keep: bool) -> int:
+    """迁移单个会话，返回迁移的消息数
+
+    读取期间 WATCH 会话索引键：服务仍在运行、读取之后又写入了新消息时事务失败，重新读取后再迁移，
+    不会丢失新消息，也不会把新消息的键一起删掉。
+    """
+    with redis_client.pipeline(transaction=True) as pipe:
+        for attempt in range(MAX_WATCH_RETRIES):
+            try:
+                pipe.watch(session_messages_key)
+                # WATCH 之后、MULTI 之前的命令立即执行
+                message_keys = pipe.zrange(session_messages_key, 0, -1)
+                if not message_keys:
+                    pipe.unwatch()
+                    return 0
+                values = pipe.mget(message_keys)
+                ttl = pipe.ttl(session_messages_key)
+
+                messages = []
+                for value in values:
+                    if value is None:
+                        continue
+                    try:
+                        messages.append(RedisMessage.from_json(value))
+                    except Exception as e:
+                        logger.error(f"解析消息失败 {session_messages_key}: {e}")
+                if not messages or dry_run:
+                    pipe.unwatch()
+                    return len(messages)
+
+                first = messages[0]
+                history_key = RedisKeyBuilder.session_history_key(first.user_id, first.session_id)
+                pipe.watch(history_key)
+                pipe.multi()
+                pipe.delete(history_key)
+                pipe.rpush(history_key, *(message.to_compact() for message in messages))
+                pipe.ltrim(history_key, -settings.REDIS_HISTORY_MAX_MESSAGES, -1)
+                # 保留原会话剩余的过期时间
+                pipe.expire(history_key, ttl if ttl and ttl > 0 else 30 * 60)
+                if not keep:
+                    pipe.delete(session_messages_key, *message_keys)
+                pipe.execute()
+                return len(messages)
+            except redis.WatchError:
+                logger.info(f"会话 {session_messages_key} 在迁移期间有新消息写入，重试（第 {attempt + 1} 次）")
+    logger.warning(f"会话 {session_messages_key} 持续有新消息写入，跳过；可在服务停止后重新运行迁移")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="迁移 Redis 会话历史到单键列表布局")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不写入")
+    parser.add_argument("--keep", action="store_true", help="迁移后保留旧键")
+    args = parser.parse_args()
+
+    redis_client = get_redis_client()
+
+    session_count = 0
+    message_count = 0
+    # 会话索引键为 {user_id}:{session_id} 的有序集合，使用 SCAN 避免阻塞 Redis
+    for key in redis_client.scan_iter(match="*:*", count=SCAN_BATCH_SIZE, _type="zset"):
+        migrated = migrate_session(redis_client, key, args.dry_run, args.keep)
+        if migrated:
+            session_count += 1
+            message_count += migrated
+            logger.info(f"{'[dry-run] ' if args.dry_run else ''}迁移会话 {key}：{migrated} 条消息")
+
+    logger.info(f"共迁移 {session_count} 个会话，{message_count} 条消息")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,21 @@
-"""这个脚本的作用是处理转换为markdown的md文件"""
+"""这个脚本的作用是处理转换为markdown的md文件
 
+在项目根目录下运行：python -m src.script.process_markdown
+混合检索（RETRIEVAL_MODE=hybrid）需要带 BM25 稀疏字段的集合：python -m src.script.process_markdown --mode hybrid
+"""
+
+import argparse
 import os
 from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
 from langchain_community.embeddings import DashScopeEmbeddings
 from langchain_milvus import Milvus
 from loguru import logger
 
+from src.rag.knowledge_store import DENSE, HYBRID, knowledge_store_kwargs
+from src.utils.knowledge_version import knowledge_version
+
 class ProcessMarkdown:
-    def __init__(self, chunk_size=6000, chunk_overlap=2000):
+    def __init__(self, chunk_size=6000, chunk_overlap=2000, mode=DENSE):
         self.project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
         self.markdown_path = os.path.join(self.project_root, "src", "resource", "markdown")
 
@@ -28,19 +36,16 @@ class ProcessMarkdown:
             model="text-embedding-v4",
             dashscope_api_key="使用百炼的api key"  # 使用百炼的api key
         )
+        # hybrid 模式下集合额外包含由 BM25 内置函数在写入时生成的稀疏向量字段（中文分词）
         self.vector_db = Milvus(
             embedding_function=embedding_fn,
-            collection_name="knowledge",
             collection_description="中央及银保监会金融监管政策文件汇编",
             connection_args={
                 "uri": "http://localhost:19530",
                 "db_name": "finance"
             },
-            index_params={
-                "index_type": "IVF_FLAT",
-                "metric_type": "COSINE"
-            },
-            auto_id=True
+            auto_id=True,
+            **knowledge_store_kwargs(mode)
         )
     
     def load_markdown_content(self, file_name):
@@ -114,6 +119,16 @@ class ProcessMarkdown:
         if len(no_success_documents) > 0:
             self.embedding_and_restore_single(no_success_documents)
 
+        # 知识库内容已变化，递增版本号使依赖知识库的缓存失效
+        try:
+            knowledge_version.bump()
+        except Exception as e:
+            logger.error(f"更新知识库版本号失败：{str(e)}")
+
 if __name__ == "__main__":
-    process = ProcessMarkdown()
+    parser = argparse.ArgumentParser(description="将 markdown 文件切分、向量化并写入知识库")
+    parser.add_argument("--mode", choices=[DENSE, HYBRID], default=DENSE, help="写入的知识库集合结构")
+    args = parser.parse_args()
+
+    process = ProcessMarkdown(mode=args.mode)
     process.forward("中央及银保监会金融监管政策文件汇编")
@@ -1,4 +1,12 @@
-"""This file contains the database service for the application."""
+"""This file contains the database service for the application.
+
+Two engines share the same database:
+
+- a synchronous engine (``Session``) for code that already runs in worker threads,
+  such as the conversation manager and the history write-behind queue;
+- an asynchronous engine (``AsyncSession``, psycopg 3 async driver by default) behind
+  the ``async def`` API, so request handlers no longer block the event loop.
+"""
 
 from typing import (
     List,
@@ -6,7 +14,13 @@ from typing import (
 )
 
 from fastapi import HTTPException
+from sqlalchemy.engine import make_url
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.pool import QueuePool
 from sqlmodel import (
     Session,
@@ -14,6 +28,7 @@ from sqlmodel import (
     create_engine,
     select,
 )
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.config.setting import (
     Environment,
@@ -23,13 +38,30 @@ from loguru import logger
 from src.schema.session import Session as ChatSession
 from src.schema.user import User
 from src.schema.history import History
+from src.utils.user_cache import user_cache
+
+
+def get_async_database_url(url: str) -> str:
+    """Derive an async driver URL from a synchronous PostgreSQL URL.
+
+    Args:
+        url: The synchronous database URL (e.g. ``postgresql://`` or ``postgresql+psycopg2://``)
+
+    Returns:
+        str: The same URL using the psycopg 3 async driver
+    """
+    sa_url = make_url(url)
+    if sa_url.drivername in ("postgresql", "postgresql+psycopg2"):
+        sa_url = sa_url.set(drivername="postgresql+psycopg")
+    return sa_url.render_as_string(hide_password=False)
 
 
 class DatabaseService:
     """Service class for database operations.
 
     This class handles all database operations for Users, Sessions, and Messages.
-    It uses SQLModel for ORM operations and maintains a connection pool.
+    It uses SQLModel for ORM operations and maintains a synchronous and an
+    asynchronous connection pool.
     """
 
     def __init__(self):
@@ -46,10 +78,25 @@ class DatabaseService:
                 poolclass=QueuePool,
                 pool_size=pool_size,
                 max_overflow=max_overflow,
-                pool_timeout=30,  # Connection timeout (seconds)
+                pool_timeout=settings.POSTGRES_POOL_TIMEOUT_SECONDS,  # Connection timeout (seconds)
                 pool_recycle=1800,  # Recycle connections after 30 minutes
             )
 
+            # Async engine used by the async API below
+            self.async_engine: AsyncEngine = create_async_engine(
+                settings.POSTGRES_ASYNC_URL or get_async_database_url(settings.POSTGRES_URL),
+                pool_pre_ping=True,
+                pool_size=settings.POSTGRES_ASYNC_POOL_SIZE,
+                max_overflow=settings.POSTGRES_ASYNC_MAX_OVERFLOW,
+                pool_timeout=settings.POSTGRES_POOL_TIMEOUT_SECONDS,
+                pool_recycle=1800,
+            )
+            self.async_session_maker = async_sessionmaker(
+                self.async_engine,
+                class_=AsyncSession,
+                expire_on_commit=False,
+            )
+
             # Create tables (only if they don't exist)
             SQLModel.metadata.create_all(self.engine)
 
@@ -58,6 +105,8 @@ class DatabaseService:
                 environment=settings.ENVIRONMENT.value,
                 pool_size=pool_size,
                 max_overflow=max_overflow,
+                async_pool_size=settings.POSTGRES_ASYNC_POOL_SIZE,
+                async_max_overflow=settings.POSTGRES_ASYNC_MAX_OVERFLOW,
             )
         except SQLAlchemyError as e:
             logger.error("database_initialization_error", error=str(e), environment=settings.ENVIRONMENT.value)
@@ -75,11 +124,13 @@ class DatabaseService:
         Returns:
             User: The created user
         """
-        with Session(self.engine) as session:
+        async with self.async_session_maker() as session:
             user = User(email=email, hashed_password=password)
             session.add(user)
-            session.commit()
-            session.refresh(user)
+            await session.commit()
+            await session.refresh(user)
+            # Drop any negative cache entry for the new ID
+            await user_cache.invalidate(user.id)
             logger.info("user_created", email=email)
             return user
 
@@ -92,8 +143,8 @@ class DatabaseService:
         Returns:
             Optional[User]: The user if found, None otherwise
         """
-        with Session(self.engine) as session:
-            user = session.get(User, user_id)
+        async with self.async_session_maker() as session:
+            user = await session.get(User, user_id)
             return user
 
     async def get_user_by_email(self, email: str) -> Optional[User]:
@@ -105,9 +156,9 @@ class DatabaseService:
         Returns:
             Optional[User]: The user if found, None otherwise
         """
-        with Session(self.engine) as session:
+        async with self.async_session_maker() as session:
             statement = select(User).where(User.email == email)
-            user = session.exec(statement).first()
+            user = (await session.exec(statement)).first()
             return user
 
     async def delete_user_by_email(self, email: str) -> bool:
@@ -119,13 +170,14 @@ class DatabaseService:
         Returns:
             bool: True if deletion was successful, False if user not found
         """
-        with Session(self.engine) as session:
-            user = session.exec(select(User).where(User.email == email)).first()
+        async with self.async_session_maker() as session:
+            user = (await session.exec(select(User).where(User.email == email))).first()
             if not user:
                 return False
 
-            session.delete(user)
-            session.commit()
+            await session.delete(user)
+            await session.commit()
+            await user_cache.invalidate(user.id)
             logger.info("user_deleted", email=email)
             return True
 
@@ -140,11 +192,11 @@ class DatabaseService:
         Returns:
             ChatSession: The created session
         """
-        with Session(self.engine) as session:
+        async with self.async_session_maker() as session:
             chat_session = ChatSession(id=session_id, user_id=user_id, name=name)
             session.add(chat_session)
-            session.commit()
-            session.refresh(chat_session)
+            await session.commit()
+            await session.refresh(chat_session)
             logger.info("session_created", session_id=session_id, user_id=user_id, name=name)
             return chat_session
 
@@ -157,13 +209,13 @@ class DatabaseService:
         Returns:
             bool: True if deletion was successful, False if session not found
         """
-        with Session(self.engine) as session:
-            chat_session = session.get(ChatSession, session_id)
+        async with self.async_session_maker() as session:
+            chat_session = await session.get(ChatSession, session_id)
             if not chat_session:
                 return False
 
-            session.delete(chat_session)
-            session.commit()
+            await session.delete(chat_session)
+            await session.commit()
             logger.info("session_deleted", session_id=session_id)
             return True
 
@@ -176,8 +228,8 @@ class DatabaseService:
         Returns:
             Optional[ChatSession]: The session if found, None otherwise
         """
-        with Session(self.engine) as session:
-            chat_session = session.get(ChatSession, session_id)
+        async with self.async_session_maker() as session:
+            chat_session = await session.get(ChatSession, session_id)
             return chat_session
 
     async def get_user_sessions(self, user_id: int) -> List[ChatSession]:
@@ -189,9 +241,9 @@ class DatabaseService:
         Returns:
             List[ChatSession]: List of user's sessions
         """
-        with Session(self.engine) as session:
+        async with self.async_session_maker() as session:
             statement = select(ChatSession).where(ChatSession.user_id == user_id).order_by(ChatSession.created_at)
-            sessions = session.exec(statement).all()
+            sessions = (await session.exec(statement)).all()
             return sessions
 
     async def update_session_name(self, session_id: str, name: str) -> ChatSession:
@@ -207,15 +259,15 @@ class DatabaseService:
         Raises:
             HTTPException: If session is not found
         """
-        with Session(self.engine) as session:
-            chat_session = session.get(ChatSession, session_id)
+        async with self.async_session_maker() as session:
+            chat_session = await session.get(ChatSession, session_id)
             if not chat_session:
                 raise HTTPException(status_code=404, detail="Session not found")
 
             chat_session.name = name
             session.add(chat_session)
-            session.commit()
-            session.refresh(chat_session)
+            await session.commit()
+            await session.refresh(chat_session)
             logger.info("session_name_updated", session_id=session_id, name=name)
             return chat_session
 
@@ -227,6 +279,14 @@ class DatabaseService:
         """
         return Session(self.engine)
 
+    def get_async_session(self) -> AsyncSession:
+        """Get an async database session.
+
+        Returns:
+            AsyncSession: A SQLModel async session bound to the async engine
+        """
+        return self.async_session_maker()
+
     async def health_check(self) -> bool:
         """Check database connection health.
 
@@ -234,14 +294,38 @@ class DatabaseService:
             bool: True if database is healthy, False otherwise
         """
         try:
-            with Session(self.engine) as session:
+            async with self.async_session_maker() as session:
                 # Execute a simple query to check connection
-                session.exec(select(1)).first()
+                (await session.exec(select(1))).first()
                 return True
         except Exception as e:
             logger.error("database_health_check_failed", error=str(e))
             return False
 
+    def pool_stats(self) -> dict:
+        """Get connection pool usage of both engines.
+
+        Returns:
+            dict: Checked-out, idle and overflow connections per engine
+        """
+        def _stats(pool) -> dict:
+            return {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": pool.overflow(),
+            }
+
+        return {
+            "sync": _stats(self.engine.pool),
+            "async": _stats(self.async_engine.pool),
+        }
+
+    async def close(self) -> None:
+        """Dispose of the async engine's connections."""
+        await self.async_engine.dispose()
+        logger.info("database_async_engine_disposed")
+
 
 # Create a singleton instance
 database_service = DatabaseService()
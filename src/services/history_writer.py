@@ -0,0 +1,321 @@
+"""聊天历史的 PostgreSQL 写后（write-behind）批量写入
+
+原实现在 /chat、/chat/stream 的请求路径中为每条消息单独打开会话、INSERT 并提交。
+这里改为：
+- 请求路径只把消息放入有界队列，立即返回，聊天延迟不再包含 PostgreSQL 提交
+- 后台线程每 HISTORY_FLUSH_INTERVAL_MS 毫秒或攒满 HISTORY_BATCH_SIZE 条时，用一条多行 INSERT 写入
+- 队列满时入队方最多等待 HISTORY_ENQUEUE_TIMEOUT_SECONDS 秒（背压），仍然满则在调用方同步写入，不丢消息
+- 批量写入失败时重试，仍失败则逐条写入以隔离坏数据
+- 后台线程只由 FastAPI lifespan 启动；关闭时先把队列中剩余的消息全部写完，
+  未启动或关闭之后的消息在调用方同步写入
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from queue import Empty, Full, Queue
+from typing import List, Optional
+
+from loguru import logger
+from sqlalchemy import insert
+
+from src.config.setting import settings
+from src.schema.history import History, MessageRole
+from src.services.database import database_service
+
+
+@dataclass
+class PendingHistory:
+    """等待写入的一条历史消息"""
+
+    session_id: str
+    user_id: int
+    message_role: MessageRole
+    message: str
+    created_at: datetime
+    enqueued_at: float
+
+    def to_row(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "message_role": self.message_role,
+            "message": self.message,
+            "created_at": self.created_at,
+        }
+
+
+class HistoryWriteBehind:
+    """有界队列 + 后台线程批量写入聊天历史"""
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        flush_interval_ms: float = 200,
+        max_queue_size: int = 10000,
+        enqueue_timeout_seconds: float = 1.0,
+        max_retries: int = 3
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.enqueue_timeout = enqueue_timeout_seconds
+        self.max_retries = max_retries
+
+        self._queue: "Queue[PendingHistory]" = Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        # 后台线程是否在接收消息；未启动或关闭后 enqueue 改为同步写入，不会重新拉起线程
+        self._accepting = False
+        self._lock = threading.Lock()
+        # 已入队但尚未写入（或确认失败）的消息数，flush() 等待其归零
+        self._unfinished = 0
+        self._drained = threading.Condition(self._lock)
+
+        # 统计
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.retries = 0
+        self.backpressure_waits = 0
+        self.sync_fallbacks = 0
+        self.sync_writes = 0
+        self.max_queue_depth = 0
+        self.last_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self._recent_lags_ms: deque = deque(maxlen=1000)
+
+    def start(self) -> None:
+        """启动后台写入线程（重复调用无副作用），只由 FastAPI lifespan 调用"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._accepting = True
+            self._thread = threading.Thread(target=self._run, name="history-write-behind", daemon=True)
+            self._thread.start()
+        logger.info(
+            f"History write-behind started (batch_size={self.batch_size}, "
+            f"flush_interval={self.flush_interval * 1000:.0f}ms, max_queue={self._queue.maxsize})"
+        )
+
+    def _admit(self, item: PendingHistory) -> bool:
+        """登记一条待写入的消息，返回后台线程是否在接收消息"""
+        with self._lock:
+            self._unfinished += 1
+            self.enqueued += 1
+            return self._accepting
+
+    def _write_stopped(self, item: PendingHistory) -> None:
+        """后台线程未启动或已关闭（脚本中直接使用、lifespan 关闭之后）时同步写入"""
+        self.sync_writes += 1
+        self._write([item])
+
+    def _put_blocking(self, item: PendingHistory) -> None:
+        """队列已满：最多等待 enqueue_timeout 秒，仍然满则同步写入"""
+        self.backpressure_waits += 1
+        try:
+            self._queue.put(item, timeout=self.enqueue_timeout)
+        except Full:
+            logger.warning("History write-behind queue is full, writing synchronously")
+            self.sync_fallbacks += 1
+            self._write([item])
+
+    def _after_put(self) -> bool:
+        """记录队列深度；返回入队期间后台线程是否开始关闭（此时它可能已经退出，需要由调用方写完剩余消息）"""
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return not self._accepting
+
+    def _drain_remaining(self) -> None:
+        """在当前线程写完队列中剩余的消息"""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def enqueue(
+        self,
+        session_id: str,
+        user_id: int,
+        message_role: MessageRole,
+        message: str,
+        created_at: datetime
+    ) -> None:
+        """放入写入队列；队列满时等待，超时后在当前线程同步写入；后台线程未运行时直接同步写入"""
+        item = PendingHistory(session_id, user_id, message_role, message, created_at, time.monotonic())
+        if not self._admit(item):
+            self._write_stopped(item)
+            return
+        try:
+            self._queue.put_nowait(item)
+        except Full:
+            self._put_blocking(item)
+        if self._after_put():
+            self._drain_remaining()
+
+    async def aenqueue(
+        self,
+        session_id: str,
+        user_id: int,
+        message_role: MessageRole,
+        message: str,
+        created_at: datetime
+    ) -> None:
+        """enqueue 的异步版本：在事件循环中 put_nowait，只有需要等待或同步写入时才放到线程中"""
+        item = PendingHistory(session_id, user_id, message_role, message, created_at, time.monotonic())
+        if not self._admit(item):
+            await asyncio.to_thread(self._write_stopped, item)
+            return
+        try:
+            self._queue.put_nowait(item)
+        except Full:
+            await asyncio.to_thread(self._put_blocking, item)
+        if self._after_put():
+            await asyncio.to_thread(self._drain_remaining)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已入队的消息全部写入，返回是否在超时前完成"""
+        with self._drained:
+            return self._drained.wait_for(lambda: self._unfinished == 0, timeout=timeout)
+
+    def stop(self, timeout: float = 30) -> None:
+        """写完队列中剩余的消息后停止后台线程，之后的消息同步写入"""
+        with self._lock:
+            self._accepting = False
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopping.set()
+        thread.join(timeout=timeout)
+        if thread.is_alive():
+            logger.error(f"History write-behind did not finish within {timeout}s, {self._queue.qsize()} messages pending")
+            return
+        # 后台线程退出前后才入队的消息
+        self._drain_remaining()
+        logger.info(f"History write-behind stopped, {self.written} messages written")
+        self._thread = None
+
+    async def aclose(self, timeout: float = 30) -> None:
+        """在 FastAPI lifespan 中调用，关闭前写完剩余消息"""
+        await asyncio.to_thread(self.stop, timeout)
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect_batch()
+            if batch:
+                self._write(batch)
+            elif self._stopping.is_set():
+                return
+
+    def _collect_batch(self) -> List[PendingHistory]:
+        """收集一批消息：攒满 batch_size 条或自第一条起等待 flush_interval 后返回"""
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping.is_set():
+                # 关闭时不再等待，只取已在队列中的消息
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except Empty:
+                    break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[PendingHistory]) -> None:
+        """多行 INSERT 写入一批消息；失败时重试，最终逐条写入"""
+        started = time.perf_counter()
+        written = 0
+        for attempt in range(self.max_retries):
+            try:
+                self._insert_rows(batch)
+                written = len(batch)
+                break
+            except Exception as e:
+                self.retries += 1
+                logger.warning(f"History batch insert failed (attempt {attempt + 1}/{self.max_retries}): {e}")
+                time.sleep(min(0.1 * 2 ** attempt, 2))
+        else:
+            # 逐条写入，隔离导致失败的消息
+            for item in batch:
+                try:
+                    self._insert_rows([item])
+                    written += 1
+                except Exception as e:
+                    logger.error(f"Dropping history message for session {item.session_id}: {e}")
+
+        now = time.monotonic()
+        lag_ms = (now - min(item.enqueued_at for item in batch)) * 1000
+        with self._lock:
+            self.written += written
+            self.failed += len(batch) - written
+            self.batches += 1
+            self.last_batch_size = len(batch)
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+            self.last_lag_ms = lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            self._recent_lags_ms.append(lag_ms)
+            self._unfinished -= len(batch)
+            self._drained.notify_all()
+
+    @staticmethod
+    def _insert_rows(batch: List[PendingHistory]) -> None:
+        with database_service.get_session_maker() as session:
+            session.execute(insert(History).values([item.to_row() for item in batch]))
+            session.commit()
+
+    def stats(self) -> dict:
+        """返回写入队列与持久化进度统计"""
+        with self._lock:
+            lags = sorted(self._recent_lags_ms)
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "queue_capacity": self._queue.maxsize,
+                # 已入队但尚未持久化的消息数（进程崩溃时可能丢失的上限）
+                "unpersisted": self._unfinished,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "failed": self.failed,
+                "batches": self.batches,
+                "avg_batch_size": round(self.written / self.batches, 2) if self.batches else 0.0,
+                "last_batch_size": self.last_batch_size,
+                "last_flush_ms": round(self.last_flush_ms, 2),
+                "retries": self.retries,
+                "backpressure_waits": self.backpressure_waits,
+                "sync_fallbacks": self.sync_fallbacks,
+                # 后台线程未运行时同步写入的消息数
+                "sync_writes": self.sync_writes,
+                "last_lag_ms": round(self.last_lag_ms, 2),
+                "p95_lag_ms": round(lags[min(len(lags) - 1, int(len(lags) * 0.95))], 2) if lags else 0.0,
+                "max_lag_ms": round(self.max_lag_ms, 2),
+            }
+
+
+# 全局实例
+history_writer = HistoryWriteBehind(
+    batch_size=settings.HISTORY_BATCH_SIZE,
+    flush_interval_ms=settings.HISTORY_FLUSH_INTERVAL_MS,
+    max_queue_size=settings.HISTORY_QUEUE_MAX_SIZE,
+    enqueue_timeout_seconds=settings.HISTORY_ENQUEUE_TIMEOUT_SECONDS
+)
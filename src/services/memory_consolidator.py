@@ -0,0 +1,217 @@
+"""后台记忆沉淀
+
+检索路径在 deal_with_results 之后还要由 update_memory 再调用一次 LLM、向量化并写入 Milvus，
+原实现在图结束前同步执行，/chat 与 SSE 的 done 事件都要等它完成。这里改为：
+- update_memory 节点只把本轮的问题、答案和已检索到的记忆放入有界队列，立即结束
+- 固定数量的后台协程从队列中取出任务，判断是否需要记忆、提炼并写入 Milvus
+- 单次处理超时（MEMORY_CONSOLIDATION_TIMEOUT_SECONDS）或失败时按指数退避重试
+- 队列已满时直接丢弃新任务（记忆只是优化，不影响本轮回答），并计入 dropped
+- 后台协程只由 FastAPI lifespan 启动；关闭时等待队列中剩余的任务处理完，之后提交的任务丢弃并计入 dropped，
+  不会重新启动后台协程（update_memory 节点在未运行时改为同步执行）
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from langchain_core.messages import BaseMessage
+from loguru import logger
+
+from src.config.agents import AGENT_LLM_MAP
+from src.config.setting import settings
+from src.llms.llm import get_llm_by_type
+from src.prompts.template import build_prompt_messages
+from src.services.milvus_async import async_milvus_service
+from src.utils.embedding import embedding_service, normalize_text, unpack_vector
+
+
+@dataclass
+class MemoryJob:
+    """一轮检索对话的记忆沉淀任务"""
+
+    user_query: str
+    rewrite_query: str
+    answer: str
+    memory_info: List[dict]
+    messages: List[BaseMessage]
+    locale: str = "zh-CN"
+    # 本轮已计算的向量，改写后的问题通常已经向量化过
+    embeddings: dict = field(default_factory=dict)
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+async def consolidate_memory(job: MemoryJob) -> bool:
+    """判断答案是否值得记忆，需要时提炼后写入 Milvus；返回是否写入了记忆"""
+    llm = get_llm_by_type(AGENT_LLM_MAP.get("route", "basic"))
+    msg = build_prompt_messages(
+        "update_memory",
+        {"locale": job.locale},
+        job.messages,
+        user_query=job.user_query,
+        answer=job.answer,
+        memory_info=job.memory_info
+    )
+    response = await llm.ainvoke(msg)
+
+    temp = response.content
+    logger.info(f"总结出的记忆：{temp}")
+    if not temp:
+        logger.info("无需更新记忆")
+        return False
+
+    # 写入向量数据库
+    key = normalize_text(job.rewrite_query)
+    if key in job.embeddings:
+        question_embedding = unpack_vector(job.embeddings[key])
+    else:
+        question_embedding = await embedding_service.aembed(job.rewrite_query)
+    data = [{
+        "question": job.rewrite_query,
+        "question_embedding": question_embedding,
+        "answer": temp
+    }]
+    result = await async_milvus_service.insert_data("memory", data)
+    if not result:
+        raise RuntimeError("Milvus insert returned no result")
+    logger.info("写入成功")
+    return True
+
+
+class MemoryConsolidator:
+    """有界队列 + 固定数量后台协程的记忆沉淀"""
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_queue_size: int = 100,
+        max_retries: int = 2,
+        timeout_seconds: float = 60
+    ):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.timeout_seconds = timeout_seconds
+        self.max_queue_size = max_queue_size
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # aclose 之后不再接收任务
+        self._closed = False
+
+        # 统计
+        self.submitted = 0
+        self.dropped = 0
+        self.stored = 0
+        self.skipped = 0
+        self.failed = 0
+        self.retries = 0
+        self.max_queue_depth = 0
+        self._recent_lags_ms: deque = deque(maxlen=1000)
+        self._recent_durations_ms: deque = deque(maxlen=1000)
+
+    @property
+    def running(self) -> bool:
+        """后台协程是否在运行并接收任务"""
+        return not self._closed and bool(self._tasks) and not all(task.done() for task in self._tasks)
+
+    def start(self) -> None:
+        """在当前事件循环中启动后台协程（重复调用无副作用），只由 FastAPI lifespan 调用"""
+        if self.running:
+            return
+        self._closed = False
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"memory-consolidator-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Memory consolidator started (workers={self.workers}, max_queue={self.max_queue_size})")
+
+    def submit(self, job: MemoryJob) -> bool:
+        """放入队列，立即返回；队列已满或后台协程未运行（未启动、已关闭）时丢弃并返回 False"""
+        if not self.running:
+            self.dropped += 1
+            logger.warning(f"Memory consolidator is not running, dropping job for: {job.rewrite_query}")
+            return False
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Memory consolidation queue is full, dropping job for: {job.rewrite_query}")
+            return False
+        self.submitted += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job: MemoryJob) -> None:
+        self._recent_lags_ms.append((time.monotonic() - job.enqueued_at) * 1000)
+        started = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                stored = await asyncio.wait_for(consolidate_memory(job), timeout=self.timeout_seconds)
+                if stored:
+                    self.stored += 1
+                else:
+                    self.skipped += 1
+                break
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    self.failed += 1
+                    logger.error(f"Memory consolidation failed after {attempt + 1} attempts: {e!r}")
+                    break
+                self.retries += 1
+                logger.warning(f"Memory consolidation failed (attempt {attempt + 1}), retrying: {e!r}")
+                await asyncio.sleep(min(0.5 * 2 ** attempt, 5))
+        self._recent_durations_ms.append((time.perf_counter() - started) * 1000)
+
+    async def aclose(self, timeout: float = 30) -> None:
+        """在 FastAPI lifespan 中调用，处理完队列中剩余的任务后停止"""
+        self._closed = True
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Memory consolidator did not finish within {timeout}s, {self._queue.qsize()} jobs pending")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info(f"Memory consolidator stopped, {self.stored} memories stored")
+
+    def stats(self) -> dict:
+        """返回队列与处理结果统计"""
+        lags = sorted(self._recent_lags_ms)
+        durations = sorted(self._recent_durations_ms)
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "queue_capacity": self.max_queue_size,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "stored": self.stored,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "retries": self.retries,
+            "p95_lag_ms": round(lags[min(len(lags) - 1, int(len(lags) * 0.95))], 2) if lags else 0.0,
+            "p95_duration_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 2) if durations else 0.0,
+        }
+
+
+# 全局实例
+memory_consolidator = MemoryConsolidator(
+    workers=settings.MEMORY_CONSOLIDATION_WORKERS,
+    max_queue_size=settings.MEMORY_CONSOLIDATION_QUEUE_SIZE,
+    max_retries=settings.MEMORY_CONSOLIDATION_MAX_RETRIES,
+    timeout_seconds=settings.MEMORY_CONSOLIDATION_TIMEOUT_SECONDS
+)
@@ -3,6 +3,7 @@ from pymilvus import MilvusClient, exceptions
 
 from src.config.setting import settings
 from src.utils.milvus_collection import collections
+from src.services.milvus_residency import CollectionResidencyManager
 
 class MilvusConnector:
     """Milvus 数据库连接管理类"""
@@ -11,6 +12,7 @@ class MilvusConnector:
         self.uri = f"http://{settings.MILVUS_HOST}:{settings.MILVUS_PORT}"
         self.db = settings.MILVUS_DATABASE
         self.client = None  # 客户端实例
+        self.residency = None  # 集合常驻管理器
         self._init_connection()
 
     def _init_connection(self):
@@ -36,6 +38,15 @@ class MilvusConnector:
         for collection_name, method in collections.items():
             logger.info(f"collection name: {collection_name}")
             method(self.client)
+
+        # 启动时加载集合并保持常驻，避免每次搜索都重新加载
+        self.residency = CollectionResidencyManager(
+            self.client,
+            max_loaded=settings.MILVUS_MAX_LOADED_COLLECTIONS,
+            idle_seconds=settings.MILVUS_IDLE_RELEASE_SECONDS,
+            release_interval_seconds=settings.MILVUS_IDLE_RELEASE_INTERVAL_SECONDS
+        )
+        self.residency.warmup(settings.MILVUS_RESIDENT_COLLECTIONS)
     
     async def insert_data(self, collection_name: str, data: list[dict]) -> bool:
         """
@@ -103,11 +114,42 @@ class MilvusConnector:
             filter: 布尔表达式过滤条件，如 "id > 100"
             output_fields: 需要返回的字段列表，默认返回所有字段
             
+        Returns:
+            搜索结果列表，每个元素包含匹配数据和距离
+        """
+        return self.search_by_single_vector_sync(
+            collection_name=collection_name,
+            query_vector=query_vector,
+            anns_field=anns_field,
+            output_fields=output_fields,
+            limit=limit,
+            filter=filter
+        )
+
+    def search_by_single_vector_sync(
+        self,
+        collection_name: str,
+        query_vector: list[float],
+        anns_field: str,
+        output_fields: list[str],
+        limit: int = 3,
+        filter: str = "",
+        raise_on_error: bool = False
+        ) -> list[dict]:
+        """
+        search_data_by_single_vector 的同步版本，供没有事件循环的同步调用方使用
+
+        Args:
+            raise_on_error: 为 True 时搜索失败直接抛出异常，而不是返回空列表
+            其余参数同 search_data_by_single_vector
+
         Returns:
             搜索结果列表，每个元素包含匹配数据和距离
         """
         if not query_vector or not isinstance(query_vector, list):
             logger.error("查询向量为空或格式不正确（需为浮点列表）")
+            if raise_on_error:
+                raise ValueError("查询向量为空或格式不正确（需为浮点列表）")
             return []
         
         formatted_result = []
@@ -115,23 +157,17 @@ class MilvusConnector:
             # 检查集合是否存在
             if not self.client.has_collection(collection_name=collection_name):
                 raise ValueError(f"集合 {collection_name} 不存在")
-                
-            
-            state = self.client.get_load_state(collection_name=collection_name)
-            if state["state"] != "<LoadState: Loaded>":
-                # 加载集合到内存
-                self.client.load_collection(collection_name=collection_name)
-                logger.info(f"已将 {collection_name} 加载到内存")
-            
-            result = self.client.search(
-                collection_name=collection_name,
-                anns_field=anns_field,
-                data=[query_vector],
-                limit=limit,
-                search_params={"metric_type": "COSINE"},
-                filter=filter,
-                output_fields=output_fields
-            )
+
+            with self.residency.acquire(collection_name):
+                result = self.client.search(
+                    collection_name=collection_name,
+                    anns_field=anns_field,
+                    data=[query_vector],
+                    limit=limit,
+                    search_params={"metric_type": "COSINE"},
+                    filter=filter,
+                    output_fields=output_fields
+                )
 
             for hit in result[0]:
                 formatted_result.append({
@@ -148,12 +184,12 @@ class MilvusConnector:
             raise
         except Exception as e:
             logger.error(f"搜索失败: {str(e)}")
+            # 集合可能已在服务端被释放，下次搜索时重新检查加载状态
+            self.residency.invalidate(collection_name)
+            if raise_on_error:
+                raise
             return []
 
-        self.client.release_collection(
-            collection_name=collection_name
-        )
-        
         if formatted_result:
             return formatted_result
         else:
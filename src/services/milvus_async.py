@@ -0,0 +1,233 @@
+"""异步 Milvus 服务
+
+MilvusConnector 的 async 方法内部调用的是同步 MilvusClient，一次慢查询会阻塞整个事件循环。
+这里基于 AsyncMilvusClient 提供相同接口的异步实现：
+- 固定大小的客户端池（每个客户端一个独立的 gRPC channel），并发请求超过池大小时排队等待
+- 每次调用都有超时，超时后取消请求并返回空结果
+- 集合创建和常驻加载仍由同步的 milvus_service 在启动时完成
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from loguru import logger
+from pymilvus import AsyncMilvusClient
+
+from src.config.setting import settings
+from src.services.milvus import MilvusConnector, milvus_service
+
+
+class AsyncMilvusClientPool:
+    """AsyncMilvusClient 连接池"""
+
+    def __init__(self, uri: str, db_name: str, size: int, acquire_timeout: float):
+        self.uri = uri
+        self.db_name = db_name
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self._clients: list[AsyncMilvusClient] = []
+        self._idle: Optional[asyncio.Queue] = None
+
+    def _ensure_open(self) -> None:
+        """在事件循环中首次使用时创建客户端（gRPC aio channel 需要绑定到运行中的事件循环）"""
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue(maxsize=self.size)
+        for i in range(self.size):
+            # pymilvus 按 uri 与 db_name 生成默认连接别名，相同别名的客户端共享同一个 gRPC channel，
+            # 关闭其中一个就会断开其他客户端；每个客户端使用独立的别名，各自持有一个 channel
+            client = AsyncMilvusClient(
+                uri=self.uri,
+                db_name=self.db_name,
+                alias=f"async-pool-{id(self):x}-{i}-{self.uri}-{self.db_name}"
+            )
+            self._clients.append(client)
+            self._idle.put_nowait(client)
+        logger.info(f"异步 Milvus 连接池已创建，大小: {self.size}")
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[AsyncMilvusClient]:
+        """从池中借出一个客户端，用完后归还"""
+        self._ensure_open()
+        client = await asyncio.wait_for(self._idle.get(), timeout=self.acquire_timeout)
+        try:
+            yield client
+        finally:
+            self._idle.put_nowait(client)
+
+    def stats(self) -> dict:
+        """返回连接池使用情况"""
+        idle = self._idle.qsize() if self._idle is not None else self.size
+        return {"size": self.size, "in_use": self.size - idle, "idle": idle}
+
+    async def close(self) -> None:
+        """关闭所有客户端"""
+        for client in self._clients:
+            try:
+                await client.close()
+            except Exception as e:
+                logger.error(f"关闭异步 Milvus 客户端失败: {str(e)}")
+        self._clients = []
+        self._idle = None
+
+
+class AsyncMilvusConnector:
+    """与 MilvusConnector 接口一致的异步 Milvus 服务"""
+
+    def __init__(self, sync_connector: MilvusConnector):
+        self.sync_connector = sync_connector
+        self.residency = sync_connector.residency
+        self.timeout = settings.MILVUS_CALL_TIMEOUT_SECONDS
+        self.pool = AsyncMilvusClientPool(
+            uri=sync_connector.uri,
+            db_name=sync_connector.db,
+            size=settings.MILVUS_ASYNC_POOL_SIZE,
+            acquire_timeout=self.timeout
+        )
+        self._known_collections: set[str] = set()
+
+    async def _check_collection(self, collection_name: str) -> None:
+        """检查集合是否存在，存在的集合会被缓存，避免每次调用都请求服务端"""
+        if collection_name in self._known_collections:
+            return
+        exists = await asyncio.to_thread(
+            self.sync_connector.client.has_collection, collection_name=collection_name
+        )
+        if not exists:
+            raise ValueError(f"集合 {collection_name} 不存在")
+        self._known_collections.add(collection_name)
+
+    async def insert_data(self, collection_name: str, data: list[dict]) -> bool:
+        """
+        向指定集合写入数据
+
+        Args:
+            collection_name: 集合名称
+            data: 要写入的数据列表，每个元素为字典
+
+        Returns:
+            写入成功返回True，失败返回False
+        """
+        if not data or not isinstance(data, list):
+            logger.error("写入数据为空或格式不正确（需为字典列表）")
+            return False
+
+        if not all(isinstance(item, dict) for item in data):
+            logger.error("数据列表中的元素必须都是字典")
+            return False
+
+        try:
+            await self._check_collection(collection_name)
+
+            async with self.pool.connection() as client:
+                result = await asyncio.wait_for(
+                    client.insert(collection_name=collection_name, data=data),
+                    timeout=self.timeout
+                )
+
+            success_num = result.get("insert_count", 0)
+            if success_num > 0:
+                logger.info(f"共有 {len(data)} 条数据，成功向 {collection_name} 插入 {success_num} 条数据。")
+                return True
+            else:
+                logger.warning(f"插入操作完成，但未插入任何数据到 {collection_name}")
+                return False
+
+        except ValueError as e:
+            logger.error(f"集合不存在错误: {str(e)}")
+            raise
+        except asyncio.TimeoutError:
+            logger.error(f"插入数据到 {collection_name} 超时（{self.timeout}s）")
+            return False
+        except Exception as e:
+            logger.error(f"插入数据到 {collection_name} 失败: {str(e)}")
+            return False
+
+    async def search_data_by_single_vector(
+        self,
+        collection_name: str,
+        query_vector: list[float],
+        anns_field: str,
+        output_fields: list[str],
+        limit: int = 3,
+        filter: str = "",
+        raise_on_error: bool = False
+        ) -> list[dict]:
+        """
+        在指定集合中搜索相似向量
+
+        Args:
+            collection_name: 集合名称
+            query_vector: 查询向量（需与集合中向量维度一致）
+            limit: 返回结果数量
+            filter: 布尔表达式过滤条件，如 "id > 100"
+            output_fields: 需要返回的字段列表，默认返回所有字段
+            raise_on_error: 为 True 时超时或搜索失败直接抛出异常，而不是返回空列表
+                （调用方需要区分“没有结果”与“检索失败”时使用，如缓存检索结果的知识库检索器）
+
+        Returns:
+            搜索结果列表，每个元素包含匹配数据和距离
+        """
+        if not query_vector or not isinstance(query_vector, list):
+            logger.error("查询向量为空或格式不正确（需为浮点列表）")
+            if raise_on_error:
+                raise ValueError("查询向量为空或格式不正确（需为浮点列表）")
+            return []
+
+        formatted_result = []
+        try:
+            await self._check_collection(collection_name)
+
+            # 集合常驻时直接持有引用；否则在线程中加载，避免阻塞事件循环
+            if not self.residency.try_pin(collection_name):
+                await asyncio.to_thread(self.residency.pin, collection_name)
+            try:
+                async with self.pool.connection() as client:
+                    result = await asyncio.wait_for(
+                        client.search(
+                            collection_name=collection_name,
+                            anns_field=anns_field,
+                            data=[query_vector],
+                            limit=limit,
+                            search_params={"metric_type": "COSINE"},
+                            filter=filter,
+                            output_fields=output_fields
+                        ),
+                        timeout=self.timeout
+                    )
+            finally:
+                self.residency.unpin(collection_name)
+
+            for hit in result[0]:
+                formatted_result.append({
+                    "id": hit["id"],
+                    "distance": hit["distance"],
+                    "fields": hit["entity"]
+                })
+
+            logger.info(f"在 {collection_name} 中找到 {len(formatted_result)} 条匹配结果")
+
+        except ValueError as e:
+            logger.error(f"集合不存在错误: {str(e)}")
+            raise
+        except asyncio.TimeoutError:
+            logger.error(f"在 {collection_name} 中搜索超时（{self.timeout}s）")
+            if raise_on_error:
+                raise
+            return []
+        except Exception as e:
+            logger.error(f"搜索失败: {str(e)}")
+            self.residency.invalidate(collection_name)
+            if raise_on_error:
+                raise
+            return []
+
+        return formatted_result
+
+    async def close(self) -> None:
+        """关闭连接池"""
+        await self.pool.close()
+
+
+async_milvus_service = AsyncMilvusConnector(milvus_service)
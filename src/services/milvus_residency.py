@@ -0,0 +1,247 @@
+"""Milvus 集合常驻内存管理
+
+原先每次搜索都会执行 get_load_state / load_collection / release_collection，
+导致每次记忆检索都要把整个集合重新加载到 query node。
+这里改为启动时加载一次并保持常驻，通过引用计数和空闲时间记录，
+只在常驻集合数量超过上限（内存压力）时才释放最久未使用的空闲集合：
+加载新集合时检查一次，另由后台任务（start，MILVUS_IDLE_RELEASE_INTERVAL_SECONDS）定期检查。
+加载与释放请求在锁外执行（每个集合一个 loading 标记），异步路径在事件循环中调用 try_pin 时不会被阻塞。
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+from loguru import logger
+from pymilvus import MilvusClient
+from pymilvus.client.types import LoadState
+
+
+@dataclass
+class CollectionResidency:
+    """单个集合的常驻状态"""
+    name: str
+    loaded: bool = False
+    refcount: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    load_count: int = 0
+    release_count: int = 0
+    loading: Optional[threading.Event] = None  # 正在加载或释放时设置，完成后通知等待者
+
+
+class CollectionResidencyManager:
+    """集合常驻管理器，线程安全"""
+
+    def __init__(
+        self,
+        client: MilvusClient,
+        max_loaded: int = 4,
+        idle_seconds: int = 600,
+        release_interval_seconds: float = 60
+    ):
+        self.client = client
+        self.max_loaded = max_loaded
+        self.idle_seconds = idle_seconds
+        self.release_interval_seconds = release_interval_seconds
+        self._states: Dict[str, CollectionResidency] = {}
+        self._lock = threading.RLock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _get_state(self, collection_name: str) -> CollectionResidency:
+        state = self._states.get(collection_name)
+        if state is None:
+            state = CollectionResidency(name=collection_name)
+            self._states[collection_name] = state
+        return state
+
+    def _is_loaded_on_server(self, collection_name: str) -> bool:
+        state = self.client.get_load_state(collection_name=collection_name)
+        return state["state"] == LoadState.Loaded
+
+    def _ensure_loaded(self, collection_name: str) -> CollectionResidency:
+        """保证集合已加载（可能阻塞）
+
+        加载期间不持有锁，其他集合的 pin / try_pin 不受影响；同一集合的并发调用等待同一次加载完成。
+        """
+        while True:
+            with self._lock:
+                state = self._get_state(collection_name)
+                if state.loaded:
+                    return state
+                loading = state.loading
+                if loading is None:
+                    loading = state.loading = threading.Event()
+                    break
+            # 其他线程正在加载或释放该集合，完成后重新检查（加载失败时由当前线程重试）
+            loading.wait()
+
+        try:
+            self._load(state)
+        finally:
+            with self._lock:
+                state.loading = None
+            loading.set()
+        return state
+
+    def _load(self, state: CollectionResidency) -> None:
+        """加载集合（调用方不持有锁，且已占用该集合的 loading 标记）"""
+        if not self._is_loaded_on_server(state.name):
+            self._release_states(self._evict_for_pressure(exclude=state.name))
+            self.client.load_collection(collection_name=state.name)
+            with self._lock:
+                state.load_count += 1
+            logger.info(f"已将 {state.name} 加载到内存")
+        with self._lock:
+            state.loaded = True
+            state.last_used = time.monotonic()
+
+    def _release_states(self, states: List[CollectionResidency]) -> None:
+        """释放 _evict_for_pressure 选出的集合（调用方不持有锁）"""
+        for state in states:
+            try:
+                self.client.release_collection(collection_name=state.name)
+                with self._lock:
+                    state.release_count += 1
+                logger.info(f"已将 {state.name} 从内存中释放")
+            except Exception as e:
+                logger.error(f"释放集合 {state.name} 失败: {str(e)}")
+            finally:
+                with self._lock:
+                    loading, state.loading = state.loading, None
+                if loading is not None:
+                    loading.set()
+
+    def _evict_for_pressure(self, exclude: Optional[str] = None, incoming: int = 1) -> List[CollectionResidency]:
+        """常驻集合数量（加上即将加载的 incoming 个）超过上限时，按最久未使用的顺序选出需要释放的空闲集合
+
+        选中的集合立即标记为未加载并占用 loading 标记，释放完成前新的 pin 会等待，
+        实际的释放请求由调用方在锁外通过 _release_states 发起。
+        """
+        with self._lock:
+            loaded = [
+                s for s in self._states.values()
+                if s.loaded and s.name != exclude
+            ]
+            if len(loaded) + incoming <= self.max_loaded:
+                return []
+
+            now = time.monotonic()
+            candidates = sorted(
+                (s for s in loaded
+                 if s.refcount == 0 and s.loading is None and now - s.last_used >= self.idle_seconds),
+                key=lambda s: s.last_used
+            )
+            overflow = len(loaded) + incoming - self.max_loaded
+            selected = candidates[:overflow]
+            for state in selected:
+                state.loaded = False
+                state.loading = threading.Event()
+
+        if len(selected) < overflow:
+            logger.warning(
+                f"常驻集合数量已达上限 {self.max_loaded}，但没有足够的空闲集合可以释放"
+            )
+        return selected
+
+    def warmup(self, collection_names: List[str]) -> None:
+        """启动时加载集合并保持常驻"""
+        for collection_name in collection_names:
+            try:
+                if not self.client.has_collection(collection_name=collection_name):
+                    logger.warning(f"集合 {collection_name} 不存在，跳过预加载")
+                    continue
+                self._ensure_loaded(collection_name)
+            except Exception as e:
+                logger.error(f"预加载集合 {collection_name} 失败: {str(e)}")
+
+    def pin(self, collection_name: str) -> None:
+        """持有集合引用，必要时加载集合（可能阻塞，加载期间不持有锁）"""
+        while True:
+            state = self._ensure_loaded(collection_name)
+            with self._lock:
+                # 加载完成到这里之间集合可能被标记失效，重新加载
+                if state.loaded:
+                    state.refcount += 1
+                    return
+
+    def try_pin(self, collection_name: str) -> bool:
+        """集合已常驻时持有引用并返回 True，不会发起任何网络请求，也不会等待其他集合的加载"""
+        with self._lock:
+            state = self._states.get(collection_name)
+            if state is None or not state.loaded:
+                return False
+            state.refcount += 1
+            return True
+
+    def unpin(self, collection_name: str) -> None:
+        """释放集合引用并记录最近使用时间"""
+        with self._lock:
+            state = self._get_state(collection_name)
+            state.refcount = max(state.refcount - 1, 0)
+            state.last_used = time.monotonic()
+
+    @contextmanager
+    def acquire(self, collection_name: str) -> Iterator[None]:
+        """在使用期间持有集合引用，保证集合已加载且不会被释放"""
+        self.pin(collection_name)
+        try:
+            yield
+        finally:
+            self.unpin(collection_name)
+
+    def invalidate(self, collection_name: str) -> None:
+        """集合可能在服务端被释放（如 Milvus 重启），下次使用时重新检查加载状态"""
+        with self._lock:
+            self._get_state(collection_name).loaded = False
+
+    def release_idle(self) -> List[str]:
+        """主动释放超过空闲时间且数量超出上限的集合（加载时没有可释放的空闲集合而超出上限的部分）"""
+        states = self._evict_for_pressure(incoming=0)
+        self._release_states(states)
+        return [state.name for state in states]
+
+    async def _release_idle_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.release_interval_seconds)
+            try:
+                released = await asyncio.to_thread(self.release_idle)
+                if released:
+                    logger.info(f"定期释放空闲集合: {released}")
+            except Exception as e:
+                logger.error(f"定期释放空闲集合失败: {str(e)}")
+
+    def start(self) -> None:
+        """在当前事件循环中启动定期释放空闲集合的后台任务（FastAPI lifespan 中调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._release_idle_forever())
+            logger.info(f"Milvus 集合空闲释放任务已启动，间隔 {self.release_interval_seconds:g}s")
+
+    async def stop(self) -> None:
+        """停止后台释放任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Milvus 集合空闲释放任务已停止")
+
+    def stats(self) -> Dict[str, dict]:
+        """返回各集合的常驻状态，用于监控"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    "loaded": s.loaded,
+                    "loading": s.loading is not None,
+                    "refcount": s.refcount,
+                    "idle_seconds": round(now - s.last_used, 3),
+                    "load_count": s.load_count,
+                    "release_count": s.release_count,
+                }
+                for name, s in self._states.items()
+            }
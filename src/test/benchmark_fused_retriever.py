@@ -0,0 +1,191 @@
+"""对比原 similarity + mmr 的 EnsembleRetriever 与单次搜索的 FusedMMRRetriever
+
+默认使用内存中的模拟向量库（每次服务端调用固定延迟 RTT_MS），不需要 Milvus，只衡量往返次数带来的差异：
+- ensemble：similarity 一次搜索；mmr 先搜索 fetch_k 个候选，再按主键查询候选向量（与 langchain_milvus 相同）
+- fused：一次搜索同时取回候选向量，本地 MMR
+同时比较两者交给重排的文档集合是否一致。加 --live 时在真实的 knowledge 集合上对比（不含重排）。
+
+    python -m src.test.benchmark_fused_retriever
+    python -m src.test.benchmark_fused_retriever --live
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import numpy as np
+from langchain.retrievers import EnsembleRetriever
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+import src.rag.fused_retriever as fused_module
+from src.config.setting import settings
+from src.rag.fused_retriever import FusedMMRRetriever
+
+DIM = 256
+CORPUS_SIZE = 2000
+QUERIES = 50
+RTT_MS = 15
+TOP_K = 4
+FETCH_K = 20
+
+LIVE_QUERIES = [
+    "资本工具合作标准是什么？",
+    "商业银行资本管理办法第十条规定了什么？",
+    "银行保险机构关联交易管理办法对关联方是如何认定的？",
+    "商业银行流动性覆盖率的最低监管标准是多少？",
+    "理财产品销售机构有哪些要求？",
+]
+
+
+class FakeStore:
+    """带固定网络延迟的内存向量库，按余弦相似度搜索"""
+
+    def __init__(self, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        centers = rng.normal(size=(40, DIM))
+        vectors = centers[rng.integers(0, 40, CORPUS_SIZE)] + 0.6 * rng.normal(size=(CORPUS_SIZE, DIM))
+        # 模拟切分重叠：部分文档几乎相同
+        vectors[1::10] = vectors[0::10][:len(vectors[1::10])] + 0.01 * rng.normal(size=(len(vectors[1::10]), DIM))
+        self.vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+        self.texts = [f"文档{i}" for i in range(CORPUS_SIZE)]
+        self.calls = 0
+
+    async def _round_trip(self):
+        self.calls += 1
+        await asyncio.sleep(RTT_MS / 1000)
+
+    async def search(self, query_vector, limit: int, with_vectors: bool = False) -> list[dict]:
+        await self._round_trip()
+        scores = self.vectors @ np.asarray(query_vector, dtype=np.float32)
+        order = np.argsort(-scores)[:limit]
+        return [
+            {
+                "id": int(i),
+                "distance": float(scores[i]),
+                "fields": {"text": self.texts[i], **({"vector": self.vectors[i].tolist()} if with_vectors else {})},
+            }
+            for i in order
+        ]
+
+    async def query_vectors(self, ids: list[int]) -> dict:
+        await self._round_trip()
+        return {i: self.vectors[i] for i in ids}
+
+    async def search_data_by_single_vector(
+        self, collection_name, query_vector, anns_field, output_fields, limit=3, filter="", raise_on_error=False
+    ):
+        return await self.search(query_vector, limit, with_vectors=anns_field in output_fields)
+
+
+class FakeEmbedding:
+    def __init__(self, queries: dict):
+        self.queries = queries
+
+    async def aembed(self, text: str):
+        return self.queries[text]
+
+
+class SimilarityRetriever(BaseRetriever):
+    store: object
+    embedding: object
+
+    def _get_relevant_documents(self, query, *, run_manager) -> List[Document]:
+        raise NotImplementedError
+
+    async def _aget_relevant_documents(self, query, *, run_manager) -> List[Document]:
+        hits = await self.store.search(await self.embedding.aembed(query), TOP_K)
+        return [Document(page_content=h["fields"]["text"]) for h in hits]
+
+
+class MMRRetriever(SimilarityRetriever):
+    async def _aget_relevant_documents(self, query, *, run_manager) -> List[Document]:
+        query_vector = await self.embedding.aembed(query)
+        hits = await self.store.search(query_vector, FETCH_K)
+        vectors = await self.store.query_vectors([h["id"] for h in hits])
+        order = maximal_marginal_relevance(
+            np.asarray(query_vector), [vectors[h["id"]] for h in hits], k=TOP_K, lambda_mult=0.5
+        )
+        return [Document(page_content=hits[i]["fields"]["text"]) for i in order]
+
+
+async def _measure(retriever, queries: list[str]) -> tuple[list[float], list[set]]:
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        docs = await retriever.ainvoke(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append({doc.page_content for doc in docs})
+    return latencies, results
+
+
+def _report(name: str, latencies: list[float], calls: int = None) -> None:
+    line = f"{name:<9} p50 {statistics.median(latencies):7.1f}ms  p95 {sorted(latencies)[int(len(latencies) * 0.95) - 1]:7.1f}ms"
+    if calls is not None:
+        line += f"  server calls {calls}"
+    print(line)
+
+
+def _compare(ensemble_sets: list[set], fused_sets: list[set]) -> None:
+    same = sum(1 for a, b in zip(ensemble_sets, fused_sets) if a == b)
+    covered = statistics.mean(len(a & b) / len(a) for a, b in zip(ensemble_sets, fused_sets) if a)
+    print(f"identical result sets: {same}/{len(fused_sets)}, ensemble docs covered by fused: {covered:.1%}")
+    print(f"avg docs to rerank:   ensemble {statistics.mean(map(len, ensemble_sets)):.2f}, "
+          f"fused {statistics.mean(map(len, fused_sets)):.2f}")
+
+
+async def _simulated():
+    store = FakeStore()
+    rng = np.random.default_rng(1)
+    queries = {f"问题{i}": store.vectors[rng.integers(0, CORPUS_SIZE)] + 0.3 * rng.normal(size=DIM)
+               for i in range(QUERIES)}
+    embedding = FakeEmbedding({q: v.tolist() for q, v in queries.items()})
+
+    ensemble = EnsembleRetriever(retrievers=[
+        SimilarityRetriever(store=store, embedding=embedding),
+        MMRRetriever(store=store, embedding=embedding),
+    ])
+    fused_module.async_milvus_service = store
+    fused_module.embedding_service = embedding
+    fused = FusedMMRRetriever(k=TOP_K, fetch_k=FETCH_K)
+
+    names = list(queries)
+    print(f"corpus {CORPUS_SIZE}, {QUERIES} queries, simulated RTT {RTT_MS}ms, k={TOP_K}, fetch_k={FETCH_K}")
+    store.calls = 0
+    ensemble_ms, ensemble_sets = await _measure(ensemble, names)
+    _report("ensemble", ensemble_ms, store.calls)
+    store.calls = 0
+    fused_ms, fused_sets = await _measure(fused, names)
+    _report("fused", fused_ms, store.calls)
+    _compare(ensemble_sets, fused_sets)
+
+
+async def _live():
+    from src.rag.retriever import milvus_retriever
+
+    ensemble = milvus_retriever(dense_retriever="ensemble").get_retriever().base_retriever
+    fused = milvus_retriever(dense_retriever="fused").get_retriever().base_retriever
+    # 预热：查询向量进入缓存、集合加载
+    await ensemble.ainvoke(LIVE_QUERIES[0])
+    await fused.ainvoke(LIVE_QUERIES[0])
+
+    print(f"live knowledge collection, {len(LIVE_QUERIES)} queries, k={TOP_K}, fetch_k={settings.RETRIEVAL_FETCH_K}")
+    ensemble_ms, ensemble_sets = await _measure(ensemble, LIVE_QUERIES)
+    _report("ensemble", ensemble_ms)
+    fused_ms, fused_sets = await _measure(fused, LIVE_QUERIES)
+    _report("fused", fused_ms)
+    _compare(ensemble_sets, fused_sets)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="对比 ensemble 与 fused 检索器的延迟与结果")
+    parser.add_argument("--live", action="store_true", help="在真实的 Milvus knowledge 集合上对比")
+    args = parser.parse_args()
+    await (_live() if args.live else _simulated())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
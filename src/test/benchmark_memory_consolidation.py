@@ -0,0 +1,108 @@
+"""对比检索路径在同步 / 后台记忆沉淀下的请求耗时
+
+使用真实的 update_memory_node 与记忆沉淀队列，回答节点、LLM、向量化与 Milvus 替换为固定延迟的模拟实现。
+后台模式下请求耗时应与回答路径本身（ANSWER_LATENCY_SECONDS）一致，记忆在请求返回后写入。
+
+    python -m src.test.benchmark_memory_consolidation
+"""
+
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage
+from langgraph.graph import START, StateGraph
+from langgraph.types import Command
+
+import src.graph.node as node
+import src.services.memory_consolidator as consolidator_module
+from src.config.setting import settings
+from src.graph.types import State
+from src.services.memory_consolidator import memory_consolidator
+
+REQUESTS = 5
+ANSWER_LATENCY_SECONDS = 1.0
+LLM_LATENCY_SECONDS = 0.8
+EMBEDDING_LATENCY_SECONDS = 0.05
+MILVUS_LATENCY_SECONDS = 0.1
+
+
+class FakeLLM:
+    async def ainvoke(self, messages):
+        await asyncio.sleep(LLM_LATENCY_SECONDS)
+        return AIMessage(content="提炼出的记忆")
+
+
+class FakeEmbeddingService:
+    async def aembed(self, text):
+        await asyncio.sleep(EMBEDDING_LATENCY_SECONDS)
+        return [0.0] * 8
+
+
+class FakeMilvus:
+    def __init__(self):
+        self.inserted = 0
+
+    async def insert_data(self, collection_name, data):
+        await asyncio.sleep(MILVUS_LATENCY_SECONDS)
+        self.inserted += len(data)
+        return {"insert_count": len(data)}
+
+
+async def _answer(state: State):
+    await asyncio.sleep(ANSWER_LATENCY_SECONDS)
+    return Command(update={"final_answer": "答案", "needs_retrieval": True}, goto="update_memory")
+
+
+def _build_graph():
+    builder = StateGraph(State)
+    builder.add_edge(START, "deal_with_results")
+    builder.add_node("deal_with_results", _answer)
+    builder.add_node("update_memory", node.update_memory_node)
+    return builder.compile()
+
+
+async def _run(asynchronous: bool, milvus: FakeMilvus) -> tuple[list[float], float]:
+    settings.MEMORY_CONSOLIDATION_ASYNC = asynchronous
+    if asynchronous:
+        # 应用中由 lifespan 启动
+        memory_consolidator.start()
+    graph = _build_graph()
+    inserted_before = milvus.inserted
+
+    async def request(i: int) -> float:
+        started = time.perf_counter()
+        await graph.ainvoke({
+            "messages": [],
+            "user_query": f"问题{i}",
+            "rewrite_query": f"问题{i}",
+            "memory_info": [],
+            "embeddings": {},
+        })
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(request(i) for i in range(REQUESTS)))
+    # 等待后台队列处理完，统计记忆全部写入所需的时间
+    while milvus.inserted - inserted_before < REQUESTS:
+        await asyncio.sleep(0.01)
+    return latencies, time.perf_counter() - started
+
+
+async def main():
+    milvus = FakeMilvus()
+    consolidator_module.get_llm_by_type = lambda llm_type: FakeLLM()
+    consolidator_module.embedding_service = FakeEmbeddingService()
+    consolidator_module.async_milvus_service = milvus
+
+    print(f"{'mode':>6} | {'request avg s':>13} | {'request max s':>13} | {'memory stored after s':>21}")
+    for asynchronous, label in ((False, "inline"), (True, "async")):
+        latencies, stored_after = await _run(asynchronous, milvus)
+        print(
+            f"{label:>6} | {sum(latencies) / len(latencies):>13.2f} | {max(latencies):>13.2f} | {stored_after:>21.2f}"
+        )
+    await memory_consolidator.aclose()
+    print(memory_consolidator.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
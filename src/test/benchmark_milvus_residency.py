@@ -0,0 +1,91 @@
+"""对比记忆检索在 "每次 load/release" 与 "集合常驻" 两种方式下的单次查询延迟
+
+运行前需要启动 Milvus，并确保 memory 集合中已有数据（可先运行 insert_milvus.py）。
+
+    python -m src.test.benchmark_milvus_residency
+"""
+
+import random
+import statistics
+import time
+
+from pymilvus import MilvusClient
+from pymilvus.client.types import LoadState
+
+from src.config.setting import settings
+from src.services.milvus_residency import CollectionResidencyManager
+
+COLLECTION_NAME = "memory"
+ANNS_FIELD = "question_embedding"
+DIM = 1024
+ROUNDS = 50
+
+
+def _random_vector() -> list[float]:
+    return [random.random() for _ in range(DIM)]
+
+
+def _search(client: MilvusClient, vector: list[float]):
+    return client.search(
+        collection_name=COLLECTION_NAME,
+        anns_field=ANNS_FIELD,
+        data=[vector],
+        limit=3,
+        search_params={"metric_type": "COSINE"},
+        output_fields=["question", "answer"]
+    )
+
+
+def search_with_reload(client: MilvusClient, vector: list[float]):
+    """旧实现：每次搜索前检查加载状态，搜索后释放集合"""
+    state = client.get_load_state(collection_name=COLLECTION_NAME)
+    if state["state"] != LoadState.Loaded:
+        client.load_collection(collection_name=COLLECTION_NAME)
+    result = _search(client, vector)
+    client.release_collection(collection_name=COLLECTION_NAME)
+    return result
+
+
+def search_with_residency(client: MilvusClient, residency: CollectionResidencyManager, vector: list[float]):
+    """新实现：集合常驻，只持有引用"""
+    with residency.acquire(COLLECTION_NAME):
+        return _search(client, vector)
+
+
+def _report(name: str, latencies: list[float]) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{name:<12} mean={statistics.mean(latencies):8.2f}ms "
+        f"p50={statistics.median(latencies):8.2f}ms p95={p95:8.2f}ms"
+    )
+
+
+def main():
+    client = MilvusClient(
+        uri=f"http://{settings.MILVUS_HOST}:{settings.MILVUS_PORT}",
+        db_name=settings.MILVUS_DATABASE
+    )
+
+    reload_latencies = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        search_with_reload(client, _random_vector())
+        reload_latencies.append((time.perf_counter() - start) * 1000)
+
+    residency = CollectionResidencyManager(client)
+    residency.warmup([COLLECTION_NAME])
+    resident_latencies = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        search_with_residency(client, residency, _random_vector())
+        resident_latencies.append((time.perf_counter() - start) * 1000)
+
+    print(f"collection={COLLECTION_NAME} rounds={ROUNDS}")
+    _report("load/release", reload_latencies)
+    _report("resident", resident_latencies)
+    print(f"residency stats: {residency.stats()}")
+
+
+if __name__ == "__main__":
+    main()
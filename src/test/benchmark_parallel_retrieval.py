@@ -0,0 +1,91 @@
+"""对比多跳问题在 sequential 与 parallel 两种检索规划模式下的端到端耗时
+
+使用真实的 supervisor_node / retrieval_agent_node 与图结构，LLM 与检索 agent 替换为固定延迟的模拟实现，
+只衡量编排方式本身带来的差异：问题需要 SUB_QUERIES 个相互独立的检索子任务，
+sequential 模式逐轮检索，parallel 模式一轮并发检索。
+
+    python -m src.test.benchmark_parallel_retrieval
+"""
+
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import START, StateGraph
+from langgraph.types import Command
+
+import src.graph.node as node
+from src.config.setting import settings
+from src.graph.types import State
+
+SUB_QUERIES = ["子问题一", "子问题二", "子问题三"]
+LLM_LATENCY_SECONDS = 0.5
+AGENT_LATENCY_SECONDS = 3.0
+
+
+class FakeStructuredLLM:
+    """按模式返回规划结果：已检索的子任务不足时继续发布任务"""
+
+    def __init__(self, schema):
+        self.schema = schema
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(LLM_LATENCY_SECONDS)
+        prompt = "".join(message.content for message in messages)
+        pending = [q for q in SUB_QUERIES if q not in prompt]
+        if "sub_queries" in self.schema.model_fields:
+            return self.schema(needs_more_info=bool(pending), sub_queries=pending)
+        return self.schema(needs_more_info=bool(pending), task_description_item=pending[0] if pending else "")
+
+
+class FakeLLM:
+    def with_structured_output(self, schema):
+        return FakeStructuredLLM(schema)
+
+
+class FakeAgent:
+    async def ainvoke(self, inputs):
+        await asyncio.sleep(AGENT_LATENCY_SECONDS)
+        return {"messages": [AIMessage(content=f"检索结果：{inputs['messages'][0][1]}")]}
+
+
+async def _done(state: State):
+    return Command(goto="__end__")
+
+
+def _build_graph():
+    builder = StateGraph(State)
+    builder.add_edge(START, "supervisor")
+    builder.add_node("supervisor", node.supervisor_node)
+    builder.add_node("retrieval_agent", node.retrieval_agent_node)
+    builder.add_node("deal_with_results", _done)
+    return builder.compile()
+
+
+async def _run(mode: str) -> tuple[float, int]:
+    settings.SUPERVISOR_PLANNING_MODE = mode
+    graph = _build_graph()
+    started = time.perf_counter()
+    result = await graph.ainvoke({
+        "messages": [HumanMessage(content="多跳问题")],
+        "user_query": "多跳问题",
+        "current_iteration": 0,
+        "max_retrieval_iterations": len(SUB_QUERIES),
+        "task_description": [],
+        "retrieved_information": [],
+    })
+    return time.perf_counter() - started, len(result["retrieved_information"])
+
+
+async def main():
+    node.get_llm_by_type = lambda llm_type: FakeLLM()
+    node.get_react_agent = lambda tools, prompt: FakeAgent()
+
+    print(f"{'mode':>10} | {'seconds':>8} | {'retrieved':>9}")
+    for mode in ("sequential", "parallel"):
+        elapsed, retrieved = await _run(mode)
+        print(f"{mode:>10} | {elapsed:>8.2f} | {retrieved:>9}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
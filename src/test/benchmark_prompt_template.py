@@ -0,0 +1,63 @@
+"""apply_prompt_template 吞吐量对比：每次调用动态导入模板文件 vs 启动时加载的模板注册表
+
+    python -m src.test.benchmark_prompt_template
+    python -m src.test.benchmark_prompt_template --iterations 20000
+"""
+
+import argparse
+import importlib.util
+import os
+import time
+from datetime import datetime
+
+from langchain_core.messages import SystemMessage
+
+import src.prompts.template as template_module
+from src.prompts.template import apply_prompt_template, prompt_registry
+
+PROMPT_PARAMS = {
+    "route": {"user_query": "什么是检索增强生成？"},
+    "answer": {"user_query": "什么是检索增强生成？", "retrieved_information": "检索结果", "memory_info": ""},
+}
+
+
+def legacy_apply_prompt_template(prompt_name: str, state: dict, **kwargs) -> list:
+    """原实现：每次调用都通过 spec_from_file_location + exec_module 重新导入模板文件"""
+    prompt_file_path = os.path.join(os.path.dirname(template_module.__file__), f"{prompt_name}.py")
+    spec = importlib.util.spec_from_file_location(prompt_name, prompt_file_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    template = getattr(module, f"{prompt_name.upper()}_PROMPT")
+    current_time = datetime.now().strftime("%a %b %d %Y %H:%M:%S %z")
+    return [SystemMessage(content=template.format(CURRENT_TIME=current_time, locale=state.get("locale", "zh-CN"), **kwargs))]
+
+
+def _bench(apply, prompt_name: str, iterations: int) -> float:
+    state = {"locale": "zh-CN"}
+    params = PROMPT_PARAMS.get(prompt_name, {})
+    started = time.perf_counter()
+    for _ in range(iterations):
+        apply(prompt_name, state, **params)
+    return iterations / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="apply_prompt_template 吞吐量对比")
+    parser.add_argument("--iterations", type=int, default=5000, help="每个模板的调用次数")
+    args = parser.parse_args()
+
+    # registry+reload：开发环境开启热加载时，每次调用额外检查文件修改时间（最多每秒一次）
+    modes = [("legacy", legacy_apply_prompt_template, False), ("registry", apply_prompt_template, False),
+             ("registry+reload", apply_prompt_template, True)]
+
+    print(f"{'prompt':>8} | " + " | ".join(f"{name:>15}" for name, _, _ in modes) + " | speedup")
+    for prompt_name in PROMPT_PARAMS:
+        rates = []
+        for _, apply, hot_reload in modes:
+            prompt_registry.hot_reload = hot_reload
+            rates.append(_bench(apply, prompt_name, args.iterations))
+        cells = " | ".join(f"{rate:>10.0f} op/s" for rate in rates)
+        print(f"{prompt_name:>8} | {cells} | {rates[1] / rates[0]:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
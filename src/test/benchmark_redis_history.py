@@ -0,0 +1,112 @@
+"""对比会话历史读取在逐条读取与批量读取两种方式下的往返次数和延迟
+
+默认使用 fakeredis 作为本地 Redis 替身（pip install fakeredis），并为每次往返模拟固定的网络延迟；
+设置环境变量 BENCHMARK_REAL_REDIS=1 时改为连接 .env 中配置的 Redis。
+
+    python -m src.test.benchmark_redis_history
+"""
+
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from src.schema.redis import MessageRole, RedisKeyBuilder, RedisMessage
+from src.utils.redis_history import read_session_messages
+
+SIMULATED_RTT_SECONDS = 0.0005  # 模拟同机房 0.5ms 往返
+MESSAGE_COUNTS = [20, 50, 200]
+ROUNDS = 20
+USER_ID = 1
+SESSION_ID = "benchmark-session"
+
+
+class RoundTripCounter:
+    """统计从连接池借出连接的次数，每次借出对应一次网络往返（普通命令或一次流水线）"""
+
+    def __init__(self, client, simulate_rtt: bool):
+        self.count = 0
+        pool = client.connection_pool
+        original_get_connection = pool.get_connection
+
+        def get_connection(*args, **kwargs):
+            self.count += 1
+            if simulate_rtt:
+                time.sleep(SIMULATED_RTT_SECONDS)
+            return original_get_connection(*args, **kwargs)
+
+        pool.get_connection = get_connection
+
+
+def legacy_get_messages(redis_client, session_messages_key: str, limit: int) -> list:
+    """旧实现：exists + zrevrange，然后逐条 exists + get"""
+    if not redis_client.exists(session_messages_key):
+        return []
+    message_keys = redis_client.zrevrange(session_messages_key, 0, limit - 1)
+    messages = []
+    for key in message_keys:
+        if redis_client.exists(key):
+            message_json = redis_client.get(key)
+            if message_json:
+                messages.append(RedisMessage.from_json(message_json))
+        else:
+            redis_client.zrem(session_messages_key, key)
+    return list(reversed(messages))
+
+
+def _create_client():
+    if os.getenv("BENCHMARK_REAL_REDIS") == "1":
+        from src.config.redis import get_redis_client
+        return get_redis_client(), False
+    import fakeredis
+    return fakeredis.FakeRedis(decode_responses=True), True
+
+
+def _populate(redis_client, count: int) -> str:
+    session_messages_key = RedisKeyBuilder.session_messages_key(USER_ID, SESSION_ID)
+    redis_client.delete(session_messages_key)
+    start = datetime(2025, 1, 1)
+    pipe = redis_client.pipeline(transaction=False)
+    for i in range(count):
+        created_at = start + timedelta(seconds=i)
+        message = RedisMessage(
+            session_id=SESSION_ID,
+            user_id=USER_ID,
+            message_role=MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT,
+            message=f"message {i}",
+            created_at=created_at.isoformat()
+        )
+        key = RedisKeyBuilder.message_key(USER_ID, SESSION_ID, created_at)
+        pipe.setex(key, 600, message.to_json())
+        pipe.zadd(session_messages_key, {key: created_at.timestamp()})
+    pipe.execute()
+    return session_messages_key
+
+
+def _measure(counter: RoundTripCounter, fn) -> tuple[int, float]:
+    latencies = []
+    round_trips = 0
+    for _ in range(ROUNDS):
+        counter.count = 0
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+        round_trips = counter.count
+    return round_trips, statistics.median(latencies)
+
+
+def main():
+    redis_client, simulate_rtt = _create_client()
+    counter = RoundTripCounter(redis_client, simulate_rtt)
+
+    print(f"{'messages':>8} | {'legacy trips':>12} {'legacy ms':>10} | {'batched trips':>13} {'batched ms':>10}")
+    for count in MESSAGE_COUNTS:
+        session_messages_key = _populate(redis_client, count)
+        legacy = _measure(counter, lambda: legacy_get_messages(redis_client, session_messages_key, count))
+        batched = _measure(counter, lambda: read_session_messages(redis_client, session_messages_key, count))
+        print(f"{count:>8} | {legacy[0]:>12} {legacy[1]:>10.2f} | {batched[0]:>13} {batched[1]:>10.2f}")
+        redis_client.delete(session_messages_key, *redis_client.scan_iter(f"{USER_ID}:{SESSION_ID}:*"))
+
+
+if __name__ == "__main__":
+    main()
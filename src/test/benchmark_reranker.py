@@ -0,0 +1,110 @@
+"""对比重排阶段的延迟与发送字节数：原 DashScopeRerank（全文、无缓存）与带缓存、截断的 Reranker
+
+模拟检索 agent 的工作负载：CALLS 次工具调用，查询按 Zipf 分布从 QUERY_POOL 个问题中抽取（热门问题重复出现），
+同一主题的查询召回的候选文档相互重叠，候选文档为 3000~6000 字的切分块。
+后端为模拟实现：远端服务按固定往返延迟 + 每 KB 传输耗时计时，本地模型按每 token 推理耗时计时。
+指定 --onnx-model 时改用真实的本地 ONNX cross-encoder 计时。
+
+    python -m src.test.benchmark_reranker
+    python -m src.test.benchmark_reranker --onnx-model models/bge-reranker-base-onnx
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.rag.reranker import OnnxCrossEncoderBackend, Reranker
+from src.utils.context_builder import TokenCounter
+
+CALLS = 300
+QUERY_POOL = 40
+TOPICS = 8
+DOCS_PER_TOPIC = 15
+CANDIDATES = 6
+REMOTE_RTT_MS = 60
+REMOTE_MS_PER_KB = 0.4
+LOCAL_MS_PER_TOKEN = 0.02
+
+
+class SimulatedRemoteBackend:
+    """模拟远端重排服务"""
+
+    remote = True
+
+    def __init__(self):
+        self.name = "simulated-remote"
+
+    def score(self, query, documents):
+        size_kb = sum(len(d.encode("utf-8")) for d in documents) / 1024
+        time.sleep((REMOTE_RTT_MS + REMOTE_MS_PER_KB * size_kb) / 1000)
+        return [float(hash((query, d)) % 1000) / 1000 for d in documents]
+
+
+class SimulatedLocalBackend:
+    """模拟本地 CPU cross-encoder"""
+
+    remote = False
+
+    def __init__(self):
+        self.name = "simulated-local"
+        self.counter = TokenCounter()
+
+    def score(self, query, documents):
+        tokens = sum(self.counter.count(query) + self.counter.count(d) for d in documents)
+        time.sleep(LOCAL_MS_PER_TOKEN * tokens / 1000)
+        return [float(hash((query, d)) % 1000) / 1000 for d in documents]
+
+
+def _workload(seed: int = 0) -> list[tuple[str, list[Document]]]:
+    rng = np.random.default_rng(seed)
+    chunks = [
+        [Document(page_content=f"主题{t}第{i}条：" + "监管政策条文内容。" * int(rng.integers(330, 660)),
+                  metadata={"pk": t * 1000 + i})
+         for i in range(DOCS_PER_TOPIC)]
+        for t in range(TOPICS)
+    ]
+    # 热门问题出现得更频繁；每个问题属于一个主题，召回该主题中的部分文档
+    weights = 1 / np.arange(1, QUERY_POOL + 1)
+    weights /= weights.sum()
+    calls = []
+    for _ in range(CALLS):
+        q = int(rng.choice(QUERY_POOL, p=weights))
+        topic = q % TOPICS
+        q_rng = np.random.default_rng(q)
+        picked = q_rng.choice(DOCS_PER_TOPIC, size=CANDIDATES, replace=False)
+        calls.append((f"问题{q}", [chunks[topic][i] for i in picked]))
+    return calls
+
+
+async def _run(name: str, reranker: Reranker, calls) -> None:
+    latencies = []
+    for query, documents in calls:
+        started = time.perf_counter()
+        await reranker.arerank(query, documents)
+        latencies.append((time.perf_counter() - started) * 1000)
+    stats = reranker.stats()
+    print(f"{name:<44} p50 {statistics.median(latencies):7.1f}ms  mean {statistics.mean(latencies):7.1f}ms  "
+          f"hit ratio {stats['hit_ratio']:6.1%}  bytes sent {stats['bytes_sent'] / 1024 / 1024:7.2f}MB")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="对比重排阶段的延迟与发送字节数")
+    parser.add_argument("--onnx-model", default="", help="本地 ONNX cross-encoder 模型目录")
+    parser.add_argument("--max-doc-tokens", type=int, default=512, help="打分前截断到的 token 数")
+    args = parser.parse_args()
+
+    calls = _workload()
+    print(f"{CALLS} rerank calls, {QUERY_POOL} distinct queries, {CANDIDATES} candidates per call")
+    # 原实现：每次调用发送全部候选的全文
+    await _run("remote, full text, no cache", Reranker(SimulatedRemoteBackend(), max_doc_tokens=10 ** 6, cache_size=0), calls)
+    await _run("remote, truncated + cache", Reranker(SimulatedRemoteBackend(), max_doc_tokens=args.max_doc_tokens), calls)
+    local = OnnxCrossEncoderBackend(args.onnx_model) if args.onnx_model else SimulatedLocalBackend()
+    await _run(f"local ({local.name}), truncated + cache", Reranker(local, max_doc_tokens=args.max_doc_tokens), calls)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""对比检索类问题在开启 / 关闭 SPECULATIVE_MEMORY_LOOKUP 时，从路由开始到进入监督者节点的耗时
+
+使用真实的 route_node / get_memory_node / generate_answer 与图结构，LLM、向量化与 Milvus 替换为固定延迟的模拟实现。
+同时统计不需要检索的问题（路由到 answer）在推测执行下被取消的记忆查询次数。
+
+    python -m src.test.benchmark_speculative_memory
+"""
+
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage
+from langgraph.graph import START, StateGraph
+from langgraph.types import Command
+
+import src.graph.node as node
+from src.config.setting import settings
+from src.graph.types import State
+
+LLM_LATENCY_SECONDS = 0.8
+EMBEDDING_LATENCY_SECONDS = 0.05
+MILVUS_LATENCY_SECONDS = 0.05
+
+
+class FakeLLM:
+    """路由提示词返回检索判断，其他提示词返回改写后的问题或答案"""
+
+    def __init__(self, needs_retrieval: bool):
+        self.needs_retrieval = needs_retrieval
+        self.cancelled = 0
+
+    async def ainvoke(self, messages):
+        try:
+            await asyncio.sleep(LLM_LATENCY_SECONDS)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        prompt = "".join(message.content for message in messages)
+        if "请只返回" in prompt:
+            return AIMessage(content="true" if self.needs_retrieval else "false")
+        return AIMessage(content="改写后的问题")
+
+
+class FakeEmbeddingService:
+    async def aembed(self, text):
+        await asyncio.sleep(EMBEDDING_LATENCY_SECONDS)
+        return [0.0] * 8
+
+
+class FakeMilvus:
+    async def search_data_by_single_vector(self, *args, **kwargs):
+        await asyncio.sleep(MILVUS_LATENCY_SECONDS)
+        return [{"distance": 0.9, "fields": {"question": "问题", "answer": "答案"}}]
+
+
+async def _reached(state: State):
+    return Command(goto="__end__")
+
+
+def _build_graph():
+    builder = StateGraph(State)
+    builder.add_edge(START, "route")
+    builder.add_node("route", node.route_node)
+    builder.add_node("get_memory", node.get_memory_node)
+    builder.add_node("answer", node.generate_answer)
+    builder.add_node("supervisor", _reached)
+    return builder.compile()
+
+
+async def _run(speculative: bool, needs_retrieval: bool) -> tuple[float, int, int]:
+    settings.SPECULATIVE_MEMORY_LOOKUP = speculative
+    llm = FakeLLM(needs_retrieval)
+    node.get_llm_by_type = lambda llm_type: llm
+    started = time.perf_counter()
+    result = await _build_graph().ainvoke({
+        "messages": [],
+        "history_messages": [],
+        "user_query": "问题",
+        "memory_threshold": 0.65,
+        "embeddings": {},
+    })
+    return time.perf_counter() - started, len(result.get("memory_info") or []), llm.cancelled
+
+
+async def main():
+    node.embedding_service = FakeEmbeddingService()
+    node.async_milvus_service = FakeMilvus()
+
+    print(f"{'question':>12} | {'speculative':>11} | {'seconds':>7} | {'memory':>6} | {'cancelled':>9}")
+    for needs_retrieval, label in ((True, "retrieval"), (False, "direct")):
+        for speculative in (False, True):
+            elapsed, memory, cancelled = await _run(speculative, needs_retrieval)
+            print(f"{label:>12} | {str(speculative):>11} | {elapsed:>7.2f} | {memory:>6} | {cancelled:>9}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
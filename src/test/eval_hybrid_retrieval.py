@@ -0,0 +1,153 @@
+"""对比 dense 与 hybrid 两种知识库检索模式：召回、检索 agent 工具调用次数与 supervisor 检索轮数
+
+对数据集中的每个问题、每种模式分别：
+- 直接调用检索器（含重排），统计检索耗时与命中率（期望词出现在返回的文档中）
+- 运行真实的 supervisor → retrieval_agent 检索循环（与 benchmark_parallel_retrieval 相同的图结构），
+  统计 supervisor 发布检索任务的轮数、检索 agent 的工具调用次数，以及最终检索结果是否覆盖期望词
+
+数据集为 JSONL，每行 {"query": "...", "expected": ["第十条", "..."]}，expected 为应当检索到的条款编号或术语；
+不指定数据集时使用内置的示例问题。需要可用的 Milvus（hybrid 模式需先运行
+python -m src.script.process_markdown --mode hybrid）以及 CHAT_MODEL 等环境变量。
+
+    python -m src.test.eval_hybrid_retrieval
+    python -m src.test.eval_hybrid_retrieval --dataset retrieval_eval.jsonl --modes dense,hybrid --retrieval-only
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import HumanMessage
+from langgraph.graph import START, StateGraph
+from langgraph.types import Command
+
+import src.agents.agents as agents
+import src.graph.node as node
+from src.graph.types import State
+from src.rag.knowledge_store import DENSE, HYBRID
+from src.rag.retriever import milvus_retriever
+
+SAMPLE_DATASET = [
+    {"query": "资本工具合作标准是什么？", "expected": ["资本工具"]},
+    {"query": "商业银行资本管理办法第十条规定了什么？", "expected": ["第十条"]},
+    {"query": "银行保险机构关联交易管理办法对关联方是如何认定的？", "expected": ["关联方"]},
+    {"query": "理财公司理财产品销售管理暂行办法中的销售机构有哪些要求？", "expected": ["销售机构"]},
+    {"query": "商业银行流动性覆盖率的最低监管标准是多少？", "expected": ["流动性覆盖率", "100%"]},
+    {"query": "银行业金融机构反洗钱和反恐怖融资管理办法的适用范围是什么？", "expected": ["反洗钱"]},
+]
+
+
+class ToolCallCounter(AsyncCallbackHandler):
+    """统计检索 agent 的工具调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def on_tool_start(self, serialized, input_str, **kwargs):
+        self.calls += 1
+
+
+def _load_dataset(path: str) -> list[dict]:
+    if not path:
+        return SAMPLE_DATASET
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _covers(text: str, expected: list[str]) -> bool:
+    return all(term in text for term in expected)
+
+
+async def _done(state: State):
+    return Command(goto="__end__")
+
+
+def _build_graph():
+    builder = StateGraph(State)
+    builder.add_edge(START, "supervisor")
+    builder.add_node("supervisor", node.supervisor_node)
+    builder.add_node("retrieval_agent", node.retrieval_agent_node)
+    builder.add_node("deal_with_results", _done)
+    return builder.compile()
+
+
+async def _eval_mode(mode: str, rows: list[dict], retrieval_only: bool, max_iterations: int) -> dict:
+    client = milvus_retriever(mode)
+    retriever = client.get_retriever()
+    # 检索 agent 按工具名缓存，切换模式时替换工具并重新编译
+    node.retriever_tool = client.create_retriever_tool(retriever)
+    agents._react_agent_cache.clear()
+    graph = _build_graph()
+
+    latencies, hits, iterations, tool_calls, covered = [], 0, [], [], 0
+    for row in rows:
+        query, expected = row["query"], row.get("expected", [])
+
+        started = time.perf_counter()
+        docs = await retriever.ainvoke(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += _covers("\n".join(doc.page_content for doc in docs), expected)
+
+        if retrieval_only:
+            continue
+        counter = ToolCallCounter()
+        result = await graph.ainvoke(
+            {
+                "messages": [HumanMessage(content=query)],
+                "user_query": query,
+                "rewrite_query": query,
+                "memory_info": [],
+                "current_iteration": 0,
+                "max_retrieval_iterations": max_iterations,
+                "task_description": [],
+                "retrieved_information": [],
+            },
+            config={"callbacks": [counter]}
+        )
+        iterations.append(result.get("current_iteration", 0))
+        tool_calls.append(counter.calls)
+        covered += _covers("\n".join(result.get("retrieved_information", [])), expected)
+
+    return {
+        "mode": mode,
+        "latencies": latencies,
+        "hits": hits,
+        "iterations": iterations,
+        "tool_calls": tool_calls,
+        "covered": covered,
+    }
+
+
+def _report(result: dict, total: int) -> None:
+    latencies = result["latencies"]
+    print(f"[{result['mode']}]")
+    print(f"  retriever hit rate:     {result['hits']}/{total} ({result['hits'] / total:.1%})")
+    print(f"  retriever latency:      p50 {statistics.median(latencies):.0f}ms, max {max(latencies):.0f}ms")
+    if result["iterations"]:
+        print(f"  supervisor iterations:  avg {statistics.mean(result['iterations']):.2f}, "
+              f"max {max(result['iterations'])}")
+        print(f"  agent tool calls:       avg {statistics.mean(result['tool_calls']):.2f}, "
+              f"total {sum(result['tool_calls'])}")
+        print(f"  answer coverage:        {result['covered']}/{total} ({result['covered'] / total:.1%})")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="对比 dense 与 hybrid 检索模式")
+    parser.add_argument("--dataset", default="", help="JSONL 数据集路径，默认使用内置示例")
+    parser.add_argument("--modes", default=f"{DENSE},{HYBRID}", help="逗号分隔的检索模式")
+    parser.add_argument("--retrieval-only", action="store_true", help="只评估检索器，不运行检索循环")
+    parser.add_argument("--max-iterations", type=int, default=3, help="supervisor 最多检索轮数")
+    args = parser.parse_args()
+
+    rows = _load_dataset(args.dataset)
+    print(f"questions: {len(rows)}")
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        result = await _eval_mode(mode, rows, args.retrieval_only, args.max_iterations)
+        _report(result, len(rows))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+"""离线评估本地预路由：与 LLM 路由判断的一致率，以及节省的延迟
+
+对数据集中的每个问题分别运行预路由与 LLM 路由（与 route_node 相同的提示词，不带聊天历史），统计：
+- 本地决定率：预路由直接给出结果的比例
+- 一致率：本地决定的问题中，与 LLM 判断相同的比例（按 检索 / 直接回答 分别统计）
+- 节省的延迟：本地决定的问题原本需要的 LLM 调用耗时
+
+数据集为 JSONL，每行 {"query": "...", "route": "retrieve" | "answer"}，route 为人工标注的正确路由；
+可选的 history 为此前的聊天记录 [{"role": "user" | "assistant", "content": "..."}]，与 route_node 一样传给预路由和 LLM；
+也可以用 llm_route 给出 LLM 的判断。两者都省略时调用 LLM（需要配置 CHAT_MODEL 等环境变量）。
+不指定数据集时使用内置的示例问题。src/test/data/pre_router_labels.jsonl 为人工标注的数据集，
+包含大量带“办法”“通知”“规定”“税”等通用词的闲聊问题，用于选定 PRE_ROUTER_MIN_CONFIDENCE；
+--sweep 输出不同阈值下的本地决定率与准确率。
+
+    python -m src.test.eval_pre_router
+    python -m src.test.eval_pre_router --dataset src/test/data/pre_router_labels.jsonl --sweep --llm-latency-ms 600
+    python -m src.test.eval_pre_router --dataset route_eval.jsonl --show-disagreements
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.config.agents import AGENT_LLM_MAP
+from src.llms.llm import get_llm_by_type
+from src.prompts.template import build_prompt_messages
+from src.utils.pre_router import ANSWER, RETRIEVE, PreRouter, pre_router
+
+SAMPLE_QUERIES = [
+    "你好",
+    "您好！",
+    "谢谢",
+    "好的，知道了",
+    "再见",
+    "你是谁？",
+    "在吗",
+    "今天天气怎么样？",
+    "给我讲个笑话",
+    "帮我把这段话润色一下：我们明天开会",
+    "1+1等于几？",
+    "你能做什么？",
+    "北京市最新的科技政策是什么？",
+    "小微企业贷款贴息政策有哪些申报条件？",
+    "跨境人民币业务需要向人民银行备案吗？",
+    "私募基金管理人登记的监管要求有哪些？",
+    "个人所得税专项附加扣除的标准是多少？",
+    "商业银行资本管理办法第十条规定了什么？",
+    "违反反洗钱规定会受到什么处罚？",
+    "外汇管理局对个人购汇额度有什么规定？",
+    "高新技术企业认定流程是怎样的？",
+    "最新发布的数据安全法规有哪些？",
+    "那上海市的呢？",
+    "ETF是什么？",
+    "我应该买基金还是存定期？",
+    "这个政策对我有什么影响？",
+]
+
+SWEEP_THRESHOLDS = [0.75, 0.8, 0.82, 0.85, 0.87, 0.9, 0.95]
+
+
+def _load_dataset(path: str) -> list[dict]:
+    if not path:
+        return [{"query": query} for query in SAMPLE_QUERIES]
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _history(row: dict) -> list:
+    """数据集中的 history 转换为 LangChain 消息"""
+    return [
+        AIMessage(content=item["content"]) if item["role"] == "assistant" else HumanMessage(content=item["content"])
+        for item in row.get("history", [])
+    ]
+
+
+async def _llm_route(query: str, history: list) -> tuple[str, float]:
+    """与 route_node 相同的 LLM 判断，返回 (路由, 耗时秒数)"""
+    llm = get_llm_by_type(AGENT_LLM_MAP.get("route", "basic"))
+    messages = build_prompt_messages("route", {"locale": "zh-CN"}, history, user_query=query)
+    started = time.perf_counter()
+    response = await llm.ainvoke(messages)
+    elapsed = time.perf_counter() - started
+    return (RETRIEVE if response.content.strip().lower() == "true" else ANSWER), elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="评估本地预路由与 LLM 路由的一致率")
+    parser.add_argument("--dataset", default="", help="JSONL 数据集路径，默认使用内置示例")
+    parser.add_argument("--min-confidence", type=float, default=pre_router.min_confidence, help="预路由置信度阈值")
+    parser.add_argument("--embedding", action="store_true", default=pre_router.embedding_enabled, help="启用向量分类")
+    parser.add_argument(
+        "--llm-latency-ms", type=float, default=0.0,
+        help="数据集已提供 llm_route、没有实测 LLM 耗时时，用于估算节省延迟的单次 LLM 路由耗时"
+    )
+    parser.add_argument("--show-disagreements", action="store_true", help="列出与 LLM 判断不一致的问题")
+    parser.add_argument("--sweep", action="store_true", help="输出不同置信度阈值下的本地决定率与准确率")
+    args = parser.parse_args()
+
+    router = PreRouter(
+        min_confidence=args.min_confidence,
+        embedding_enabled=args.embedding,
+        embedding_margin=pre_router.embedding_margin
+    )
+    rows = _load_dataset(args.dataset)
+
+    llm_latencies, local_ms, results = [], [], []
+    for row in rows:
+        query = row["query"]
+        started = time.perf_counter()
+        decision = await router.decide(query, _history(row))
+        local_ms.append((time.perf_counter() - started) * 1000)
+
+        expected, llm_seconds = row.get("route") or row.get("llm_route"), None
+        if expected is None:
+            expected, llm_seconds = await _llm_route(query, _history(row))
+            llm_latencies.append(llm_seconds)
+        results.append((query, decision, expected, llm_seconds))
+
+    decided = [r for r in results if r[1].route is not None]
+    agreed = [r for r in decided if r[1].route == r[2]]
+    avg_llm = statistics.mean(llm_latencies) if llm_latencies else args.llm_latency_ms / 1000
+    # 节省的延迟：本地决定的问题不再需要 LLM 调用（没有实测耗时时按平均值估算）
+    saved = sum(r[3] if r[3] is not None else avg_llm for r in decided)
+
+    print(f"questions:          {len(results)}")
+    print(f"decided locally:    {len(decided)} ({len(decided) / len(results):.1%})")
+    print(f"agreement:          {len(agreed)}/{len(decided)} ({len(agreed) / len(decided):.1%})" if decided else
+          "agreement:          n/a")
+    for route in (RETRIEVE, ANSWER):
+        subset = [r for r in decided if r[1].route == route]
+        if subset:
+            ok = sum(1 for r in subset if r[2] == route)
+            print(f"  {route:>8}:         {ok}/{len(subset)} ({ok / len(subset):.1%})")
+    print(f"pre-router latency: p50 {statistics.median(local_ms):.3f}ms, max {max(local_ms):.3f}ms")
+    if llm_latencies:
+        print(f"LLM route latency:  avg {avg_llm * 1000:.0f}ms")
+    print(f"latency saved:      {saved:.2f}s total, {saved / len(results) * 1000:.0f}ms per message")
+
+    if args.sweep:
+        await _sweep(rows, results, args.embedding)
+
+    if args.show_disagreements:
+        print("\ndisagreements:")
+        for query, decision, expected, _ in decided:
+            if decision.route != expected:
+                print(f"  {query} -> pre-router {decision.route} ({decision.reason}), expected {expected}")
+
+
+async def _sweep(rows: list[dict], results: list[tuple], embedding: bool) -> None:
+    """不同置信度阈值下的本地决定率与准确率"""
+    print("\nmin_confidence  decided  accuracy  wrong retrieve  wrong answer")
+    for threshold in SWEEP_THRESHOLDS:
+        router = PreRouter(
+            min_confidence=threshold,
+            embedding_enabled=embedding,
+            embedding_margin=pre_router.embedding_margin
+        )
+        decided = wrong_retrieve = wrong_answer = 0
+        for row, (_, _, expected, _) in zip(rows, results):
+            decision = await router.decide(row["query"], _history(row))
+            if decision.route is None:
+                continue
+            decided += 1
+            if decision.route != expected:
+                if decision.route == RETRIEVE:
+                    wrong_retrieve += 1
+                else:
+                    wrong_answer += 1
+        accuracy = (decided - wrong_retrieve - wrong_answer) / decided if decided else 0.0
+        print(f"{threshold:>14.2f}  {decided / len(rows):>7.1%}  {accuracy:>8.1%}  {wrong_retrieve:>14}  {wrong_answer:>12}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
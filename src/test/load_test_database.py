@@ -0,0 +1,127 @@
+"""并发鉴权 + 聊天流量下的事件循环卡顿对比：同步 Session 与 AsyncSession
+
+模拟两类并发流量：
+- 鉴权：多个协程循环调用 get_user（get_current_user 每个请求都会调用）
+- 聊天：多个协程模拟 SSE 流，每 20ms 推送一个 token，统计 token 间隔的抖动
+同时用一个 10ms 的心跳协程测量事件循环延迟。
+
+blocking 模式复现原实现（async def 内部执行同步 Session 查询），async 模式使用 DatabaseService 的异步 API。
+运行前需要启动 PostgreSQL（使用 .env 中的 POSTGRES_URL）。
+
+    python -m src.test.load_test_database
+    python -m src.test.load_test_database --duration 20 --auth-concurrency 100 --chat-streams 50
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlmodel import Session
+
+from src.schema.user import User
+from src.services.database import database_service
+
+HEARTBEAT_INTERVAL = 0.01
+TOKEN_INTERVAL = 0.02
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def blocking_get_user(user_id: int):
+    """原实现：在协程中直接执行同步查询，查询期间事件循环被阻塞"""
+    with Session(database_service.engine) as session:
+        return session.get(User, user_id)
+
+
+async def async_get_user(user_id: int):
+    return await database_service.get_user(user_id)
+
+
+async def _heartbeat(stop: asyncio.Event, lags: list) -> None:
+    while not stop.is_set():
+        expected = time.perf_counter() + HEARTBEAT_INTERVAL
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append((time.perf_counter() - expected) * 1000)
+
+
+async def _chat_stream(stop: asyncio.Event, gaps: list) -> None:
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(TOKEN_INTERVAL)
+        now = time.perf_counter()
+        # 超出预期间隔的部分即用户感知到的卡顿
+        gaps.append((now - last - TOKEN_INTERVAL) * 1000)
+        last = now
+
+
+async def _auth_worker(get_user, user_id: int, stop: asyncio.Event, latencies: list) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await get_user(user_id)
+        latencies.append((time.perf_counter() - started) * 1000)
+        # 每个请求之间让出一次事件循环（同步查询本身从不让出，否则会饿死其他协程）
+        await asyncio.sleep(0)
+
+
+async def run_mode(name: str, get_user, user_id: int, args) -> dict:
+    stop = asyncio.Event()
+    loop_lags, token_gaps, auth_latencies = [], [], []
+    tasks = [asyncio.create_task(_heartbeat(stop, loop_lags))]
+    tasks += [asyncio.create_task(_chat_stream(stop, token_gaps)) for _ in range(args.chat_streams)]
+    tasks += [
+        asyncio.create_task(_auth_worker(get_user, user_id, stop, auth_latencies))
+        for _ in range(args.auth_concurrency)
+    ]
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return {
+        "mode": name,
+        "auth_rps": len(auth_latencies) / args.duration,
+        "auth_p50": statistics.median(auth_latencies) if auth_latencies else 0.0,
+        "auth_p99": _percentile(auth_latencies, 0.99),
+        "lag_p99": _percentile(loop_lags, 0.99),
+        "lag_max": max(loop_lags, default=0.0),
+        "gap_p99": _percentile(token_gaps, 0.99),
+        "gap_max": max(token_gaps, default=0.0),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="对比同步 Session 与 AsyncSession 下的事件循环卡顿")
+    parser.add_argument("--duration", type=float, default=10, help="每种模式的运行时间（秒）")
+    parser.add_argument("--auth-concurrency", type=int, default=50, help="并发鉴权协程数")
+    parser.add_argument("--chat-streams", type=int, default=20, help="并发聊天流数")
+    args = parser.parse_args()
+
+    email = f"load-test-{uuid.uuid4().hex[:8]}@example.com"
+    user = await database_service.create_user(email=email, password=User.hash_password("LoadTest#123"))
+    try:
+        results = [
+            await run_mode("blocking", blocking_get_user, user.id, args),
+            await run_mode("async", async_get_user, user.id, args),
+        ]
+    finally:
+        await database_service.delete_user_by_email(email)
+        await database_service.close()
+
+    print(
+        f"{'mode':>8} | {'auth rps':>8} {'p50 ms':>7} {'p99 ms':>7} | "
+        f"{'loop lag p99':>12} {'max':>7} | {'token gap p99':>13} {'max':>7}"
+    )
+    for r in results:
+        print(
+            f"{r['mode']:>8} | {r['auth_rps']:>8.0f} {r['auth_p50']:>7.2f} {r['auth_p99']:>7.2f} | "
+            f"{r['lag_p99']:>12.2f} {r['lag_max']:>7.2f} | {r['gap_p99']:>13.2f} {r['gap_max']:>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,264 @@
+"""按 token 预算组装 supervisor / deal_with_results 节点的上下文
+
+原实现把全部记忆、每一轮检索 agent 的结果和全部聊天历史原样拼进 prompt，
+多轮检索 + 19 条历史时 prompt 很长，延迟与费用随之上涨。这里在拼接前：
+- 记忆、检索结果、聊天历史各自有 token 预算（CONTEXT_TOKEN_BUDGETS）
+- 检索结果按段落拆分，去掉重复或高度重叠的段落，各检索任务的段落轮流入选，避免预算被第一个任务占满
+- 聊天历史从最早的消息开始丢弃，最新的消息始终保留
+- 每个节点组装出的 token 数写入日志，并通过 stats() 暴露
+"""
+
+import math
+import re
+import threading
+from dataclasses import dataclass, field
+from itertools import zip_longest
+from typing import Dict, List, Optional
+
+from langchain_core.messages import BaseMessage
+from loguru import logger
+
+from src.config.setting import settings
+
+# 中日韩文字及全角符号，大多数分词器中约为一个 token
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u9fff\uac00-\ud7af\uff00-\uffef]")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+_PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+# 截断后剩余预算小于该值时不再放入半截段落
+_MIN_PARTIAL_TOKENS = 32
+
+
+class TokenCounter:
+    """token 计数
+
+    estimate：按中日韩字符 1 token、其他字符每 4 个 1 token 估算，不依赖外部词表；
+    tiktoken：使用 cl100k_base 精确计数（首次使用需下载词表，加载失败时退回估算）。
+    """
+
+    def __init__(self, mode: str = "estimate"):
+        self.mode = mode
+        self._encoding = None
+        if mode == "tiktoken":
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable, falling back to estimated token counts: {e}")
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        cjk = len(_CJK_PATTERN.findall(text))
+        return cjk + math.ceil((len(text) - cjk) / 4)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """截断到不超过 max_tokens"""
+        if max_tokens <= 0:
+            return ""
+        tokens = self.count(text)
+        if tokens <= max_tokens:
+            return text
+        if self._encoding is not None:
+            return self._encoding.decode(self._encoding.encode(text, disallowed_special=())[:max_tokens])
+        end = int(len(text) * max_tokens / tokens)
+        while end > 0 and self.count(text[:end]) > max_tokens:
+            end = int(end * 0.9)
+        return text[:end]
+
+
+@dataclass
+class AssembledContext:
+    """组装结果：可直接填入 prompt 模板的字段、截断后的聊天历史及各部分 token 数"""
+
+    memory_info: str
+    retrieved_information: str
+    history: List[BaseMessage]
+    tokens: Dict[str, int] = field(default_factory=dict)
+    duplicates_removed: int = 0
+    passages_dropped: int = 0
+    history_dropped: int = 0
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE_PATTERN.sub("", text).lower()
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def _overlap(a: set, b: set) -> float:
+    """重叠度：交集占较短段落的比例，较短段落被较长段落包含时接近 1"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+class ContextBuilder:
+    """按来源预算组装上下文，并按节点统计 token 数"""
+
+    def __init__(
+        self,
+        budgets: Dict[str, float],
+        counter: Optional[TokenCounter] = None,
+        dedup_threshold: float = 0.8
+    ):
+        self.budgets = budgets
+        self.counter = counter or TokenCounter()
+        self.dedup_threshold = dedup_threshold
+        self._lock = threading.Lock()
+        self._nodes: Dict[str, Dict[str, float]] = {}
+
+    def _budget(self, source: str) -> int:
+        return int(self.budgets.get(source, 0))
+
+    def build_memory(self, memory_info: List[dict]) -> tuple[str, int]:
+        """格式化记忆条目（按相似度顺序），去重并截断到预算内；返回 (文本, 去重条数)"""
+        budget = self._budget("memory")
+        seen, blocks, used, duplicates = set(), [], 0, 0
+        for item in memory_info or []:
+            if not item:
+                continue
+            question, answer = item.get("question", ""), item.get("answer", "")
+            key = _normalize(answer or question)
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            block = f"问题：{question}\n答案：{answer}"
+            tokens = self.counter.count(block)
+            if used + tokens > budget:
+                if budget - used >= _MIN_PARTIAL_TOKENS:
+                    blocks.append(self.counter.truncate(block, budget - used))
+                break
+            blocks.append(block)
+            used += tokens
+        return "\n\n".join(blocks), duplicates
+
+    def build_passages(self, retrieved_information: List[str]) -> tuple[str, int, int]:
+        """拆分检索结果为段落，去重后在预算内轮流选取；返回 (文本, 去重段落数, 因预算丢弃的段落数)"""
+        budget = self._budget("retrieved")
+        per_source = [
+            [p.strip() for p in _PARAGRAPH_PATTERN.split(text or "") if p.strip()]
+            for text in retrieved_information or []
+        ]
+        # 各检索任务的第 1 段优先，其次第 2 段……
+        candidates = [p for group in zip_longest(*per_source) for p in group if p is not None]
+
+        kept: List[str] = []
+        kept_shingles: List[set] = []
+        seen, used, duplicates, dropped = set(), 0, 0, 0
+        for passage in candidates:
+            key = _normalize(passage)
+            if key in seen:
+                duplicates += 1
+                continue
+            shingles = _shingles(key)
+            if any(_overlap(shingles, other) >= self.dedup_threshold for other in kept_shingles):
+                duplicates += 1
+                continue
+            seen.add(key)
+
+            # 编号与段落间的空行也计入预算
+            labelled = f"[{len(kept) + 1}] {passage}"
+            tokens = self.counter.count(labelled) + 1
+            if used + tokens > budget:
+                remaining = budget - used - 1
+                if remaining >= _MIN_PARTIAL_TOKENS:
+                    kept.append(self.counter.truncate(labelled, remaining))
+                    used = budget
+                else:
+                    dropped += 1
+                continue
+            kept.append(labelled)
+            kept_shingles.append(shingles)
+            used += tokens
+        return "\n\n".join(kept), duplicates, dropped
+
+    def trim_history(self, messages: List[BaseMessage]) -> tuple[List[BaseMessage], int]:
+        """从最早的消息开始丢弃，直到剩余历史不超过预算；最新一条消息始终保留"""
+        budget = self._budget("history")
+        messages = list(messages or [])
+        kept, used = [], 0
+        for message in reversed(messages):
+            tokens = self.counter.count(message.content if isinstance(message.content, str) else str(message.content))
+            if kept and used + tokens > budget:
+                break
+            kept.append(message)
+            used += tokens
+        kept.reverse()
+        return kept, len(messages) - len(kept)
+
+    def assemble(self, state: dict) -> AssembledContext:
+        """组装记忆、检索结果与聊天历史"""
+        memory_text, memory_duplicates = self.build_memory(state.get("memory_info", []))
+        passages_text, passage_duplicates, dropped = self.build_passages(state.get("retrieved_information", []))
+        history, history_dropped = self.trim_history(state.get("messages", []))
+        return AssembledContext(
+            memory_info=memory_text,
+            retrieved_information=passages_text,
+            history=history,
+            tokens={
+                "memory": self.counter.count(memory_text),
+                "retrieved": self.counter.count(passages_text),
+                "history": sum(self.counter.count(str(m.content)) for m in history),
+            },
+            duplicates_removed=memory_duplicates + passage_duplicates,
+            passages_dropped=dropped,
+            history_dropped=history_dropped,
+        )
+
+    def record(self, node: str, context: AssembledContext, messages: List[BaseMessage]) -> None:
+        """记录节点最终发送给 LLM 的 token 数"""
+        context.tokens["prompt"] = sum(self.counter.count(str(m.content)) for m in messages)
+        logger.info(
+            f"[{node}] context tokens: prompt={context.tokens['prompt']}, memory={context.tokens['memory']}, "
+            f"retrieved={context.tokens['retrieved']}, history={context.tokens['history']} "
+            f"(duplicates removed={context.duplicates_removed}, passages dropped={context.passages_dropped}, "
+            f"history dropped={context.history_dropped})"
+        )
+        with self._lock:
+            stats = self._nodes.setdefault(node, {
+                "calls": 0, "prompt_tokens": 0, "max_prompt_tokens": 0, "memory_tokens": 0,
+                "retrieved_tokens": 0, "history_tokens": 0, "duplicates_removed": 0,
+                "passages_dropped": 0, "history_dropped": 0,
+            })
+            stats["calls"] += 1
+            stats["prompt_tokens"] += context.tokens["prompt"]
+            stats["max_prompt_tokens"] = max(stats["max_prompt_tokens"], context.tokens["prompt"])
+            for source in ("memory", "retrieved", "history"):
+                stats[f"{source}_tokens"] += context.tokens[source]
+            stats["duplicates_removed"] += context.duplicates_removed
+            stats["passages_dropped"] += context.passages_dropped
+            stats["history_dropped"] += context.history_dropped
+
+    def stats(self) -> dict:
+        """返回各节点的平均 token 数与裁剪情况"""
+        with self._lock:
+            nodes = {}
+            for node, stats in self._nodes.items():
+                calls = stats["calls"]
+                nodes[node] = {
+                    "calls": calls,
+                    "avg_prompt_tokens": round(stats["prompt_tokens"] / calls, 1),
+                    "max_prompt_tokens": stats["max_prompt_tokens"],
+                    "avg_memory_tokens": round(stats["memory_tokens"] / calls, 1),
+                    "avg_retrieved_tokens": round(stats["retrieved_tokens"] / calls, 1),
+                    "avg_history_tokens": round(stats["history_tokens"] / calls, 1),
+                    "duplicates_removed": stats["duplicates_removed"],
+                    "passages_dropped": stats["passages_dropped"],
+                    "history_dropped": stats["history_dropped"],
+                }
+        return {"tokenizer": self.counter.mode, "budgets": self.budgets, "nodes": nodes}
+
+
+# 全局实例
+context_builder = ContextBuilder(
+    budgets=settings.CONTEXT_TOKEN_BUDGETS,
+    counter=TokenCounter(settings.CONTEXT_TOKENIZER),
+    dedup_threshold=settings.CONTEXT_DEDUP_THRESHOLD
+)
@@ -1,12 +1,372 @@
-from langchain_openai import OpenAIEmbeddings
+import asyncio
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Protocol, Tuple, Union, overload
+
+import numpy as np
 from langchain_community.embeddings import DashScopeEmbeddings
-from typing import List, Union, overload
+from langchain_community.embeddings.dashscope import embed_with_retry
+from langchain_core.embeddings import Embeddings
 from loguru import logger
-import numpy as np
-
 
 from src.config.setting import settings
 
+
+def normalize_text(text: str) -> str:
+    """归一化文本：NFKC、去除首尾空白、合并连续空白"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def pack_vector(vector: List[float]) -> bytes:
+    """将向量压缩为 float32 小端字节串（1024 维约 4KB），用于在 State 和 checkpoint 中传递"""
+    return np.asarray(vector, dtype="<f4").tobytes()
+
+
+def unpack_vector(buffer: bytes) -> List[float]:
+    """从 float32 字节串还原向量"""
+    return np.frombuffer(buffer, dtype="<f4").tolist()
+
+
+# 文本类型：检索查询与被检索的文档使用不同的向量化方式（非对称模型），两者的向量不能混用
+QUERY = "query"
+DOCUMENT = "document"
+
+
+class EmbeddingProvider(Protocol):
+    """向量化服务提供方，text_type 为 QUERY 或 DOCUMENT"""
+
+    model: str
+
+    def embed(self, texts: List[str], text_type: str) -> List[List[float]]:
+        ...
+
+    async def aembed(self, texts: List[str], text_type: str) -> List[List[float]]:
+        ...
+
+
+class DashScopeEmbeddingProvider:
+    """百炼向量化服务，整个进程共用一个客户端"""
+
+    def __init__(self, model: str, api_key: str):
+        self.model = model
+        self.client = DashScopeEmbeddings(model=model, dashscope_api_key=api_key)
+
+    def embed(self, texts: List[str], text_type: str) -> List[List[float]]:
+        if text_type == DOCUMENT:
+            return self.client.embed_documents(texts)
+        # 与 DashScopeEmbeddings.embed_query 相同的请求（text_type="query"），多个查询合并为一次调用
+        results = embed_with_retry(self.client, input=texts, text_type=QUERY, model=self.model)
+        return [item["embedding"] for item in results]
+
+    async def aembed(self, texts: List[str], text_type: str) -> List[List[float]]:
+        # DashScope SDK 只有同步接口，放到线程中执行避免阻塞事件循环
+        return await asyncio.to_thread(self.embed, texts, text_type)
+
+
+class LocalHashEmbeddingProvider:
+    """本地确定性向量化（基于文本哈希），用于测试和离线压测，不依赖网络"""
+
+    def __init__(self, dim: int = 1024, model: str = "local-hash"):
+        self.model = model
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        vector /= np.linalg.norm(vector)
+        return vector.tolist()
+
+    def embed(self, texts: List[str], text_type: str) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    async def aembed(self, texts: List[str], text_type: str) -> List[List[float]]:
+        return self.embed(texts, text_type)
+
+
+class EmbeddingService:
+    """进程级向量化服务
+
+    - LRU 缓存：键为 (模型名, 文本类型, 归一化文本)，容量有上限
+    - 微批处理：同一时间窗口内的并发请求合并为一次服务调用，相同文本只请求一次
+    - 命中/未命中计数，便于观察缓存效果
+    """
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        cache_size: int = 2048,
+        batch_window_ms: float = 5,
+        max_batch_size: int = 10
+    ):
+        self.provider = provider
+        self.cache_size = cache_size
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+
+        self._cache: "OrderedDict[Tuple[str, str, str], List[float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        # 微批处理状态，绑定到当前事件循环
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # 键为 (文本类型, 归一化文本)
+        self._pending: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        # 每个键当前的等待者数量，以及正在请求该键的批处理任务与该批的全部键
+        self._waiters: Dict[Tuple[str, str], int] = {}
+        self._inflight_batches: Dict[Tuple[str, str], Tuple[asyncio.Task, List[Tuple[str, str]]]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks: set = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.provider_calls = 0
+
+    def set_provider(self, provider: EmbeddingProvider) -> None:
+        """替换向量化服务提供方（例如测试时使用本地确定性实现）"""
+        self.provider = provider
+        self.clear_cache()
+
+    def _key(self, text: str, text_type: str) -> Tuple[str, str, str]:
+        return (self.provider.model, text_type, text)
+
+    def _cache_get(self, text: str, text_type: str) -> Optional[List[float]]:
+        key = self._key(text, text_type)
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def _cache_put(self, text: str, text_type: str, vector: List[float]) -> None:
+        key = self._key(text, text_type)
+        with self._cache_lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self) -> None:
+        with self._cache_lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        """返回缓存与批处理统计"""
+        total = self.hits + self.misses
+        return {
+            "model": self.provider.model,
+            "cache_size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "provider_calls": self.provider_calls,
+        }
+
+    # ---------------- 异步接口 ----------------
+
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 新的事件循环（如脚本中多次 asyncio.run），丢弃旧循环上的批处理状态
+            self._loop = loop
+            self._pending = {}
+            self._inflight = {}
+            self._waiters = {}
+            self._inflight_batches = {}
+            self._flush_handle = None
+            self._flush_tasks = set()
+        return loop
+
+    def _start_flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._flush_handle = None
+        task = loop.create_task(self._flush())
+        # 持有任务引用，防止任务在执行期间被垃圾回收
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    def _schedule_flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        if len(self._pending) >= self.max_batch_size:
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+            self._start_flush(loop)
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._start_flush, loop)
+
+    async def _flush(self) -> None:
+        if not self._pending:
+            return
+        # 一次请求只包含同一种文本类型
+        text_type = next(iter(self._pending))[0]
+        keys = [key for key in self._pending if key[0] == text_type][:self.max_batch_size]
+        batch = {key: self._pending.pop(key) for key in keys}
+        self._inflight.update(batch)
+        task = asyncio.current_task()
+        for key in keys:
+            self._inflight_batches[key] = (task, keys)
+        if self._pending:
+            self._schedule_flush(asyncio.get_running_loop())
+
+        texts = [text for _, text in keys]
+        try:
+            self.provider_calls += 1
+            vectors = await self.provider.aembed(texts, text_type)
+        except Exception as e:
+            logger.error(f"文本向量化失败: {e}")
+            error = RuntimeError(f"文本向量化失败: {e}")
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(error)
+            return
+        except asyncio.CancelledError:
+            # 只有该批的所有等待者都已取消时才会取消批处理任务
+            for future in batch.values():
+                future.cancel()
+            raise
+        finally:
+            for key in keys:
+                self._inflight.pop(key, None)
+                self._inflight_batches.pop(key, None)
+
+        for key, vector in zip(keys, vectors):
+            self._cache_put(key[1], text_type, vector)
+            future = batch[key]
+            if not future.done():
+                future.set_result(vector)
+
+    async def aembed(self, text: str, text_type: str = QUERY) -> List[float]:
+        """向量化单个文本，默认按检索查询向量化"""
+        return (await self.aembed_many([text], text_type))[0]
+
+    async def aembed_many(self, texts: List[str], text_type: str = QUERY) -> List[List[float]]:
+        """向量化多个文本，命中缓存的直接返回，其余合并到微批中请求"""
+        loop = self._bind_loop()
+        normalized = [normalize_text(text) for text in texts]
+
+        results: List[Optional[List[float]]] = []
+        waiting: Dict[int, asyncio.Future] = {}
+        for i, text in enumerate(normalized):
+            vector = self._cache_get(text, text_type)
+            results.append(vector)
+            if vector is not None:
+                continue
+            key = (text_type, text)
+            future = self._pending.get(key) or self._inflight.get(key)
+            if future is None:
+                future = loop.create_future()
+                self._pending[key] = future
+                self._schedule_flush(loop)
+            waiting[i] = future
+
+        if waiting:
+            logger.info(f"正在向量化 {len(waiting)} 个文本（缓存命中 {len(texts) - len(waiting)} 个）")
+            keys = [(text_type, normalized[i]) for i in waiting]
+            for key in keys:
+                self._waiters[key] = self._waiters.get(key, 0) + 1
+            try:
+                # 同一文本的并发调用共享一个 future，通过 shield 等待：某个调用被取消时不影响其他等待者
+                vectors = await asyncio.gather(*(asyncio.shield(future) for future in waiting.values()))
+            except asyncio.CancelledError:
+                self._release_waiters(keys, cancelled=True)
+                raise
+            except BaseException:
+                self._release_waiters(keys, cancelled=False)
+                raise
+            self._release_waiters(keys, cancelled=False)
+            for i, vector in zip(waiting, vectors):
+                results[i] = vector
+        return results
+
+    def _release_waiters(self, keys: List[Tuple[str, str]], cancelled: bool) -> None:
+        """减少等待者计数；调用被取消且某个键已没有等待者时，撤回尚未发出的请求，
+        或在整批都没有等待者时取消正在进行的批处理"""
+        orphaned = []
+        for key in keys:
+            count = self._waiters.get(key, 0) - 1
+            if count > 0:
+                self._waiters[key] = count
+                continue
+            self._waiters.pop(key, None)
+            orphaned.append(key)
+        if not cancelled:
+            return
+
+        for key in orphaned:
+            future = self._pending.pop(key, None)
+            if future is not None:
+                future.cancel()
+                continue
+            entry = self._inflight_batches.get(key)
+            if entry is None:
+                continue
+            task, batch_keys = entry
+            if not task.done() and all(self._waiters.get(k, 0) == 0 for k in batch_keys):
+                task.cancel()
+
+    # ---------------- 同步接口 ----------------
+
+    def embed_many(self, texts: List[str], text_type: str = QUERY) -> List[List[float]]:
+        """同步向量化多个文本（供脚本等非异步场景使用），同样使用缓存"""
+        normalized = [normalize_text(text) for text in texts]
+        results = [self._cache_get(text, text_type) for text in normalized]
+        missing = list(dict.fromkeys(
+            text for text, vector in zip(normalized, results) if vector is None
+        ))
+        if missing:
+            logger.info(f"正在向量化 {len(missing)} 个文本")
+            self.provider_calls += 1
+            fetched = dict(zip(missing, self.provider.embed(missing, text_type)))
+            for text, vector in fetched.items():
+                self._cache_put(text, text_type, vector)
+            results = [
+                vector if vector is not None else fetched[text]
+                for text, vector in zip(normalized, results)
+            ]
+        return results
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain Embeddings 适配器，使 langchain_milvus 等组件共享同一个向量化服务和缓存
+
+    embed_documents 只用于写入知识库，检索时 langchain_milvus 调用 embed_query / aembed_query。
+    """
+
+    def __init__(self, service: EmbeddingService):
+        self.service = service
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.service.embed_many(texts, DOCUMENT)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.service.embed_many([text], QUERY)[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.service.aembed_many(texts, DOCUMENT)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.service.aembed(text, QUERY)
+
+
+def _create_provider() -> EmbeddingProvider:
+    if settings.EMBEDDING_PROVIDER == "local":
+        return LocalHashEmbeddingProvider()
+    return DashScopeEmbeddingProvider(settings.EMBEDDING_MODEL, settings.EMBEDDING_API_KEY)
+
+
+# 全局实例
+embedding_service = EmbeddingService(
+    _create_provider(),
+    cache_size=settings.EMBEDDING_CACHE_SIZE,
+    batch_window_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+    max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE
+)
+
+
 @overload
 def get_text_embeddings(texts: str) -> List[float]:
     ...
@@ -18,23 +378,19 @@ def get_text_embeddings(texts: List[str]) -> List[List[float]]:
 def get_text_embeddings(
     texts: Union[List[str], str]
     ) -> Union[List[List[float]], List[float]]:
-    """对文本列表进行向量化"""
-    try:
-        embeddings = DashScopeEmbeddings(
-            model=settings.EMBEDDING_MODEL,
-            dashscope_api_key=settings.EMBEDDING_API_KEY
-        )
+    """对文本列表进行向量化（同步接口，异步代码请使用 embedding_service.aembed）
 
+    单个文本按检索查询向量化，文本列表按文档向量化。
+    """
+    try:
         if isinstance(texts, str):
-            logger.info(f"向量化单个文本")
-            result = embeddings.embed_query(texts)
+            result = embedding_service.embed_many([texts], QUERY)[0]
         else:
-            logger.info(f"正在向量化 {len(texts)} 个文本")
-            result = embeddings.embed_documents(texts)
-        
+            result = embedding_service.embed_many(texts, DOCUMENT)
+
         logger.info(f"文本向量化完成")
         return result
-        
+
     except Exception as e:
         logger.error(f"文本向量化失败: {e}")
         raise RuntimeError(f"文本向量化失败: {e}")
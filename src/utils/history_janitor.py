@@ -0,0 +1,154 @@
+"""Redis 会话历史清理任务
+
+zset 布局下，消息键过期后其在会话索引（有序集合）中的成员不会自动删除。
+原 cleanup_expired_messages 使用 KEYS 遍历整个键空间（会阻塞 Redis），并逐键执行 exists/zscore/zadd。
+这里改为增量清理：
+- 使用 SCAN 游标分批遍历，游标在多次运行之间保留
+- 每批会话通过流水线批量检查成员是否存在、批量删除过期成员
+- 每次运行有时间预算，超出预算后保存进度，下次继续
+"""
+
+import asyncio
+import time
+from typing import List, Optional
+
+import redis
+from loguru import logger
+
+
+class RedisHistoryJanitor:
+    """增量清理会话索引中已过期的消息成员"""
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        scan_count: int = 200,
+        batch_size: int = 50,
+        time_budget_ms: float = 50,
+        interval_seconds: float = 30
+    ):
+        self.redis_client = redis_client
+        self.scan_count = scan_count
+        self.batch_size = batch_size
+        self.time_budget = time_budget_ms / 1000
+        self.interval_seconds = interval_seconds
+
+        # 进度：SCAN 游标以及当前页中尚未处理的会话键
+        self._cursor = 0
+        self._pending_keys: List[str] = []
+        self._task: Optional[asyncio.Task] = None
+
+        # 统计
+        self.runs = 0
+        self.passes_completed = 0
+        self.sessions_checked = 0
+        self.members_removed = 0
+        self.sessions_deleted = 0
+        self.last_run_ms = 0.0
+
+    def _clean_batch(self, session_keys: List[str]) -> int:
+        """清理一批会话，返回删除的过期成员数"""
+        # 第 1 次往返：取出所有会话的成员
+        pipe = self.redis_client.pipeline(transaction=False)
+        for session_key in session_keys:
+            pipe.zrange(session_key, 0, -1)
+        members_per_session = pipe.execute()
+
+        # 第 2 次往返：批量检查成员对应的消息键是否还存在
+        pipe = self.redis_client.pipeline(transaction=False)
+        for members in members_per_session:
+            for member in members:
+                pipe.exists(member)
+        exists_flags = iter(pipe.execute())
+
+        # 第 3 次往返：批量删除过期成员
+        # 只 ZREM 读到的过期成员，不 DELETE 整个会话：读取之后新写入的消息成员会被一起删掉；
+        # 成员全部删除后 Redis 会自动移除空的有序集合
+        removed = 0
+        pipe = self.redis_client.pipeline(transaction=False)
+        for session_key, members in zip(session_keys, members_per_session):
+            stale = [member for member in members if not next(exists_flags)]
+            if not stale:
+                continue
+            removed += len(stale)
+            if len(stale) == len(members):
+                self.sessions_deleted += 1
+            pipe.zrem(session_key, *stale)
+        if removed:
+            pipe.execute()
+
+        self.sessions_checked += len(session_keys)
+        self.members_removed += removed
+        return removed
+
+    def run_once(self) -> int:
+        """在时间预算内推进一次清理，返回本次删除的过期成员数"""
+        started = time.perf_counter()
+        deadline = started + self.time_budget
+        removed = 0
+
+        while time.perf_counter() < deadline:
+            if not self._pending_keys:
+                # 会话索引键为 {user_id}:{session_id} 的有序集合
+                self._cursor, keys = self.redis_client.scan(
+                    cursor=self._cursor, match="*:*", count=self.scan_count, _type="zset"
+                )
+                self._pending_keys = list(keys)
+                if not self._pending_keys:
+                    if self._cursor == 0:
+                        self.passes_completed += 1
+                        break
+                    continue
+
+            batch = self._pending_keys[:self.batch_size]
+            self._pending_keys = self._pending_keys[self.batch_size:]
+            removed += self._clean_batch(batch)
+
+            if not self._pending_keys and self._cursor == 0:
+                # 完成一轮完整遍历
+                self.passes_completed += 1
+                break
+
+        self.runs += 1
+        self.last_run_ms = (time.perf_counter() - started) * 1000
+        if removed:
+            logger.info(f"Cleaned up {removed} expired messages in {self.last_run_ms:.1f}ms")
+        return removed
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.error(f"Failed to cleanup expired messages: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        """在当前事件循环中启动后台清理任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run_forever())
+            logger.info("Redis history janitor started")
+
+    async def stop(self) -> None:
+        """停止后台清理任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Redis history janitor stopped")
+
+    def stats(self) -> dict:
+        """返回清理进度统计"""
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "runs": self.runs,
+            "passes_completed": self.passes_completed,
+            "cursor": self._cursor,
+            "sessions_checked": self.sessions_checked,
+            "members_removed": self.members_removed,
+            "sessions_deleted": self.sessions_deleted,
+            "last_run_ms": round(self.last_run_ms, 2),
+        }
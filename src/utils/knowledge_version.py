@@ -0,0 +1,105 @@
+"""知识库版本号
+
+knowledge 集合每次重新导入后递增版本号（保存在 Redis 中，多进程共享），
+依赖知识库内容的缓存在版本号变化时自动失效。
+
+服务进程中由后台任务通过异步 Redis 客户端定期刷新版本号，current() 只返回本地缓存值，
+不会在事件循环上执行阻塞的 Redis 调用；没有事件循环的同步脚本仍按需同步读取。
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+from loguru import logger
+
+from src.config.redis import get_async_redis_client, get_redis_client
+
+KNOWLEDGE_GENERATION_KEY = "knowledge:generation"
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class KnowledgeVersion:
+    """知识库版本号，本地缓存一段时间，避免每次请求都访问 Redis"""
+
+    def __init__(self, refresh_seconds: float = 5):
+        self.refresh_seconds = refresh_seconds
+        self._generation = 0
+        self._checked_at = 0.0
+        self._redis_client = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _client(self):
+        if self._redis_client is None:
+            self._redis_client = get_redis_client()
+        return self._redis_client
+
+    def _set(self, value) -> None:
+        self._generation = int(value) if value else 0
+        self._checked_at = time.monotonic()
+
+    def current(self) -> int:
+        """返回当前知识库版本号
+
+        在事件循环中调用时直接返回缓存值（由后台任务刷新）；
+        同步上下文中缓存过期后同步读取一次 Redis。
+        """
+        if _in_event_loop():
+            return self._generation
+        if time.monotonic() - self._checked_at < self.refresh_seconds:
+            return self._generation
+        try:
+            self._set(self._client().get(KNOWLEDGE_GENERATION_KEY))
+        except Exception as e:
+            # Redis 不可用时沿用上一次的版本号
+            logger.error(f"Failed to read knowledge generation: {e}")
+            self._checked_at = time.monotonic()
+        return self._generation
+
+    async def arefresh(self) -> int:
+        """通过异步 Redis 客户端刷新版本号"""
+        try:
+            self._set(await get_async_redis_client().get(KNOWLEDGE_GENERATION_KEY))
+        except Exception as e:
+            # Redis 不可用时沿用上一次的版本号
+            logger.error(f"Failed to read knowledge generation: {e}")
+        return self._generation
+
+    async def _refresh_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            await self.arefresh()
+
+    def start(self) -> None:
+        """在当前事件循环中启动定期刷新版本号的后台任务（FastAPI lifespan 中调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_forever())
+            logger.info("Knowledge generation refresher started")
+
+    async def stop(self) -> None:
+        """停止后台刷新任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Knowledge generation refresher stopped")
+
+    def bump(self) -> int:
+        """知识库重新导入后调用，递增版本号"""
+        self._set(self._client().incr(KNOWLEDGE_GENERATION_KEY))
+        logger.info(f"Knowledge generation bumped to {self._generation}")
+        return self._generation
+
+
+# 全局实例
+knowledge_version = KnowledgeVersion()
@@ -0,0 +1,240 @@
+"""本地预路由
+
+route_node 对每条消息都要调用一次对话模型，只为得到 "true" / "false"。
+这里在 LLM 之前加一层只用 CPU 的判断，明显的情况直接决定，拿不准的再交给 LLM：
+- 规则：问候、致谢、告别等闲聊直接回答；同时命中至少两个监管类关键词（政策、法规、监管等）的问题直接检索，
+  只命中一个、或只命中“标准”“流程”“办法”“通知”等通用词时交给 LLM
+- 可选的向量分类（PRE_ROUTER_EMBEDDING_ENABLED）：与两类示例问题的中心向量比较余弦相似度，
+  差值超过 PRE_ROUTER_EMBEDDING_MARGIN 时直接决定。查询向量通常已由语义缓存计算过，命中向量缓存
+- 置信度低于 PRE_ROUTER_MIN_CONFIDENCE、或规则互相矛盾时交给 LLM
+- 有聊天历史时，依赖上下文的输入交给能看到历史的 LLM：简短的肯定/否定答复（可能是在回应助手的提问，
+  如“需要我帮你查一下相关政策吗？”之后的“好的”）、省略式追问（“那……呢”）、
+  以及命中的关键词已出现在上一条助手回复中的问题（历史可能已经能够回答）
+
+默认阈值 PRE_ROUTER_MIN_CONFIDENCE=0.85 依据带人工标注的数据集 src/test/data/pre_router_labels.jsonl 选定：
+python -m src.test.eval_pre_router --dataset src/test/data/pre_router_labels.jsonl --sweep
+"""
+
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from src.config.setting import settings
+from src.utils.embedding import embedding_service
+
+RETRIEVE = "retrieve"
+ANSWER = "answer"
+# 需要结合聊天历史判断、交给 LLM 的决定原因前缀
+HISTORY_DEPENDENT = "needs history"
+
+# 整句只是问候、致谢、告别或询问助手身份
+_SMALL_TALK_PATTERN = re.compile(
+    r"^(你好|您好|hi|hello|hey|嗨|哈喽|哈啰|在吗|在不在|早上好|早安|上午好|中午好|下午好|晚上好|晚安|"
+    r"谢谢|谢谢你|谢谢您|多谢|感谢|辛苦了|好的|好|行|可以|收到|明白了|知道了|ok|okay|嗯+|哦+|"
+    r"再见|拜拜|bye|你是谁|你叫什么|你叫什么名字|你能做什么|你会什么)"
+    r"(啊|呀|呢|吧|哈|啦)?[\s!！。.~～?？,，]*$",
+    re.IGNORECASE,
+)
+
+# 简短的肯定/否定答复：没有历史时是闲聊，有历史时可能是在回应助手的提问
+_SHORT_REPLY_PATTERN = re.compile(
+    r"^(好的|好|行|可以|要|需要|是的|是|对|嗯+|ok|okay|不用|不需要|不要|算了)"
+    r"(啊|呀|呢|吧|哈|啦)?[\s!！。.~～?？,，]*$",
+    re.IGNORECASE,
+)
+
+# 省略式追问：依赖上文才能理解
+_FOLLOW_UP_PATTERN = re.compile(
+    r"^(那|那么|那个|这个|这|它|其|还有|另外|然后|上面|刚才|前面|上述)|呢[\s!！。.~～?？,，]*$"
+)
+
+# 需要查阅知识库的监管、政策类关键词，命中越多置信度越高，单个关键词不足以直接决定检索；
+# 通用词（日常对话中也常见，如“有什么办法”“放假通知”）只在与监管类关键词同时出现时提高置信度
+_RETRIEVAL_KEYWORDS = [
+    "政策", "法规", "法律", "条例", "细则", "指引", "监管", "管理局",
+    "银保监", "金融监管", "证监会", "人民银行", "央行", "外汇", "补贴", "申报", "资质",
+    "备案", "许可", "合规", "处罚", "罚款",
+]
+_WEAK_RETRIEVAL_KEYWORDS = [
+    "规定", "办法", "通知", "税", "标准", "流程", "利率", "额度", "最新", "发布", "文件", "要求", "条件",
+]
+_RETRIEVAL_PATTERN = re.compile("|".join(map(re.escape, _RETRIEVAL_KEYWORDS)) + r"|第[一二三四五六七八九十百\d]+条")
+_WEAK_RETRIEVAL_PATTERN = re.compile("|".join(map(re.escape, _WEAK_RETRIEVAL_KEYWORDS)))
+
+# 向量分类的示例问题
+_SEED_EXAMPLES = {
+    RETRIEVE: [
+        "北京市最新的科技政策是什么？",
+        "小微企业贷款贴息的申请条件有哪些？",
+        "跨境人民币结算需要办理哪些备案手续？",
+        "个人所得税专项附加扣除的标准是多少？",
+        "私募基金管理人登记需要满足什么要求？",
+        "银行理财产品的销售管理办法有哪些规定？",
+        "高新技术企业认定的流程是怎样的？",
+        "违反反洗钱规定会受到什么处罚？",
+    ],
+    ANSWER: [
+        "你好",
+        "谢谢你的帮助",
+        "你是谁？",
+        "今天心情不错",
+        "给我讲个笑话吧",
+        "帮我把这句话翻译成英文：早上好",
+        "刚才的回答能再简短一点吗？",
+        "好的，我知道了",
+    ],
+}
+
+
+@dataclass
+class RouteDecision:
+    """预路由结果，route 为 None 表示交给 LLM 判断"""
+
+    route: Optional[str]
+    confidence: float
+    source: str
+    reason: str = ""
+
+
+class PreRouter:
+    """规则 + 可选向量分类的两级本地路由"""
+
+    def __init__(
+        self,
+        min_confidence: float = 0.85,
+        embedding_enabled: bool = False,
+        embedding_margin: float = 0.08
+    ):
+        self.min_confidence = min_confidence
+        self.embedding_enabled = embedding_enabled
+        self.embedding_margin = embedding_margin
+
+        self._centroids: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.decisions = {RETRIEVE: 0, ANSWER: 0}
+        self.by_source = {"rule": 0, "embedding": 0}
+        self.escalated = 0
+        self.total_ms = 0.0
+
+    @staticmethod
+    def _last_ai_message(history: Optional[List[Any]]) -> str:
+        for message in reversed(history or []):
+            if getattr(message, "type", None) == "ai":
+                return str(message.content)
+        return ""
+
+    def match_rules(self, query: str, history: Optional[List[Any]] = None) -> RouteDecision:
+        """规则判断
+
+        Args:
+            query: 用户当前的输入
+            history: 聊天历史（LangChain 消息列表），非空时依赖上下文的输入交给 LLM
+        """
+        text = (query or "").strip()
+        if not text:
+            return RouteDecision(None, 0.0, "rule", "empty query")
+
+        if history:
+            if _SHORT_REPLY_PATTERN.match(text):
+                return RouteDecision(None, 0.0, "rule", HISTORY_DEPENDENT + ": short reply")
+            if _FOLLOW_UP_PATTERN.search(text):
+                return RouteDecision(None, 0.0, "rule", HISTORY_DEPENDENT + ": follow-up")
+
+        small_talk = _SMALL_TALK_PATTERN.match(text) is not None
+        hits = set(_RETRIEVAL_PATTERN.findall(text))
+        weak_hits = set(_WEAK_RETRIEVAL_PATTERN.findall(text))
+        if small_talk and (hits or weak_hits):
+            return RouteDecision(None, 0.0, "rule", "conflicting rules")
+        if small_talk:
+            return RouteDecision(ANSWER, 0.97, "rule", "small talk")
+        if hits and history:
+            last_answer = self._last_ai_message(history)
+            covered = sorted(hit for hit in hits if hit in last_answer)
+            if covered:
+                return RouteDecision(None, 0.0, "rule", f"{HISTORY_DEPENDENT}: mentioned in last answer: {','.join(covered)}")
+        if hits:
+            # 一个监管类关键词 0.80，低于默认阈值；两个及以上、或再加上多个通用词才直接检索
+            confidence = min(0.95, 0.75 + 0.05 * len(hits) + 0.02 * len(weak_hits))
+            return RouteDecision(RETRIEVE, confidence, "rule", f"keywords: {','.join(sorted(hits | weak_hits))}")
+        if weak_hits:
+            return RouteDecision(None, 0.0, "rule", f"weak keywords only: {','.join(sorted(weak_hits))}")
+        return RouteDecision(None, 0.0, "rule", "no rule matched")
+
+    async def _get_centroids(self) -> np.ndarray:
+        if self._centroids is None:
+            rows = []
+            for label in (RETRIEVE, ANSWER):
+                vectors = np.asarray(await embedding_service.aembed_many(_SEED_EXAMPLES[label]), dtype=np.float32)
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+                centroid = vectors.mean(axis=0)
+                rows.append(centroid / (np.linalg.norm(centroid) + 1e-12))
+            self._centroids = np.stack(rows)
+        return self._centroids
+
+    async def classify(self, query: str) -> RouteDecision:
+        """向量分类：比较与两类中心向量的余弦相似度"""
+        centroids = await self._get_centroids()
+        vector = np.asarray(await embedding_service.aembed(query), dtype=np.float32)
+        vector /= np.linalg.norm(vector) + 1e-12
+        retrieve_score, answer_score = centroids @ vector
+        margin = float(retrieve_score - answer_score)
+        if abs(margin) < self.embedding_margin:
+            return RouteDecision(None, abs(margin), "embedding", f"margin {margin:.3f}")
+        return RouteDecision(RETRIEVE if margin > 0 else ANSWER, abs(margin), "embedding", f"margin {margin:.3f}")
+
+    async def decide(self, query: str, history: Optional[List[Any]] = None) -> RouteDecision:
+        """依次尝试规则与向量分类，都拿不准时返回 route=None
+
+        Args:
+            query: 用户当前的输入
+            history: 聊天历史，依赖上下文的输入不做本地判断
+        """
+        started = time.perf_counter()
+        decision = self.match_rules(query, history)
+        if decision.route is not None and decision.confidence < self.min_confidence:
+            decision = RouteDecision(None, decision.confidence, decision.source, decision.reason)
+        # 向量分类同样看不到历史，依赖上下文的输入直接交给 LLM
+        if (decision.route is None and self.embedding_enabled and decision.reason != "conflicting rules"
+                and not decision.reason.startswith(HISTORY_DEPENDENT)):
+            try:
+                decision = await self.classify(query)
+            except Exception as e:
+                logger.warning(f"Pre-router embedding classification failed: {e}")
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            self.total_ms += elapsed_ms
+            if decision.route is None:
+                self.escalated += 1
+            else:
+                self.decisions[decision.route] += 1
+                self.by_source[decision.source] += 1
+        return decision
+
+    def stats(self) -> dict:
+        """返回本地决定与交给 LLM 的次数"""
+        with self._lock:
+            decided = sum(self.decisions.values())
+            total = decided + self.escalated
+            return {
+                "total": total,
+                "decided_locally": decided,
+                "escalated": self.escalated,
+                "local_rate": round(decided / total, 4) if total else 0.0,
+                "decisions": dict(self.decisions),
+                "by_source": dict(self.by_source),
+                "avg_ms": round(self.total_ms / total, 3) if total else 0.0,
+            }
+
+
+# 全局实例
+pre_router = PreRouter(
+    min_confidence=settings.PRE_ROUTER_MIN_CONFIDENCE,
+    embedding_enabled=settings.PRE_ROUTER_EMBEDDING_ENABLED,
+    embedding_margin=settings.PRE_ROUTER_EMBEDDING_MARGIN
+)
@@ -0,0 +1,349 @@
+"""Redis 会话历史存储
+
+支持两种存储布局，通过 REDIS_HISTORY_LAYOUT 配置：
+
+- zset：每条消息一个键，外加一个有序集合作为索引（原有布局）。
+  读取使用 ZREVRANGE + MGET 两次往返，过期成员在发现时才通过一次流水线清理。
+  时间戳为秒级，同一秒内的两条消息会相互覆盖；刷新 TTL 需要逐个键执行。
+- list：每个会话一个列表，元素为紧凑编码的消息，LTRIM 限制长度，整个会话只有一个 TTL。
+  写入、读取、刷新 TTL 都只需要一次往返，与会话长度无关。
+
+每种布局都有同步与异步（redis.asyncio）两个版本，命令与往返次数完全一致。
+"""
+
+from datetime import datetime
+from typing import List, Protocol, Tuple
+
+import redis
+import redis.asyncio as aioredis
+from loguru import logger
+
+from src.schema.redis import RedisKeyBuilder, RedisMessage
+
+
+def read_session_messages(
+    redis_client: redis.Redis,
+    session_messages_key: str,
+    limit: int = 50
+) -> List[RedisMessage]:
+    """读取会话最近的 limit 条消息（按时间正序）
+
+    Args:
+        redis_client: Redis 客户端
+        session_messages_key: 会话消息索引（有序集合）的键
+        limit: 最多返回的消息数
+
+    Returns:
+        List[RedisMessage]: 消息列表，会话不存在或全部过期时返回空列表
+    """
+    # 第 1 次往返：按时间倒序取消息键，会话不存在时返回空列表
+    message_keys = redis_client.zrevrange(session_messages_key, 0, limit - 1)
+    if not message_keys:
+        return []
+
+    # 第 2 次往返：一次取回所有消息内容，已过期的消息返回 None
+    values = redis_client.mget(message_keys)
+
+    messages, stale_keys = _parse_session_values(message_keys, values)
+
+    # 惰性清理：只有发现过期成员时才多一次往返
+    if stale_keys:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zrem(session_messages_key, *stale_keys)
+        if not messages:
+            pipe.delete(session_messages_key)
+        pipe.execute()
+        logger.info(f"Removed {len(stale_keys)} expired message keys from {session_messages_key}")
+
+    # 按时间正序返回
+    messages.reverse()
+    return messages
+
+
+async def async_read_session_messages(
+    redis_client: aioredis.Redis,
+    session_messages_key: str,
+    limit: int = 50
+) -> List[RedisMessage]:
+    """read_session_messages 的异步版本"""
+    message_keys = await redis_client.zrevrange(session_messages_key, 0, limit - 1)
+    if not message_keys:
+        return []
+
+    values = await redis_client.mget(message_keys)
+
+    messages, stale_keys = _parse_session_values(message_keys, values)
+
+    if stale_keys:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zrem(session_messages_key, *stale_keys)
+        if not messages:
+            pipe.delete(session_messages_key)
+        await pipe.execute()
+        logger.info(f"Removed {len(stale_keys)} expired message keys from {session_messages_key}")
+
+    messages.reverse()
+    return messages
+
+
+def _parse_session_values(message_keys: List[str], values: list) -> Tuple[List[RedisMessage], List[str]]:
+    """解析 MGET 结果，返回（消息列表，已过期的消息键）"""
+    messages = []
+    stale_keys = []
+    for key, value in zip(message_keys, values):
+        if value is None:
+            stale_keys.append(key)
+            continue
+        try:
+            messages.append(RedisMessage.from_json(value))
+        except Exception as e:
+            logger.error(f"Failed to parse message from Redis: {e}")
+    return messages, stale_keys
+
+
+def _parse_compact_values(values: List[str], user_id: int, session_id: str) -> List[RedisMessage]:
+    """解析列表布局中紧凑编码的消息"""
+    messages = []
+    for value in values:
+        try:
+            messages.append(RedisMessage.from_compact(value, session_id, user_id))
+        except Exception as e:
+            logger.error(f"Failed to parse message from Redis: {e}")
+    return messages
+
+
+def _queue_zset_append(pipe, messages: List[RedisMessage], scores: List[float], expire_seconds: int) -> None:
+    """向流水线中加入 zset 布局的写入命令（同步、异步流水线通用）"""
+    for message, score in zip(messages, scores):
+        message_key = RedisKeyBuilder.message_key(
+            message.user_id, message.session_id, datetime.fromisoformat(message.created_at)
+        )
+        session_messages_key = RedisKeyBuilder.session_messages_key(message.user_id, message.session_id)
+        # 存储消息内容（设置过期时间）
+        pipe.setex(message_key, expire_seconds, message.to_json())
+        # 添加到会话消息列表（按时间排序）
+        pipe.zadd(session_messages_key, {message_key: score})
+        # 设置会话消息列表的过期时间
+        pipe.expire(session_messages_key, expire_seconds)
+
+
+def _queue_list_append(pipe, messages: List[RedisMessage], max_messages: int, expire_seconds: int) -> None:
+    """向流水线中加入 list 布局的写入命令（同步、异步流水线通用）"""
+    history_key = RedisKeyBuilder.session_history_key(messages[0].user_id, messages[0].session_id)
+    pipe.rpush(history_key, *(message.to_compact() for message in messages))
+    pipe.ltrim(history_key, -max_messages, -1)
+    pipe.expire(history_key, expire_seconds)
+
+
+class HistoryStore(Protocol):
+    """会话历史存储接口"""
+
+    def append(self, message: RedisMessage, score: float) -> None:
+        ...
+
+    def append_many(self, messages: List[RedisMessage], scores: List[float]) -> None:
+        ...
+
+    def read(self, user_id: int, session_id: str, limit: int) -> List[RedisMessage]:
+        ...
+
+    def exists(self, user_id: int, session_id: str) -> bool:
+        ...
+
+    def refresh_ttl(self, user_id: int, session_id: str) -> None:
+        ...
+
+    def clear(self, user_id: int, session_id: str) -> None:
+        ...
+
+    def ttl(self, user_id: int, session_id: str) -> int:
+        ...
+
+
+class ZSetHistoryStore:
+    """每条消息一个键 + 有序集合索引（原有布局）"""
+
+    def __init__(self, redis_client: redis.Redis, expire_seconds: int):
+        self.redis_client = redis_client
+        self.expire_seconds = expire_seconds
+
+    def append(self, message: RedisMessage, score: float) -> None:
+        self.append_many([message], [score])
+
+    def append_many(self, messages: List[RedisMessage], scores: List[float]) -> None:
+        pipe = self.redis_client.pipeline(transaction=False)
+        _queue_zset_append(pipe, messages, scores, self.expire_seconds)
+        pipe.execute()
+
+    def read(self, user_id: int, session_id: str, limit: int) -> List[RedisMessage]:
+        session_messages_key = RedisKeyBuilder.session_messages_key(user_id, session_id)
+        return read_session_messages(self.redis_client, session_messages_key, limit)
+
+    def exists(self, user_id: int, session_id: str) -> bool:
+        session_messages_key = RedisKeyBuilder.session_messages_key(user_id, session_id)
+        return bool(self.redis_client.exists(session_messages_key))
+
+    def refresh_ttl(self, user_id: int, session_id: str) -> None:
+        session_messages_key = RedisKeyBuilder.session_messages_key(user_id, session_id)
+        message_keys = self.redis_client.zrange(session_messages_key, 0, -1)
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in message_keys:
+            pipe.expire(key, self.expire_seconds)
+        pipe.expire(session_messages_key, self.expire_seconds)
+        pipe.execute()
+
+    def clear(self, user_id: int, session_id: str) -> None:
+        session_messages_key = RedisKeyBuilder.session_messages_key(user_id, session_id)
+        message_keys = self.redis_client.zrange(session_messages_key, 0, -1)
+        if message_keys:
+            self.redis_client.delete(*message_keys)
+        self.redis_client.delete(session_messages_key)
+
+    def ttl(self, user_id: int, session_id: str) -> int:
+        session_messages_key = RedisKeyBuilder.session_messages_key(user_id, session_id)
+        return self.redis_client.ttl(session_messages_key)
+
+
+class ListHistoryStore:
+    """每个会话一个列表，紧凑编码，限制长度，单一 TTL"""
+
+    def __init__(self, redis_client: redis.Redis, expire_seconds: int, max_messages: int):
+        self.redis_client = redis_client
+        self.expire_seconds = expire_seconds
+        self.max_messages = max_messages
+
+    def append(self, message: RedisMessage, score: float) -> None:
+        self.append_many([message], [score])
+
+    def append_many(self, messages: List[RedisMessage], scores: List[float]) -> None:
+        if not messages:
+            return
+        # 同一会话的消息在一次流水线（一次往返）中写入、截断并设置过期时间
+        pipe = self.redis_client.pipeline(transaction=True)
+        _queue_list_append(pipe, messages, self.max_messages, self.expire_seconds)
+        pipe.execute()
+
+    def read(self, user_id: int, session_id: str, limit: int) -> List[RedisMessage]:
+        history_key = RedisKeyBuilder.session_history_key(user_id, session_id)
+        return _parse_compact_values(self.redis_client.lrange(history_key, -limit, -1), user_id, session_id)
+
+    def exists(self, user_id: int, session_id: str) -> bool:
+        history_key = RedisKeyBuilder.session_history_key(user_id, session_id)
+        return bool(self.redis_client.exists(history_key))
+
+    def refresh_ttl(self, user_id: int, session_id: str) -> None:
+        history_key = RedisKeyBuilder.session_history_key(user_id, session_id)
+        self.redis_client.expire(history_key, self.expire_seconds)
+
+    def clear(self, user_id: int, session_id: str) -> None:
+        history_key = RedisKeyBuilder.session_history_key(user_id, session_id)
+        self.redis_client.delete(history_key)
+
+    def ttl(self, user_id: int, session_id: str) -> int:
+        history_key = RedisKeyBuilder.session_history_key(user_id, session_id)
+        return self.redis_client.ttl(history_key)
+
+
+class AsyncZSetHistoryStore:
+    """ZSetHistoryStore 的异步版本"""
+
+    def __init__(self, redis_client: aioredis.Redis, expire_seconds: int):
+        self.redis_client = redis_client
+        self.expire_seconds = expire_seconds
+
+    async def append(self, message: RedisMessage, score: float) -> None:
+        await self.append_many([message], [score])
+
+    async def append_many(self, messages: List[RedisMessage], scores: List[float]) -> None:
+        pipe = self.redis_client.pipeline(transaction=False)
+        _queue_zset_append(pipe, messages, scores, self.expire_seconds)
+        await pipe.execute()
+
+    async def read(self, user_id: int, session_id: str, limit: int) -> List[RedisMessage]:
+        session_messages_key = RedisKeyBuilder.session_messages_key(user_id, session_id)
+        return await async_read_session_messages(self.redis_client, session_messages_key, limit)
+
+    async def exists(self, user_id: int, session_id: str) -> bool:
+        session_messages_key = RedisKeyBuilder.session_messages_key(user_id, session_id)
+        return bool(await self.redis_client.exists(session_messages_key))
+
+    async def refresh_ttl(self, user_id: int, session_id: str) -> None:
+        session_messages_key = RedisKeyBuilder.session_messages_key(user_id, session_id)
+        message_keys = await self.redis_client.zrange(session_messages_key, 0, -1)
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in message_keys:
+            pipe.expire(key, self.expire_seconds)
+        pipe.expire(session_messages_key, self.expire_seconds)
+        await pipe.execute()
+
+    async def clear(self, user_id: int, session_id: str) -> None:
+        session_messages_key = RedisKeyBuilder.session_messages_key(user_id, session_id)
+        message_keys = await self.redis_client.zrange(session_messages_key, 0, -1)
+        await self.redis_client.delete(session_messages_key, *message_keys)
+
+    async def ttl(self, user_id: int, session_id: str) -> int:
+        session_messages_key = RedisKeyBuilder.session_messages_key(user_id, session_id)
+        return await self.redis_client.ttl(session_messages_key)
+
+
+class AsyncListHistoryStore:
+    """ListHistoryStore 的异步版本"""
+
+    def __init__(self, redis_client: aioredis.Redis, expire_seconds: int, max_messages: int):
+        self.redis_client = redis_client
+        self.expire_seconds = expire_seconds
+        self.max_messages = max_messages
+
+    async def append(self, message: RedisMessage, score: float) -> None:
+        await self.append_many([message], [score])
+
+    async def append_many(self, messages: List[RedisMessage], scores: List[float]) -> None:
+        if not messages:
+            return
+        pipe = self.redis_client.pipeline(transaction=True)
+        _queue_list_append(pipe, messages, self.max_messages, self.expire_seconds)
+        await pipe.execute()
+
+    async def read(self, user_id: int, session_id: str, limit: int) -> List[RedisMessage]:
+        history_key = RedisKeyBuilder.session_history_key(user_id, session_id)
+        return _parse_compact_values(await self.redis_client.lrange(history_key, -limit, -1), user_id, session_id)
+
+    async def exists(self, user_id: int, session_id: str) -> bool:
+        history_key = RedisKeyBuilder.session_history_key(user_id, session_id)
+        return bool(await self.redis_client.exists(history_key))
+
+    async def refresh_ttl(self, user_id: int, session_id: str) -> None:
+        history_key = RedisKeyBuilder.session_history_key(user_id, session_id)
+        await self.redis_client.expire(history_key, self.expire_seconds)
+
+    async def clear(self, user_id: int, session_id: str) -> None:
+        history_key = RedisKeyBuilder.session_history_key(user_id, session_id)
+        await self.redis_client.delete(history_key)
+
+    async def ttl(self, user_id: int, session_id: str) -> int:
+        history_key = RedisKeyBuilder.session_history_key(user_id, session_id)
+        return await self.redis_client.ttl(history_key)
+
+
+def create_history_store(
+    redis_client: redis.Redis,
+    layout: str,
+    expire_seconds: int,
+    max_messages: int
+) -> HistoryStore:
+    """根据配置创建会话历史存储"""
+    if layout == "list":
+        return ListHistoryStore(redis_client, expire_seconds, max_messages)
+    return ZSetHistoryStore(redis_client, expire_seconds)
+
+
+def create_async_history_store(
+    redis_client: aioredis.Redis,
+    layout: str,
+    expire_seconds: int,
+    max_messages: int
+):
+    """根据配置创建异步会话历史存储"""
+    if layout == "list":
+        return AsyncListHistoryStore(redis_client, expire_seconds, max_messages)
+    return AsyncZSetHistoryStore(redis_client, expire_seconds)
@@ -0,0 +1,234 @@
+"""知识库检索结果缓存
+
+检索 agent 经常用相同（或只差空白、全半角、大小写）的查询调用“政策文件内容检索器”，
+既发生在不同用户之间，也发生在同一问题的多轮 supervisor 检索之间。每次调用都要向量化、搜索 Milvus 并重排。
+这里在检索器外加一层缓存，缓存重排后的有序文档（文档 id 与内容）：
+- 键为 (工具名, 检索范围, 知识库版本号, 归一化查询)；检索范围区分集合与检索模式，版本号由写入脚本递增，
+  知识库重新导入后旧结果自动失效
+- 进程内 TTL + LRU；可选的 Redis 层（RETRIEVAL_CACHE_REDIS_ENABLED）供多个 worker 共享
+- 同一键的并发未命中只检索一次
+- 空结果不缓存（检索失败或超时时 Milvus 服务返回空列表）
+- 按工具统计命中率，通过 /metrics 暴露
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from loguru import logger
+
+from src.config.redis import get_async_redis_client
+from src.config.setting import settings
+from src.utils.embedding import normalize_text
+from src.utils.knowledge_version import knowledge_version
+
+CacheKey = Tuple[str, str, int, str]
+
+
+def normalize_query(query: str) -> str:
+    """归一化查询：NFKC、合并空白、小写"""
+    return normalize_text(query or "").lower()
+
+
+def _serialize(documents: List[Document]) -> List[dict]:
+    return [
+        {
+            "id": doc.metadata.get("pk") or hashlib.md5(doc.page_content.encode("utf-8")).hexdigest(),
+            "page_content": doc.page_content,
+            "metadata": doc.metadata,
+        }
+        for doc in documents
+    ]
+
+
+def _deserialize(items: List[dict]) -> List[Document]:
+    return [Document(page_content=item["page_content"], metadata=dict(item["metadata"])) for item in items]
+
+
+class RetrievalCache:
+    """进程内 TTL/LRU + 可选 Redis 的检索结果缓存"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = 600,
+        max_entries: int = 1000,
+        redis_enabled: bool = False,
+        redis_ttl_seconds: int = 3600
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.redis_enabled = redis_enabled
+        self.redis_ttl_seconds = redis_ttl_seconds
+
+        # 键 -> (序列化的文档列表, 过期时间)
+        self._entries: "OrderedDict[CacheKey, Tuple[List[dict], float]]" = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        # 工具名 -> 命中统计
+        self._tools: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def _redis_key(key: CacheKey) -> str:
+        tool, scope, generation, query = key
+        digest = hashlib.md5(f"{tool}:{scope}:{query}".encode("utf-8")).hexdigest()
+        return f"retrieval:{generation}:{digest}"
+
+    def _count(self, tool: str, field: str) -> None:
+        stats = self._tools.setdefault(tool, {"local_hits": 0, "redis_hits": 0, "misses": 0, "coalesced": 0})
+        stats[field] += 1
+
+    def _get_local(self, key: CacheKey) -> Optional[List[dict]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        items, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return items
+
+    def _set_local(self, key: CacheKey, items: List[dict]) -> None:
+        self._entries[key] = (items, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(
+        self,
+        tool: str,
+        scope: str,
+        query: str,
+        loader: Callable[[], Awaitable[List[Document]]]
+    ) -> List[Document]:
+        """获取检索结果，未命中时调用 loader 检索并写入缓存
+
+        Args:
+            tool: 检索工具名，用于按工具统计命中率
+            scope: 检索范围（集合与检索模式），不同范围的结果互不共享
+            query: 检索查询
+            loader: 回源函数，返回重排后的文档
+
+        Returns:
+            List[Document]: 有序的检索结果
+        """
+        key = (tool, scope, knowledge_version.current(), normalize_query(query))
+        items = self._get_local(key)
+        if items is not None:
+            self._count(tool, "local_hits")
+            return _deserialize(items)
+
+        # 同一查询的并发未命中共享一次检索
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                items = await asyncio.shield(inflight)
+                self._count(tool, "coalesced")
+                return _deserialize(items)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # 先发起的检索被取消（如工具调用超时），由当前调用自行检索
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            items = await self._load(tool, key, loader)
+            future.set_result(items)
+            return _deserialize(items)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _load(self, tool: str, key: CacheKey, loader: Callable[[], Awaitable[List[Document]]]) -> List[dict]:
+        if self.redis_enabled:
+            try:
+                value = await get_async_redis_client().get(self._redis_key(key))
+                if value is not None:
+                    items = json.loads(value)
+                    self._count(tool, "redis_hits")
+                    self._set_local(key, items)
+                    return items
+            except Exception as e:
+                logger.warning(f"Retrieval cache Redis lookup failed: {e}")
+
+        self._count(tool, "misses")
+        items = _serialize(await loader())
+        if not items:
+            return items
+        self._set_local(key, items)
+        if self.redis_enabled:
+            try:
+                value = json.dumps(items, ensure_ascii=False, default=str)
+                await get_async_redis_client().set(self._redis_key(key), value, ex=self.redis_ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Retrieval cache Redis write failed: {e}")
+        return items
+
+    def clear(self) -> None:
+        """清空进程内缓存"""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """返回各检索工具的命中统计"""
+        tools = {}
+        for tool, stats in self._tools.items():
+            lookups = stats["local_hits"] + stats["redis_hits"] + stats["misses"] + stats["coalesced"]
+            tools[tool] = {
+                **stats,
+                "lookups": lookups,
+                "hit_ratio": round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0,
+            }
+        return {
+            "entries": len(self._entries),
+            "generation": knowledge_version.current(),
+            "redis_enabled": self.redis_enabled,
+            "tools": tools,
+        }
+
+
+class CachedRetriever(BaseRetriever):
+    """在检索器外加一层检索结果缓存"""
+
+    retriever: BaseRetriever
+    cache: RetrievalCache
+    tool_name: str
+    scope: str
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return await self.cache.get(
+            self.tool_name,
+            self.scope,
+            query,
+            lambda: self.retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        )
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        # 同步调用只在脚本中使用，不经过缓存
+        return self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+
+
+# 全局实例
+retrieval_cache = RetrievalCache(
+    ttl_seconds=settings.RETRIEVAL_CACHE_TTL_SECONDS,
+    max_entries=settings.RETRIEVAL_CACHE_MAX_ENTRIES,
+    redis_enabled=settings.RETRIEVAL_CACHE_REDIS_ENABLED,
+    redis_ttl_seconds=settings.RETRIEVAL_CACHE_REDIS_TTL_SECONDS
+)
@@ -0,0 +1,180 @@
+"""语义答案缓存
+
+大量用户会提出几乎相同的监管问题，每次都要完整执行
+route → get_memory → supervisor → retrieval_agent → deal_with_results（4 次以上 LLM 调用）。
+这里缓存检索路径生成的最终答案，新问题与已缓存问题的向量余弦相似度超过阈值时直接返回答案。
+
+- 查找与写入都使用改写后的独立问题（rewrite_query），不依赖上下文的省略句不会误命中
+- 条目按用户隔离：答案还依赖该用户的历史对话与记忆，不同用户之间不共享
+- TTL 过期 + LRU 淘汰
+- 与知识库版本号绑定，知识库重新导入后旧答案全部失效
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src.config.setting import settings
+from src.utils.knowledge_version import knowledge_version
+
+
+@dataclass
+class CachedAnswer:
+    """缓存条目"""
+    scope: str  # 所属用户
+    question: str
+    vector: np.ndarray
+    answer: str
+    generation: int
+    created_at: float
+    latency_ms: float  # 原始生成该答案所花费的时间
+
+
+@dataclass
+class CacheHit:
+    """命中结果"""
+    question: str
+    answer: str
+    similarity: float
+    latency_saved_ms: float
+
+
+class SemanticAnswerCache:
+    """基于向量相似度的答案缓存，线程安全"""
+
+    def __init__(self, threshold: float = 0.95, ttl_seconds: int = 3600, max_entries: int = 1000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[Tuple[str, str], CachedAnswer]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None  # 所有条目向量组成的矩阵，条目变化时重建
+        self._keys: List[Tuple[str, str]] = []
+        self._scopes: Optional[np.ndarray] = None  # 与矩阵各行对应的用户
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved_ms = 0.0
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def _invalidate_matrix(self) -> None:
+        self._matrix = None
+        self._scopes = None
+
+    def _build_matrix(self) -> None:
+        self._keys = list(self._entries)
+        self._matrix = (
+            np.stack([self._entries[key].vector for key in self._keys])
+            if self._keys else None
+        )
+        self._scopes = np.asarray([key[0] for key in self._keys], dtype=object)
+
+    def _evict_expired(self, generation: int) -> None:
+        now = time.time()
+        expired = [
+            key for key, entry in self._entries.items()
+            if entry.generation != generation or now - entry.created_at > self.ttl_seconds
+        ]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._invalidate_matrix()
+
+    def lookup(self, scope: str, vector: List[float]) -> Optional[CacheHit]:
+        """在指定用户的缓存中查找与给定向量最相似的答案
+
+        Args:
+            scope: 用户标识
+            vector: 改写后独立问题的向量
+        """
+        generation = knowledge_version.current()
+        query = self._normalize(vector)
+        with self._lock:
+            self._evict_expired(generation)
+            if self._matrix is None:
+                self._build_matrix()
+            if self._matrix is None:
+                self.misses += 1
+                return None
+
+            similarities = np.where(self._scopes == scope, self._matrix @ query, -np.inf)
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            key = self._keys[best]
+            entry = self._entries[key]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.latency_saved_ms += entry.latency_ms
+            return CacheHit(
+                question=entry.question,
+                answer=entry.answer,
+                similarity=similarity,
+                latency_saved_ms=entry.latency_ms
+            )
+
+    def store(self, scope: str, question: str, vector: List[float], answer: str, latency_ms: float) -> None:
+        """缓存检索路径生成的答案
+
+        Args:
+            scope: 用户标识
+            question: 改写后的独立问题
+            vector: 问题向量
+            answer: 最终答案
+            latency_ms: 生成该答案所花费的时间
+        """
+        if not answer:
+            return
+        entry = CachedAnswer(
+            scope=scope,
+            question=question,
+            vector=self._normalize(vector),
+            answer=answer,
+            generation=knowledge_version.current(),
+            created_at=time.time(),
+            latency_ms=latency_ms
+        )
+        with self._lock:
+            key = (scope, question)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._invalidate_matrix()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._invalidate_matrix()
+
+    def stats(self) -> dict:
+        """返回命中率与节省的延迟"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "latency_saved_ms": round(self.latency_saved_ms, 1),
+        }
+
+
+# 全局实例
+semantic_cache = SemanticAnswerCache(
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES
+)
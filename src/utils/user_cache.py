@@ -0,0 +1,209 @@
+"""已认证用户缓存
+
+get_current_user 每个请求（包括每次 SSE 聊天请求）都会按 JWT 中的用户 ID 查询一次 PostgreSQL。
+用户信息几乎不变，这里在查询前加两级缓存：
+- 进程内 TTL + LRU：命中时只需一次字典查找
+- 可选的 Redis 层（USER_CACHE_REDIS_ENABLED）：多个 worker 共享，进程重启后无需回源
+- 不存在的用户 ID 也会缓存一小段时间（负缓存），避免伪造 token 反复打到数据库
+- 同一用户 ID 的并发未命中只回源一次
+- 删除、修改用户时调用 invalidate()，同时清除本进程与 Redis 中的条目；
+  其他进程的本地条目最多再保留 USER_CACHE_LOCAL_TTL_SECONDS 秒
+
+Redis 中只保存 id、email、created_at，不保存密码哈希。
+"""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from loguru import logger
+
+from src.config.redis import get_async_redis_client
+from src.config.setting import settings
+from src.schema.user import User
+
+_NOT_FOUND = "__none__"
+
+
+class UserIdentityCache:
+    """进程内 TTL/LRU + 可选 Redis 的用户缓存"""
+
+    def __init__(
+        self,
+        local_ttl_seconds: float = 30,
+        negative_ttl_seconds: float = 10,
+        max_entries: int = 10000,
+        redis_enabled: bool = False,
+        redis_ttl_seconds: int = 600
+    ):
+        self.local_ttl_seconds = local_ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self.redis_enabled = redis_enabled
+        self.redis_ttl_seconds = redis_ttl_seconds
+
+        # user_id -> (User 或 None, 过期时间)
+        self._entries: "OrderedDict[int, Tuple[Optional[User], float]]" = OrderedDict()
+        self._inflight: Dict[int, asyncio.Future] = {}
+        # 每次 invalidate 递增，回源期间发生过失效时不写回缓存，避免旧数据覆盖
+        self._epoch = 0
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _redis_key(user_id: int) -> str:
+        return f"user:{user_id}"
+
+    def _get_local(self, user_id: int) -> Tuple[bool, Optional[User]]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return False, None
+        user, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return False, None
+        self._entries.move_to_end(user_id)
+        return True, user
+
+    def _set_local(self, user_id: int, user: Optional[User]) -> None:
+        ttl = self.local_ttl_seconds if user is not None else self.negative_ttl_seconds
+        self._entries[user_id] = (user, time.monotonic() + ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _get_redis(self, user_id: int) -> Tuple[bool, Optional[User]]:
+        value = await get_async_redis_client().get(self._redis_key(user_id))
+        if value is None:
+            return False, None
+        if value == _NOT_FOUND:
+            return True, None
+        data = json.loads(value)
+        return True, User(
+            id=data["id"],
+            email=data["email"],
+            hashed_password="",
+            created_at=datetime.fromisoformat(data["created_at"])
+        )
+
+    async def _set_redis(self, user_id: int, user: Optional[User]) -> None:
+        if user is None:
+            value, ttl = _NOT_FOUND, max(1, int(self.negative_ttl_seconds))
+        else:
+            value = json.dumps({"id": user.id, "email": user.email, "created_at": user.created_at.isoformat()})
+            ttl = self.redis_ttl_seconds
+        await get_async_redis_client().set(self._redis_key(user_id), value, ex=ttl)
+
+    async def get(self, user_id: int, loader: Callable[[int], Awaitable[Optional[User]]]) -> Optional[User]:
+        """获取用户，未命中时调用 loader 回源并写入缓存
+
+        Args:
+            user_id: 用户ID
+            loader: 回源函数，通常为 database_service.get_user
+
+        Returns:
+            Optional[User]: 用户，不存在时返回 None
+        """
+        found, user = self._get_local(user_id)
+        if found:
+            if user is None:
+                self.negative_hits += 1
+            else:
+                self.local_hits += 1
+            return user
+
+        # 同一用户的并发未命中共享一次回源
+        inflight = self._inflight.get(user_id)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = future
+        try:
+            user = await self._load(user_id, loader)
+            future.set_result(user)
+            return user
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(user_id, None)
+
+    async def _load(self, user_id: int, loader: Callable[[int], Awaitable[Optional[User]]]) -> Optional[User]:
+        if self.redis_enabled:
+            try:
+                found, user = await self._get_redis(user_id)
+                if found:
+                    if user is None:
+                        self.negative_hits += 1
+                    else:
+                        self.redis_hits += 1
+                    self._set_local(user_id, user)
+                    return user
+            except Exception as e:
+                logger.warning(f"User cache Redis lookup failed: {e}")
+
+        self.misses += 1
+        epoch = self._epoch
+        user = await loader(user_id)
+        if epoch != self._epoch:
+            return user
+        self._set_local(user_id, user)
+        if self.redis_enabled:
+            try:
+                await self._set_redis(user_id, user)
+            except Exception as e:
+                logger.warning(f"User cache Redis write failed: {e}")
+        return user
+
+    async def invalidate(self, user_id: int) -> None:
+        """用户被创建、修改或删除后清除缓存（包括负缓存）"""
+        self._entries.pop(user_id, None)
+        self._epoch += 1
+        self.invalidations += 1
+        if self.redis_enabled:
+            try:
+                await get_async_redis_client().delete(self._redis_key(user_id))
+            except Exception as e:
+                logger.warning(f"User cache Redis invalidation failed: {e}")
+
+    def clear(self) -> None:
+        """清空进程内缓存"""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """返回缓存统计"""
+        lookups = self.local_hits + self.redis_hits + self.negative_hits + self.misses
+        hits = lookups - self.misses
+        return {
+            "entries": len(self._entries),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "redis_enabled": self.redis_enabled,
+        }
+
+
+# 全局实例
+user_cache = UserIdentityCache(
+    local_ttl_seconds=settings.USER_CACHE_LOCAL_TTL_SECONDS,
+    negative_ttl_seconds=settings.USER_CACHE_NEGATIVE_TTL_SECONDS,
+    max_entries=settings.USER_CACHE_MAX_ENTRIES,
+    redis_enabled=settings.USER_CACHE_REDIS_ENABLED,
+    redis_ttl_seconds=settings.USER_CACHE_REDIS_TTL_SECONDS
+)